@@ -0,0 +1,255 @@
+"""
+Punto de entrada asíncrono (ASGI) con las mismas rutas que app/flask_app.py.
+
+Usa Quart (misma API que Flask, con vistas async) y conduce el grafo con
+`ainvoke`, así que un turno en curso no ocupa un hilo del servidor y cada
+conexión inactiva solo cuesta una corrutina. Lo que bloquea se ejecuta
+fuera del event loop con asyncio.to_thread:
+- los nodos del grafo (LangGraph ejecuta los nodos síncronos en un executor),
+- cargar y guardar el estado de la sesión (y su checkpoint) y calcular los totales,
+- renderizar el carrito (plantilla parcial sin url_for, con un Environment propio;
+  si el carrito no ha cambiado se reutiliza el HTML anterior).
+
+No forma parte de requirements.txt:
+    pip install quart uvicorn
+    uvicorn app.asgi_app:app --workers 1
+"""
+import asyncio
+import os
+import uuid
+from functools import wraps
+from typing import Optional
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from quart import Quart, jsonify, redirect, render_template, request, session, url_for
+
+from app.checkpoint import SessionConflict
+from app.session_locks import AsyncSessionLocks
+from app.sessions import configure_from_env, finish_turn, load_session_state, save_session_state
+from conversation.dispatcher import build_dispatcher
+from conversation.graph import build_graph
+from conversation.state import ConversationState
+from domain.catalog import find_product_by_id
+from domain.models import Cart, DiscountSummary
+from domain.pricing import calculate_totals, render_cart_fragment, set_promotion_plan
+from domain.promotions import load_promotions
+from domain.shop_data import ShopDataManager
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+
+app = Quart(
+    __name__,
+    template_folder=TEMPLATES_DIR,
+    static_folder=os.path.join(BASE_DIR, "static"),
+)
+app.secret_key = "clave_super_secreta_123"
+
+CHAT_ENGINE = os.environ.get("CHAT_ENGINE", "graph")
+graph = build_dispatcher() if CHAT_ENGINE == "dispatch" else build_graph()
+shop_data = ShopDataManager()
+set_promotion_plan(load_promotions())
+
+if os.environ.get("SHOP_DATA_WATCH_INTERVAL"):
+    shop_data.watch(float(os.environ["SHOP_DATA_WATCH_INTERVAL"]))
+
+configure_from_env(os.environ)
+
+# Entorno síncrono para el parcial del carrito: se puede renderizar en un hilo.
+_partials = Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=select_autoescape(["html"]))
+
+
+def get_or_create_session_id() -> str:
+    sid = session.get("session_id")
+    if not sid:
+        sid = str(uuid.uuid4())
+        session["session_id"] = sid
+    return sid
+
+
+SESSION_LOCKS = AsyncSessionLocks()
+
+
+def session_serialized(view):
+    # Dos peticiones de la misma sesión no se intercalan en los await.
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        async with SESSION_LOCKS.hold(get_or_create_session_id()):
+            return await view(*args, **kwargs)
+    return wrapper
+
+
+async def get_state() -> tuple[str, ConversationState]:
+    sid = get_or_create_session_id()
+    return sid, await asyncio.to_thread(load_session_state, sid, shop_data.current)
+
+
+@app.errorhandler(SessionConflict)
+async def session_conflict(_error):
+    # Otro worker ha guardado esta sesión a la vez; la siguiente petición la lee al día.
+    return jsonify({"ok": False, "error": "La sesión ha cambiado en otra pestaña. Vuelve a intentarlo."}), 409
+
+
+def _render_cart_partial(cart: Cart, discount_summary: Optional[DiscountSummary]) -> str:
+    return _partials.get_template("partials/cart_content.html").render(
+        cart=cart,
+        discount_summary=discount_summary,
+    )
+
+
+def _render_cart(state: ConversationState) -> str:
+    return render_cart_fragment(state["cart"], "panel", _render_cart_partial)
+
+
+def _add_and_price(state: ConversationState, product, quantity: int) -> None:
+    state["cart"].add_item(product, quantity)
+    state["discount_summary"] = calculate_totals(state["cart"]) if not state["cart"].is_empty() else None
+
+
+async def run_turn(sid: str, state: ConversationState, message: str) -> ConversationState:
+    state["last_user_message"] = message
+    state["chat_history"].append(("user", message))
+    new_state = await graph.ainvoke(state)
+    return await asyncio.to_thread(finish_turn, sid, new_state)
+
+
+@app.post("/cart/clear")
+@session_serialized
+async def clear_cart():
+    sid, state = await get_state()
+    state["cart"].clear()
+    state["discount_summary"] = None
+    state["applied_coupon_code"] = None
+
+    state["bot_message"] = "El carrito ha sido vaciado. ¿Quieres que te muestre el catálogo?."
+    state["chat_history"].append(("bot", state["bot_message"]))
+    await asyncio.to_thread(save_session_state, sid, state)
+    return redirect(url_for("chat"))
+
+
+@app.post("/cart/add/<int:product_id>")
+@session_serialized
+async def add_to_cart(product_id: int):
+    sid, state = await get_state()
+    form = await request.form
+
+    product = find_product_by_id(state["catalog"], product_id)
+    if product is None:
+        state["bot_message"] = "No encuentro ese producto en el catálogo."
+        state["chat_history"].append(("bot", state["bot_message"]))
+        await asyncio.to_thread(save_session_state, sid, state)
+        return redirect(url_for("chat"))
+
+    try:
+        qty = int(form.get("quantity", "1").strip())
+    except ValueError:
+        qty = 1
+    if qty <= 0:
+        qty = 1
+
+    try:
+        await asyncio.to_thread(_add_and_price, state, product, qty)
+    except ValueError as e:
+        state["bot_message"] = str(e)
+        state["chat_history"].append(("bot", state["bot_message"]))
+        await asyncio.to_thread(save_session_state, sid, state)
+        return redirect(url_for("chat"))
+
+    state["bot_message"] = f"He añadido {qty} unidad(es) de <strong>{product.name}</strong> a tu carrito."
+    state["chat_history"].append(("bot", state["bot_message"]))
+    await asyncio.to_thread(save_session_state, sid, state)
+    return redirect(url_for("chat"))
+
+
+@app.post("/api/cart/add/<int:product_id>")
+@session_serialized
+async def api_add_to_cart(product_id: int):
+    sid, state = await get_state()
+    form = await request.form
+
+    try:
+        quantity = int(form.get("quantity", "1"))
+    except ValueError:
+        return jsonify({"ok": False, "error": "Cantidad inválida"}), 400
+
+    if quantity <= 0:
+        return jsonify({"ok": False, "error": "La cantidad debe ser >= 1"}), 400
+
+    product = find_product_by_id(state["catalog"], product_id)
+    if not product:
+        return jsonify({"ok": False, "error": "Producto no encontrado"}), 404
+
+    await asyncio.to_thread(_add_and_price, state, product, quantity)
+    await asyncio.to_thread(save_session_state, sid, state)
+    cart_html = await asyncio.to_thread(_render_cart, state)
+
+    return jsonify({
+        "ok": True,
+        "product_id": product_id,
+        "added_quantity": quantity,
+        "total_units": sum(item.quantity for item in state["cart"].items.values()),
+        "line_items": len(state["cart"].items),
+        "final_total": state["discount_summary"].final_total if state["discount_summary"] else 0.0,
+        "cart_html": cart_html,
+    })
+
+
+@app.post("/api/chat")
+@session_serialized
+async def api_chat():
+    sid, state = await get_state()
+    form = await request.form
+
+    message = (form.get("message") or "").strip()
+    if not message:
+        return jsonify({"ok": False, "error": "Mensaje vacío"}), 400
+
+    new_state = await run_turn(sid, state, message)
+    cart_html = await asyncio.to_thread(_render_cart, new_state)
+    history = new_state["chat_history"]
+
+    return jsonify({
+        "ok": True,
+        "last_messages": history[-2:] if len(history) >= 2 else history,
+        "total_units": sum(i.quantity for i in new_state["cart"].items.values()),
+        "cart_html": cart_html,
+    })
+
+
+@app.get("/api/chat/history")
+@session_serialized
+async def api_chat_history():
+    sid, state = await get_state()
+    before = request.args.get("before", type=int)
+    limit = request.args.get("limit", default=20, type=int)
+    older = await asyncio.to_thread(state["chat_history"].older, before, limit)
+    return jsonify({
+        "ok": True,
+        "messages": [{"seq": seq, "speaker": role, "text": text} for seq, role, text in older],
+        "has_more": bool(older) and older[0][0] > 0,
+    })
+
+
+@app.route("/", methods=["GET", "POST"])
+@session_serialized
+async def chat():
+    sid, state = await get_state()
+
+    if request.method == "POST":
+        user_message = ((await request.form).get("message") or "").strip()
+        if user_message:
+            state = await run_turn(sid, state, user_message)
+        else:
+            state["bot_message"] = "No he recibido ningun mensaje. Escribe algún texto para continuar."
+            state["chat_history"].append(("bot", state["bot_message"]))
+            await asyncio.to_thread(save_session_state, sid, state)
+
+    # La página completa usa url_for, así que se renderiza con el contexto de la petición.
+    return await render_template(
+        "chat.html",
+        chat_history=state["chat_history"],
+        cart=state["cart"],
+        discount_summary=state["discount_summary"],
+        applied_coupon=state["cart"].applied_coupon,
+        catalog=state["catalog"],
+    )
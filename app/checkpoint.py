@@ -0,0 +1,268 @@
+"""
+Checkpoints de sesión en SQLite para que un reinicio o un despliegue no
+borre los carritos.
+
+Se guarda solo lo propio de cada sesión (nunca el catálogo ni los cupones):
+- `sessions`: los campos sueltos (modo, envío, último pedido...) en JSON,
+- `cart_lines`: una fila por línea del carrito (product_id, cantidad),
+- `chat_lines`: el historial, una fila por mensaje (solo los que el
+  ChatHistory aún tiene en memoria; los anteriores viven en su segmento).
+
+Cada guardado es incremental: se compara con lo último escrito para esa
+sesión y solo se tocan los campos, las líneas y los mensajes nuevos o
+cambiados, en una sola transacción. La restauración es perezosa: una
+sesión se lee de disco la primera vez que se pide.
+
+Varios procesos pueden compartir el fichero. Cada fila de `sessions` lleva
+una `version` que aumenta con cada guardado, y el guardado la actualiza con
+un compare-and-swap (`... WHERE version = <la última leída o escrita>`). Si
+otro proceso ha guardado la sesión entretanto, no se escribe nada y `save`
+lanza SessionConflict: ese cambio no se pisa, y quien llama decide (la app
+responde 409 y la siguiente petición lee la sesión al día).
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, Sequence
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    sid TEXT PRIMARY KEY,
+    fields TEXT NOT NULL,
+    updated_at REAL NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS cart_lines (
+    sid TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (sid, product_id)
+);
+CREATE TABLE IF NOT EXISTS chat_lines (
+    sid TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (sid, seq)
+);
+"""
+
+
+class SessionConflict(Exception):
+    """Otro proceso ha guardado la sesión desde que este la leyó."""
+
+
+@dataclass
+class SessionSnapshot:
+    fields: dict[str, object]
+    cart_lines: dict[int, int]
+    chat_history: list[tuple[str, str]] = field(default_factory=list)
+    # Posición en la conversación del primer mensaje de chat_history.
+    chat_start: int = 0
+    # time.time() del último guardado.
+    updated_at: float = 0.0
+
+
+@dataclass
+class _Written:
+    """Lo último escrito de una sesión, para calcular el siguiente delta."""
+    fields: dict[str, object]
+    cart_lines: dict[int, int]
+    history_start: int
+    history_total: int
+    # Versión de la fila de `sessions` que corresponde a lo anterior.
+    version: int
+
+
+class SessionCheckpointer:
+    def __init__(self, path: Path | str):
+        self.path = str(path)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        if "updated_at" not in columns:
+            # Bases creadas antes de que existiera la caducidad.
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN updated_at REAL NOT NULL DEFAULT 0")
+        if "version" not in columns:
+            # Bases creadas antes de que se compartieran entre procesos.
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self._lock = threading.Lock()
+        self._written: dict[str, _Written] = {}
+        self.writes = 0
+
+    def load(self, sid: str) -> Optional[SessionSnapshot]:
+        with self._lock:
+            # Una transacción de lectura: las tres tablas se ven en el mismo instante
+            # aunque otro proceso esté guardando esta sesión.
+            self._conn.execute("BEGIN")
+            try:
+                row = self._conn.execute(
+                    "SELECT fields, updated_at, version FROM sessions WHERE sid = ?", (sid,)
+                ).fetchone()
+                if row is None:
+                    return None
+                fields = json.loads(row[0])
+                lines = dict(self._conn.execute(
+                    "SELECT product_id, quantity FROM cart_lines WHERE sid = ?", (sid,)
+                ))
+                rows = self._conn.execute(
+                    "SELECT seq, role, text FROM chat_lines WHERE sid = ? ORDER BY seq", (sid,)
+                ).fetchall()
+            finally:
+                self._conn.execute("COMMIT")
+            start = rows[0][0] if rows else 0
+            history = [(role, text) for _, role, text in rows]
+            self._written[sid] = _Written(dict(fields), dict(lines), start, start + len(history), row[2])
+        return SessionSnapshot(fields, lines, history, start, row[1])
+
+    def save(
+        self,
+        sid: str,
+        fields: dict[str, object],
+        cart_lines: dict[int, int],
+        chat_history: Sequence[tuple[str, str]],
+        chat_start: int = 0,
+    ) -> None:
+        """
+        Escribe solo lo que ha cambiado desde el último save/load de `sid`.
+        `chat_start` es la posición en la conversación de chat_history[0].
+        Lanza SessionConflict, sin escribir nada, si la sesión en disco no es
+        la última que este proceso leyó o escribió.
+        """
+        with self._lock:
+            previous = self._written.get(sid)
+            statements = self._delta(sid, previous, fields, cart_lines, chat_history, chat_start)
+            if not statements and previous is not None and fields == previous.fields:
+                return
+            version = previous.version + 1 if previous is not None else 1
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                swapped = self._swap_session_row(sid, previous, fields, version)
+                if swapped:
+                    for sql, params in statements:
+                        self._conn.execute(sql, params)
+                    self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            if not swapped:
+                self._conn.execute("ROLLBACK")
+                # Lo que sabíamos de la sesión ya no vale: la próxima lectura lo rehace.
+                self._written.pop(sid, None)
+                raise SessionConflict(sid)
+            self.writes += len(statements) + 1
+            total = chat_start + len(chat_history)
+            self._written[sid] = _Written(dict(fields), dict(cart_lines), chat_start, total, version)
+
+    def _swap_session_row(
+        self,
+        sid: str,
+        previous: Optional[_Written],
+        fields: dict[str, object],
+        version: int,
+    ) -> bool:
+        """Escribe la fila de `sessions` solo si sigue en la versión esperada."""
+        now = time.time()
+        if previous is None:
+            # Sesión nueva: si otro proceso ya la ha creado, INSERT falla.
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO sessions (sid, fields, updated_at, version) VALUES (?, ?, ?, ?)",
+                (sid, json.dumps(fields, ensure_ascii=False), now, version),
+            )
+        elif fields != previous.fields:
+            cursor = self._conn.execute(
+                "UPDATE sessions SET fields = ?, updated_at = ?, version = ? WHERE sid = ? AND version = ?",
+                (json.dumps(fields, ensure_ascii=False), now, version, sid, previous.version),
+            )
+        else:
+            cursor = self._conn.execute(
+                "UPDATE sessions SET updated_at = ?, version = ? WHERE sid = ? AND version = ?",
+                (now, version, sid, previous.version),
+            )
+        return cursor.rowcount == 1
+
+    def _delta(
+        self,
+        sid: str,
+        previous: Optional[_Written],
+        fields: dict[str, object],
+        cart_lines: dict[int, int],
+        chat_history: Sequence[tuple[str, str]],
+        chat_start: int,
+    ) -> list[tuple[str, tuple]]:
+        """
+        Sentencias de cart_lines y chat_lines que llevan la sesión de
+        `previous` (lo último leído o escrito) al estado dado. La fila de
+        `sessions` se escribe aparte (_swap_session_row).
+        """
+        statements: list[tuple[str, tuple]] = []
+        if previous is None:
+            previous = _Written({}, {}, 0, 0, 0)
+
+        for product_id, quantity in cart_lines.items():
+            if previous.cart_lines.get(product_id) != quantity:
+                statements.append((
+                    "INSERT OR REPLACE INTO cart_lines (sid, product_id, quantity) VALUES (?, ?, ?)",
+                    (sid, product_id, quantity),
+                ))
+        for product_id in previous.cart_lines.keys() - cart_lines.keys():
+            statements.append((
+                "DELETE FROM cart_lines WHERE sid = ? AND product_id = ?", (sid, product_id)
+            ))
+
+        total = chat_start + len(chat_history)
+        first_new = previous.history_total
+        if total < previous.history_total or chat_start < previous.history_start:
+            # El historial es otro (se ha recortado o reiniciado): se reescribe entero.
+            statements.append(("DELETE FROM chat_lines WHERE sid = ?", (sid,)))
+            first_new = chat_start
+        elif chat_start > previous.history_start:
+            # Mensajes que han salido de memoria: ya están en el segmento del historial.
+            statements.append((
+                "DELETE FROM chat_lines WHERE sid = ? AND seq < ?", (sid, chat_start)
+            ))
+        first_new = max(first_new, chat_start)
+        for offset, (role, text) in enumerate(chat_history[first_new - chat_start:]):
+            statements.append((
+                "INSERT OR REPLACE INTO chat_lines (sid, seq, role, text) VALUES (?, ?, ?, ?)",
+                (sid, first_new + offset, role, text),
+            ))
+        return statements
+
+    def forget(self, sid: str) -> None:
+        """Olvida lo escrito de `sid` en memoria (la sesión sigue en disco)."""
+        with self._lock:
+            self._written.pop(sid, None)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def purge(self, older_than: float) -> list[str]:
+        """Borra las sesiones sin cambios desde `older_than` (time.time()); devuelve sus sids."""
+        with self._lock:
+            # Se eligen dentro de la transacción: una sesión que otro proceso
+            # acaba de guardar no se borra.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                sids = [sid for (sid,) in self._conn.execute(
+                    "SELECT sid FROM sessions WHERE updated_at < ?", (older_than,)
+                )]
+                for sid in sids:
+                    for table in ("sessions", "cart_lines", "chat_lines"):
+                        self._conn.execute(f"DELETE FROM {table} WHERE sid = ?", (sid,))
+                    self._written.pop(sid, None)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return sids
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
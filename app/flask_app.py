@@ -1,14 +1,23 @@
 from flask import Flask, render_template, request, session, redirect, url_for, jsonify, render_template_string
 import uuid
+from functools import wraps
+from typing import Optional
+import hmac
 import logging
 import os
 
-from domain.models import Cart
-from domain.catalog import load_catalog
-from domain.coupons import load_coupons
+from domain.catalog import find_product_by_id
+from domain.shop_data import ShopDataManager
 from conversation.state import ConversationState
+from conversation.dispatcher import build_dispatcher
 from conversation.graph import build_graph
-from domain.pricing import calculate_totals
+from conversation.nlu import parse_cache_info
+from domain.models import Cart, DiscountSummary
+from domain.pricing import PRICING_CACHE, calculate_totals, render_cart_fragment, set_promotion_plan
+from domain.promotions import load_promotions
+from app.checkpoint import SessionConflict
+from app.session_locks import SessionLocks
+from app.sessions import configure_from_env, finish_turn, load_session_state, save_session_state, session_store
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -19,11 +28,19 @@ app = Flask(
 )
 app.secret_key = "clave_super_secreta_123"
 
-graph = build_graph()
-catalog = load_catalog()
-coupons = load_coupons()
+# CHAT_ENGINE=dispatch atiende los turnos con la tabla de conversation.dispatcher
+# en lugar del grafo de LangGraph (mismo resultado, menos coste por turno).
+CHAT_ENGINE = os.environ.get("CHAT_ENGINE", "graph")
+graph = build_dispatcher() if CHAT_ENGINE == "dispatch" else build_graph()
+shop_data = ShopDataManager()
+set_promotion_plan(load_promotions())
 
-SESSION_STATES: dict[str, ConversationState] = {}
+# Recarga automática del catálogo/cupones al cambiar los JSON (segundos entre comprobaciones).
+if os.environ.get("SHOP_DATA_WATCH_INTERVAL"):
+    shop_data.watch(float(os.environ["SHOP_DATA_WATCH_INTERVAL"]))
+
+# Almacén de sesiones, checkpoints e historial en disco (ver app.sessions.configure_from_env).
+configure_from_env(os.environ)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -35,32 +52,102 @@ def get_or_create_session_id() -> str:
         session["session_id"] = sid
     return sid
 
+# Las peticiones de una misma sesión se atienden de una en una (ver app/session_locks.py);
+# las de sesiones distintas, en paralelo.
+SESSION_LOCKS = SessionLocks()
+
+def session_serialized(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with SESSION_LOCKS.hold(get_or_create_session_id()):
+            return view(*args, **kwargs)
+    return wrapper
+
 def get_state() -> ConversationState:
-    sid = get_or_create_session_id()
-    if sid not in SESSION_STATES:
-        initial_state: ConversationState = {
-            "mode": "catalog",
-            "cart": Cart(),
-            "catalog": catalog,
-            "coupons": coupons,
-            "applied_coupon_code": None,
-            "last_user_message": "",
-            "shipping_name": None,
-            "shipping_city": None,
-            "last_order_name": None,
-            "last_order_city": None,
-            "last_order_total": None,
-            "order_confirmed": False,
-            "bot_message": "¡Hola! Bienvenido a nuestra tienda. Soy tu asistente de compras. Preguntame por nuestro catálogo o dime que porductos quieres que añada a tu carrito.",
-            "discount_summary": None,
-            "chat_history": [
-                ("bot", "¡Hola! Bienvenido a nuestra tienda. Soy tu asistente de compras. Preguntame por nuestro catálogo o dime que porductos quieres que añada a tu carrito."),
-            ],
-        }
-        SESSION_STATES[sid] = initial_state
-    return SESSION_STATES[sid]
+    return load_session_state(get_or_create_session_id(), shop_data.current)
+
+@app.errorhandler(SessionConflict)
+def session_conflict(_error):
+    # Otro worker ha guardado esta sesión a la vez; la siguiente petición la lee al día.
+    return jsonify({"ok": False, "error": "La sesión ha cambiado en otra pestaña. Vuelve a intentarlo."}), 409
+
+def _render_cart_partial(cart: Cart, discount_summary: Optional[DiscountSummary]) -> str:
+    return render_template("partials/cart_content.html", cart=cart, discount_summary=discount_summary)
+
+def render_cart_panel(cart: Cart) -> str:
+    return render_cart_fragment(cart, "panel", _render_cart_partial)
+
+def is_admin_request() -> bool:
+    """
+    Exige ADMIN_TOKEN en la cabecera X-Admin-Token. Sin ADMIN_TOKEN definido
+    ninguna petición es de administración (ni siquiera desde localhost: detrás
+    de un proxy todas lo parecen).
+    """
+    token = os.environ.get("ADMIN_TOKEN")
+    return bool(token) and hmac.compare_digest(request.headers.get("X-Admin-Token", ""), token)
+
+def admin_only(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not os.environ.get("ADMIN_TOKEN"):
+            return jsonify({"ok": False, "error": "Administración desactivada: define ADMIN_TOKEN"}), 404
+        if not is_admin_request():
+            return jsonify({"ok": False, "error": "No autorizado"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.post("/admin/reload")
+@admin_only
+def admin_reload():
+    """Lanza la recarga de catálogo y cupones en segundo plano."""
+    shop_data.reload_in_background()
+    return jsonify({"ok": True, "version": shop_data.current.version}), 202
+
+@app.get("/admin/metrics")
+@admin_only
+def admin_metrics():
+    pricing = PRICING_CACHE.stats()
+    nlu = parse_cache_info()
+    sessions = session_store().stats()
+    locks = SESSION_LOCKS.stats()
+    return jsonify({
+        "ok": True,
+        "shop_data_version": shop_data.current.version,
+        "pricing_cache": {
+            "hits": pricing.hits,
+            "misses": pricing.misses,
+            "evictions": pricing.evictions,
+            "size": pricing.size,
+            "maxsize": pricing.maxsize,
+            "hit_rate": round(pricing.hit_rate, 4),
+        },
+        "nlu_cache": {
+            "hits": nlu.hits,
+            "misses": nlu.misses,
+            "size": nlu.currsize,
+            "maxsize": nlu.maxsize,
+        },
+        "sessions": {
+            "backend": sessions.backend,
+            "size": sessions.size,
+            "maxsize": sessions.maxsize,
+            "hits": sessions.hits,
+            "misses": sessions.misses,
+            "evictions": sessions.evictions,
+            "expirations": sessions.expirations,
+        },
+        "session_locks": {
+            "stripes": locks.stripes,
+            "acquisitions": locks.acquisitions,
+            "contended": locks.contended,
+            "wait_ms_total": round(locks.wait_total * 1000, 3),
+            "wait_ms_mean": round(locks.wait_mean * 1000, 3),
+            "wait_ms_max": round(locks.wait_max * 1000, 3),
+        },
+    })
 
 @app.post("/cart/clear")
+@session_serialized
 def clear_cart():
     state = get_state()
     state["cart"].clear()
@@ -71,18 +158,20 @@ def clear_cart():
     state["chat_history"].append(("bot", state["bot_message"]))
 
     sid = get_or_create_session_id()
-    SESSION_STATES[sid] = state
+    save_session_state(sid, state)
     return redirect(url_for("chat"))
 
 @app.post("/cart/add/<int:product_id>")
+@session_serialized
 def add_to_cart(product_id: int):
     state = get_state()
 
     # buscar producto en catálogo
-    product = next((p for p in state["catalog"] if p.id == product_id), None)
+    product = find_product_by_id(state["catalog"], product_id)
     if product is None:
         state["bot_message"] = "No encuentro ese producto en el catálogo."
         state["chat_history"].append(("bot", state["bot_message"]))
+        save_session_state(get_or_create_session_id(), state)
         return redirect(url_for("chat"))
 
     # cantidad
@@ -100,6 +189,7 @@ def add_to_cart(product_id: int):
     except ValueError as e:
         state["bot_message"] = str(e)
         state["chat_history"].append(("bot", state["bot_message"]))
+        save_session_state(get_or_create_session_id(), state)
         return redirect(url_for("chat"))
 
     # recalcular totales
@@ -112,10 +202,11 @@ def add_to_cart(product_id: int):
     state["chat_history"].append(("bot", state["bot_message"]))
 
     sid = get_or_create_session_id()
-    SESSION_STATES[sid] = state
+    save_session_state(sid, state)
     return redirect(url_for("chat"))
 
 @app.post("/api/cart/add/<int:product_id>")
+@session_serialized
 def api_add_to_cart(product_id: int):
     state = get_state()
 
@@ -129,7 +220,7 @@ def api_add_to_cart(product_id: int):
         return jsonify({"ok": False, "error": "La cantidad debe ser >= 1"}), 400
 
     # Buscar producto
-    product = next((p for p in state["catalog"] if p.id == product_id), None)
+    product = find_product_by_id(state["catalog"], product_id)
     if not product:
         return jsonify({"ok": False, "error": "Producto no encontrado"}), 404
 
@@ -144,17 +235,13 @@ def api_add_to_cart(product_id: int):
 
     # Persistir estado
     sid = get_or_create_session_id()
-    SESSION_STATES[sid] = state
+    save_session_state(sid, state)
 
     # Badge: total de unidades en el carrito
     total_units = sum(item.quantity for item in state["cart"].items.values())
 
-    # Renderizar HTML del carrito (partial)
-    cart_html = render_template(
-        "partials/cart_content.html",
-        cart=state["cart"],
-        discount_summary=state["discount_summary"],
-    )
+    # HTML del carrito (partial), reutilizado si el carrito no ha cambiado
+    cart_html = render_cart_panel(state["cart"])
 
     return jsonify({
         "ok": True,
@@ -167,6 +254,7 @@ def api_add_to_cart(product_id: int):
     })
 
 @app.post("/api/chat")
+@session_serialized
 def api_chat():
     state = get_state()
 
@@ -179,32 +267,14 @@ def api_chat():
     state["chat_history"].append(("user", message))
 
     # Ejecutar grafo
-    new_state = graph.invoke(state)
-
-    # Totales
-    if not new_state["cart"].is_empty():
-        new_state["discount_summary"] = calculate_totals(new_state["cart"])
-    else:
-        new_state["discount_summary"] = None
-
-    # Añadir mensaje bot
-    bot_msg = new_state.get("bot_message") or ""
-    if bot_msg:
-        new_state["chat_history"].append(("bot", bot_msg))
-
-    # Persistir
-    sid = get_or_create_session_id()
-    SESSION_STATES[sid] = new_state
+    # Totales, mensaje del bot al historial y persistir
+    new_state = finish_turn(get_or_create_session_id(), graph.invoke(state))
 
     # Badge = total unidades
     total_units = sum(i.quantity for i in new_state["cart"].items.values())
 
-    # Renderizar HTML del carrito (partial)
-    cart_html = render_template(
-        "partials/cart_content.html",
-        cart=new_state["cart"],
-        discount_summary=new_state["discount_summary"],
-    )
+    # HTML del carrito (partial); si el turno no ha tocado el carrito no se renderiza
+    cart_html = render_cart_panel(new_state["cart"])
 
     # Devolver solo los dos últimos mensajes para append (usuario + bot)
     last_messages = new_state["chat_history"][-2:] if len(new_state["chat_history"]) >= 2 else new_state["chat_history"]
@@ -216,7 +286,22 @@ def api_chat():
         "cart_html": cart_html,
     })
 
+@app.get("/api/chat/history")
+@session_serialized
+def api_chat_history():
+    """Mensajes anteriores a los que hay en memoria (se leen del segmento en disco)."""
+    history = get_state()["chat_history"]
+    before = request.args.get("before", type=int)
+    limit = request.args.get("limit", default=20, type=int)
+    older = history.older(before, limit)
+    return jsonify({
+        "ok": True,
+        "messages": [{"seq": seq, "speaker": role, "text": text} for seq, role, text in older],
+        "has_more": bool(older) and older[0][0] > 0,
+    })
+
 @app.route("/", methods=["GET", "POST"])
+@session_serialized
 def chat():
     state = get_state()
 
@@ -228,23 +313,12 @@ def chat():
             state["last_user_message"] = user_message
             state["chat_history"].append(("user", user_message))
 
-            new_state = graph.invoke(state)
-
-            if not new_state["cart"].is_empty():
-                new_state["discount_summary"] = calculate_totals(new_state["cart"])
-            else:
-                new_state["discount_summary"] = None
-        
-            if new_state.get("bot_message"):
-                new_state["chat_history"].append(("bot", new_state["bot_message"]))
-        
-            sid = get_or_create_session_id()
-            SESSION_STATES[sid] = new_state
-            state = new_state
+            state = finish_turn(get_or_create_session_id(), graph.invoke(state))
         
         else:
             state["bot_message"] = "No he recibido ningun mensaje. Escribe algún texto para continuar."
             state["chat_history"].append(("bot", state["bot_message"]))
+            save_session_state(get_or_create_session_id(), state)
             
     return render_template(
         "chat.html",
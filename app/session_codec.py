@@ -0,0 +1,203 @@
+"""
+Codificación binaria compacta y versionada del estado de una sesión.
+
+Solo guarda lo propio de la sesión, nunca el catálogo ni los cupones
+(compartidos por todas):
+- modo, página y categoría del catálogo,
+- líneas del carrito como (product_id, cantidad) y el código del cupón,
+- datos de envío y del último pedido,
+- el historial en memoria: su posición en la conversación (`start`, la
+  referencia al segmento en disco con los mensajes anteriores) y sus
+  mensajes, donde los fijos del bot van como id de plantilla. Las páginas
+  del catálogo van como texto: quien decodifica puede tener otro catálogo
+  y el historial tiene que seguir diciendo lo que se mostró.
+
+`decode_state` vuelve a enlazar el carrito y el cupón con el ShopData vigente, igual que una restauración desde
+checkpoint (app/sessions.restore_session_state). Rechaza con ValueError los
+blobs truncados o con datos de más y los mensajes cuya plantilla no está
+registrada en este proceso.
+
+Los SessionStore actuales no lo usan: MemorySessionStore guarda los estados
+vivos y SQLiteSessionStore escribe deltas por fila (app/checkpoint.py), que
+un blob entero por turno anularía. Es el formato para mover una sesión
+completa de una vez (otro backend, una caché externa, un volcado).
+
+Formato (little-endian):
+    cabecera: magic b"SESS", versión (u8)
+    campos:   modo (u8), flags (u8), página (u32), cadenas y total opcionales
+    carrito:  nº líneas (u32), (product_id i64, cantidad u32) por línea
+    historial: start (u32), nº mensajes (u32), (rol u8, tipo u8, datos) por mensaje
+Las cadenas son longitud (u32) + UTF-8; NONE_LENGTH marca None.
+"""
+from typing import Optional, get_args
+import struct
+
+from conversation.history import (
+    ChatHistory,
+    MessageRef,
+    is_static_message,
+    render_message,
+)
+from conversation.state import ConversationMode, ConversationState
+from domain.catalog import find_product_by_id
+from domain.coupons import find_coupon_by_code
+from domain.shop_data import ShopData
+
+MAGIC = b"SESS"
+CODEC_VERSION = 2
+
+HEADER = struct.Struct("<4sB")
+FIELDS = struct.Struct("<BBI")
+COUNT = struct.Struct("<I")
+CART_LINE = struct.Struct("<qI")
+MESSAGE = struct.Struct("<BB")
+TOTAL = struct.Struct("<d")
+
+NONE_LENGTH = 0xFFFFFFFF
+
+MODES: tuple[str, ...] = get_args(ConversationMode)
+ROLES = ("user", "bot")
+
+# flags
+ORDER_CONFIRMED = 1
+HAS_ORDER_TOTAL = 2
+
+# Tipos de mensaje del historial
+TEXT, STATIC = 0, 1
+
+STRING_FIELDS = (
+    "catalog_category",
+    "shipping_name",
+    "shipping_city",
+    "last_order_name",
+    "last_order_city",
+)
+
+
+def _pack_str(out: bytearray, value: Optional[str]) -> None:
+    if value is None:
+        out += COUNT.pack(NONE_LENGTH)
+        return
+    data = value.encode("utf-8")
+    out += COUNT.pack(len(data))
+    out += data
+
+
+class _Reader:
+    def __init__(self, blob: bytes):
+        self._view = memoryview(blob)
+        self._offset = 0
+
+    def unpack(self, fmt: struct.Struct) -> tuple:
+        try:
+            values = fmt.unpack_from(self._view, self._offset)
+        except struct.error as error:
+            raise ValueError("Estado de sesión truncado.") from error
+        self._offset += fmt.size
+        return values
+
+    def string(self) -> Optional[str]:
+        (length,) = self.unpack(COUNT)
+        if length == NONE_LENGTH:
+            return None
+        if self._offset + length > len(self._view):
+            raise ValueError("Estado de sesión truncado.")
+        value = str(self._view[self._offset:self._offset + length], "utf-8")
+        self._offset += length
+        return value
+
+    def finish(self) -> None:
+        if self._offset != len(self._view):
+            raise ValueError("Estado de sesión con datos de más al final.")
+
+
+def encode_state(state: ConversationState) -> bytes:
+    out = bytearray(HEADER.pack(MAGIC, CODEC_VERSION))
+
+    flags = ORDER_CONFIRMED if state.get("order_confirmed") else 0
+    total = state.get("last_order_total")
+    if total is not None:
+        flags |= HAS_ORDER_TOTAL
+    out += FIELDS.pack(MODES.index(state.get("mode", "catalog")), flags, state.get("catalog_page") or 1)
+    for name in STRING_FIELDS:
+        _pack_str(out, state.get(name))
+    coupon = state["cart"].applied_coupon
+    _pack_str(out, coupon.code if coupon is not None else None)
+    if total is not None:
+        out += TOTAL.pack(total)
+
+    items = state["cart"].items
+    out += COUNT.pack(len(items))
+    for product_id, item in items.items():
+        out += CART_LINE.pack(product_id, item.quantity)
+
+    history = state["chat_history"]
+    entries = history.entries()
+    out += COUNT.pack(history.start)
+    out += COUNT.pack(len(entries))
+    for role, payload in entries:
+        role_index = ROLES.index(role)
+        if isinstance(payload, MessageRef) and is_static_message(payload):
+            out += MESSAGE.pack(role_index, STATIC)
+            _pack_str(out, payload.template)
+        else:
+            text = render_message(payload, history.catalog) if isinstance(payload, MessageRef) else payload
+            out += MESSAGE.pack(role_index, TEXT)
+            _pack_str(out, text)
+    return bytes(out)
+
+
+def decode_state(blob: bytes, data: ShopData) -> ConversationState:
+    from app.sessions import new_session_state  # sessions importa este módulo
+
+    reader = _Reader(blob)
+    magic, version = reader.unpack(HEADER)
+    if magic != MAGIC:
+        raise ValueError("No es un estado de sesión codificado.")
+    if version != CODEC_VERSION:
+        raise ValueError(f"Versión de estado de sesión {version} no soportada (se esperaba {CODEC_VERSION}).")
+
+    state = new_session_state(data)
+    state["bot_message"] = ""
+    mode, flags, page = reader.unpack(FIELDS)
+    if mode >= len(MODES):
+        raise ValueError(f"Modo {mode} desconocido.")
+    state["mode"] = MODES[mode]
+    state["catalog_page"] = page
+    state["order_confirmed"] = bool(flags & ORDER_CONFIRMED)
+    for name in STRING_FIELDS:
+        state[name] = reader.string()
+    coupon_code = reader.string()
+    if flags & HAS_ORDER_TOTAL:
+        (state["last_order_total"],) = reader.unpack(TOTAL)
+
+    cart = state["cart"]
+    (count,) = reader.unpack(COUNT)
+    for _ in range(count):
+        product_id, quantity = reader.unpack(CART_LINE)
+        product = find_product_by_id(data.catalog, product_id)
+        if product is not None:
+            cart.add_item(product, quantity)
+    if coupon_code:
+        cart.applied_coupon = find_coupon_by_code(data.coupons, coupon_code)
+    state["applied_coupon_code"] = cart.applied_coupon.code if cart.applied_coupon else None
+
+    (start,) = reader.unpack(COUNT)
+    (count,) = reader.unpack(COUNT)
+    entries: list[tuple[str, "str | MessageRef"]] = []
+    for _ in range(count):
+        role, kind = reader.unpack(MESSAGE)
+        if role >= len(ROLES):
+            raise ValueError(f"Rol de mensaje {role} desconocido.")
+        if kind == STATIC:
+            payload = MessageRef(reader.string() or "")
+            if not is_static_message(payload):
+                raise ValueError(f"Mensaje fijo {payload.template!r} no registrado.")
+        elif kind == TEXT:
+            payload = reader.string()
+        else:
+            raise ValueError(f"Tipo de mensaje {kind} desconocido.")
+        entries.append((ROLES[role], payload))
+    reader.finish()
+    state["chat_history"] = ChatHistory.from_entries(entries, start=start, catalog=data.catalog)
+    return state
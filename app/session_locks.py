@@ -0,0 +1,102 @@
+"""
+Locks por sesión para atender peticiones en varios hilos.
+
+Cada sesión cae en una de N franjas con su propio lock (como
+domain.coupons.RedemptionCounters): dos peticiones de la misma sesión (un
+doble clic en "añadir") se atienden una detrás de otra, y las de sesiones
+distintas casi nunca comparten lock, así que corren en paralelo.
+
+- SessionLocks: threading.Lock, para app/flask_app.py (un hilo por petición).
+- AsyncSessionLocks: asyncio.Lock, para app/asgi_app.py (un event loop).
+
+Los dos miden cuánto se espera por el lock (`stats()`).
+"""
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterator
+import asyncio
+import threading
+import time
+
+DEFAULT_STRIPES = 256
+
+
+@dataclass(frozen=True)
+class LockStats:
+    stripes: int
+    acquisitions: int
+    # Veces que el lock estaba ocupado y hubo que esperar.
+    contended: int
+    wait_total: float
+    wait_max: float
+
+    @property
+    def wait_mean(self) -> float:
+        return self.wait_total / self.contended if self.contended else 0.0
+
+
+class _WaitMetrics:
+    def __init__(self, stripes: int):
+        self.stripes = stripes
+        self._lock = threading.Lock()
+        self._acquisitions = 0
+        self._contended = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _stripe(self, sid: str) -> int:
+        return hash(sid) % self.stripes
+
+    def _record(self, wait: float | None) -> None:
+        with self._lock:
+            self._acquisitions += 1
+            if wait is not None:
+                self._contended += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+
+    def stats(self) -> LockStats:
+        with self._lock:
+            return LockStats(self.stripes, self._acquisitions, self._contended, self._wait_total, self._wait_max)
+
+
+class SessionLocks(_WaitMetrics):
+    def __init__(self, stripes: int = DEFAULT_STRIPES):
+        super().__init__(stripes)
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    @contextmanager
+    def hold(self, sid: str) -> Iterator[None]:
+        lock = self._locks[self._stripe(sid)]
+        wait = None
+        if not lock.acquire(blocking=False):
+            start = time.perf_counter()
+            lock.acquire()
+            wait = time.perf_counter() - start
+        self._record(wait)
+        try:
+            yield
+        finally:
+            lock.release()
+
+
+class AsyncSessionLocks(_WaitMetrics):
+    def __init__(self, stripes: int = DEFAULT_STRIPES):
+        super().__init__(stripes)
+        self._locks = [asyncio.Lock() for _ in range(stripes)]
+
+    @asynccontextmanager
+    async def hold(self, sid: str) -> AsyncIterator[None]:
+        lock = self._locks[self._stripe(sid)]
+        wait = None
+        if lock.locked():
+            start = time.perf_counter()
+            await lock.acquire()
+            wait = time.perf_counter() - start
+        else:
+            await lock.acquire()
+        self._record(wait)
+        try:
+            yield
+        finally:
+            lock.release()
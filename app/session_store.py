@@ -0,0 +1,189 @@
+"""
+Dónde viven los estados de las sesiones entre peticiones (ver app/sessions.py).
+
+- MemorySessionStore: en el proceso, con LRU (como mucho `maxsize` sesiones)
+  y caducidad por inactividad (`ttl` segundos). Es la opción por defecto.
+- SQLiteSessionStore: en un fichero SQLite en modo WAL que comparten todos
+  los procesos del servidor, así que varios workers pueden atender la misma
+  sesión sin sticky sessions. Cada petición lee la sesión de disco y guarda
+  solo lo que ha cambiado (app/checkpoint.py). Si otro proceso ha guardado
+  la misma sesión desde que se leyó, `put` lanza SessionConflict en lugar
+  de pisar su cambio.
+
+Los dos cuentan aciertos, fallos, desalojos y caducadas (`stats()`).
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional, Protocol
+import threading
+import time
+
+from app.checkpoint import SessionCheckpointer
+from conversation.state import ConversationState
+from domain.shop_data import ShopData
+
+DEFAULT_MAX_SESSIONS = 10_000
+DEFAULT_SESSION_TTL = 24 * 3600
+
+
+@dataclass(frozen=True)
+class SessionStoreStats:
+    backend: str
+    size: int
+    maxsize: Optional[int]
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+
+
+class SessionStore(Protocol):
+    def get(self, sid: str, data: ShopData) -> Optional[ConversationState]:
+        """El estado de `sid`, o None si no existe (o ha caducado)."""
+
+    def put(self, sid: str, state: ConversationState) -> None:
+        ...
+
+    def stats(self) -> SessionStoreStats:
+        ...
+
+
+class MemorySessionStore:
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_MAX_SESSIONS,
+        ttl: Optional[float] = DEFAULT_SESSION_TTL,
+        clock: Callable[[], float] = time.monotonic,
+        on_evict: Optional[Callable[[str], None]] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._on_evict = on_evict
+        # sid -> (estado, último acceso), de menos a más reciente.
+        self._entries: "OrderedDict[str, tuple[ConversationState, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def _expired(self, last_access: float, now: float) -> bool:
+        return self.ttl is not None and now - last_access > self.ttl
+
+    def _drop(self, sid: str) -> None:
+        del self._entries[sid]
+        if self._on_evict is not None:
+            self._on_evict(sid)
+
+    def get(self, sid: str, data: ShopData) -> Optional[ConversationState]:
+        with self._lock:
+            now = self._clock()
+            entry = self._entries.get(sid)
+            if entry is not None and self._expired(entry[1], now):
+                self._drop(sid)
+                self._expirations += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries[sid] = (entry[0], now)
+            self._entries.move_to_end(sid)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, sid: str, state: ConversationState) -> None:
+        with self._lock:
+            now = self._clock()
+            self._entries[sid] = (state, now)
+            self._entries.move_to_end(sid)
+            # Las más antiguas están al principio: se caducan sin recorrer el resto.
+            while self._entries:
+                oldest, (_, last_access) = next(iter(self._entries.items()))
+                if not self._expired(last_access, now):
+                    break
+                self._drop(oldest)
+                self._expirations += 1
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self._evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> SessionStoreStats:
+        with self._lock:
+            return SessionStoreStats(
+                "memory", len(self._entries), self.maxsize,
+                self._hits, self._misses, self._evictions, self._expirations,
+            )
+
+
+class SQLiteSessionStore:
+    # Cada cuántos guardados se borran las sesiones caducadas.
+    PURGE_EVERY = 1000
+
+    def __init__(
+        self,
+        path: Path | str,
+        ttl: Optional[float] = DEFAULT_SESSION_TTL,
+        on_expire: Optional[Callable[[str], None]] = None,
+    ):
+        self.checkpointer = SessionCheckpointer(path)
+        self.ttl = ttl
+        self._on_expire = on_expire
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._hits = 0
+        self._misses = 0
+        self._expirations = 0
+
+    def get(self, sid: str, data: ShopData) -> Optional[ConversationState]:
+        from app.sessions import restore_session_state  # sessions importa este módulo
+
+        snapshot = self.checkpointer.load(sid)
+        with self._lock:
+            expired = (
+                snapshot is not None and self.ttl is not None and time.time() - snapshot.updated_at > self.ttl
+            )
+            if expired:
+                # Caducada aunque aún no se haya purgado: se empieza de cero.
+                self._expirations += 1
+                snapshot = None
+            if snapshot is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        if snapshot is None:
+            if expired and self._on_expire is not None:
+                self._on_expire(sid)
+            return None
+        return restore_session_state(snapshot, data)
+
+    def put(self, sid: str, state: ConversationState) -> None:
+        from app.sessions import session_record
+
+        self.checkpointer.save(sid, *session_record(state))
+        with self._lock:
+            self._puts += 1
+            purge = self._puts % self.PURGE_EVERY == 0
+        if purge:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """Borra las sesiones sin cambios en los últimos `ttl` segundos."""
+        if self.ttl is None:
+            return 0
+        purged = self.checkpointer.purge(time.time() - self.ttl)
+        with self._lock:
+            self._expirations += len(purged)
+        if self._on_expire is not None:
+            for sid in purged:
+                self._on_expire(sid)
+        return len(purged)
+
+    def stats(self) -> SessionStoreStats:
+        size = self.checkpointer.count()
+        with self._lock:
+            return SessionStoreStats("sqlite", size, None, self._hits, self._misses, 0, self._expirations)
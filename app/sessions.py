@@ -0,0 +1,236 @@
+"""
+Estado de las sesiones, compartido por la app Flask (app/flask_app.py) y la
+app asíncrona (app/asgi_app.py): no depende de ningún framework web.
+"""
+from pathlib import Path
+from typing import Mapping, Optional
+
+from app.checkpoint import SessionCheckpointer, SessionSnapshot
+from app.session_store import (
+    DEFAULT_MAX_SESSIONS,
+    DEFAULT_SESSION_TTL,
+    MemorySessionStore,
+    SQLiteSessionStore,
+    SessionStore,
+)
+from domain.catalog import find_product_by_id
+from domain.coupons import find_coupon_by_code
+from domain.models import Cart
+from domain.pricing import calculate_totals
+from domain.shop_data import ShopData
+from conversation.history import ChatHistory, register_static_message
+from conversation.state import ConversationState
+
+WELCOME_MESSAGE = (
+    "¡Hola! Bienvenido a nuestra tienda. Soy tu asistente de compras. Preguntame por nuestro catálogo "
+    "o dime que porductos quieres que añada a tu carrito."
+)
+register_static_message("welcome", WELCOME_MESSAGE)
+
+
+# Campos sueltos que se guardan en los checkpoints (el carrito y el historial van aparte).
+CHECKPOINT_FIELDS = (
+    "mode",
+    "catalog_page",
+    "catalog_category",
+    "applied_coupon_code",
+    "shipping_name",
+    "shipping_city",
+    "last_order_name",
+    "last_order_city",
+    "last_order_total",
+    "order_confirmed",
+)
+
+_checkpointer: Optional[SessionCheckpointer] = None
+_history_dir: Optional[Path] = None
+
+
+def configure_session_store(store: SessionStore) -> SessionStore:
+    """Cambia dónde se guardan las sesiones (ver app/session_store.py)."""
+    global _store
+    _store = store
+    return store
+
+
+def session_store() -> SessionStore:
+    return _store
+
+
+def enable_checkpoints(path: str) -> SessionCheckpointer:
+    """
+    Activa los checkpoints en SQLite (ver app/checkpoint.py) para un almacén
+    en memoria: las sesiones desalojadas o caducadas se recuperan de disco.
+    """
+    global _checkpointer
+    _checkpointer = SessionCheckpointer(path)
+    return _checkpointer
+
+
+def _drop_spill(sid: str) -> None:
+    path = _spill_path(sid)
+    if path is not None:
+        path.unlink(missing_ok=True)
+
+
+def release_session(sid: str) -> None:
+    """
+    Para MemorySessionStore(on_evict=...). Con checkpoints la sesión se podrá
+    recuperar de disco, así que solo se libera lo que el checkpointer recuerda
+    de ella; sin ellos se ha perdido y se borra su segmento del historial.
+    """
+    if _checkpointer is not None:
+        _checkpointer.forget(sid)
+    else:
+        _drop_spill(sid)
+
+
+_store: SessionStore = MemorySessionStore(on_evict=release_session)
+
+
+def enable_history_spill(directory: str | Path) -> Path:
+    """Los mensajes que salen del historial en memoria se vuelcan a `directory/<sid>.jsonl`."""
+    global _history_dir
+    _history_dir = Path(directory)
+    _history_dir.mkdir(parents=True, exist_ok=True)
+    return _history_dir
+
+
+def configure_from_env(environ: Mapping[str, str]) -> SessionStore:
+    """
+    Configuración de las sesiones para app/flask_app.py y app/asgi_app.py:
+    - SESSION_STORE=sqlite: sesiones compartidas entre procesos en SESSION_DB
+      (por defecto data/sessions.db); si no, en memoria con SESSION_MAX_SESSIONS
+      como máximo y, con SESSION_DB, checkpoints en disco,
+    - SESSION_TTL: segundos de inactividad tras los que caduca una sesión,
+    - CHAT_HISTORY_DIR: directorio para los mensajes antiguos del historial.
+    """
+    ttl = float(environ.get("SESSION_TTL", DEFAULT_SESSION_TTL))
+    if environ.get("SESSION_STORE") == "sqlite":
+        store = configure_session_store(
+            SQLiteSessionStore(environ.get("SESSION_DB", "data/sessions.db"), ttl, on_expire=_drop_spill)
+        )
+    else:
+        maxsize = int(environ.get("SESSION_MAX_SESSIONS", DEFAULT_MAX_SESSIONS))
+        store = configure_session_store(MemorySessionStore(maxsize, ttl, on_evict=release_session))
+        if environ.get("SESSION_DB"):
+            enable_checkpoints(environ["SESSION_DB"])
+    if environ.get("CHAT_HISTORY_DIR"):
+        enable_history_spill(environ["CHAT_HISTORY_DIR"])
+    return store
+
+
+def _spill_path(sid: str) -> Optional[Path]:
+    return _history_dir / f"{sid}.jsonl" if _history_dir is not None else None
+
+
+def new_session_state(data: ShopData) -> ConversationState:
+    return {
+        "mode": "catalog",
+        "cart": Cart(),
+        "catalog": data.catalog,
+        "coupons": data.coupons,
+        "data_version": data.version,
+        "catalog_page": 1,
+        "catalog_category": None,
+        "applied_coupon_code": None,
+        "last_user_message": "",
+        "shipping_name": None,
+        "shipping_city": None,
+        "last_order_name": None,
+        "last_order_city": None,
+        "last_order_total": None,
+        "order_confirmed": False,
+        "bot_message": WELCOME_MESSAGE,
+        "discount_summary": None,
+        "chat_history": ChatHistory([("bot", WELCOME_MESSAGE)], catalog=data.catalog),
+    }
+
+
+def sync_shop_data(state: ConversationState, data: ShopData) -> None:
+    """
+    Tras una recarga, apunta la sesión al catálogo/cupones nuevos y vuelve a
+    enlazar las líneas del carrito y el cupón aplicado con sus versiones nuevas.
+    """
+    state["catalog"] = data.catalog
+    state["coupons"] = data.coupons
+    state["data_version"] = data.version
+    state["chat_history"].rebind_catalog(data.catalog)
+
+    cart = state["cart"]
+    for product_id in list(cart.items):
+        product = find_product_by_id(data.catalog, product_id)
+        if product is not None:
+            cart.rebind_product(product)
+    if cart.applied_coupon is not None:
+        coupon = find_coupon_by_code(data.coupons, cart.applied_coupon.code)
+        if coupon is not None:
+            cart.applied_coupon = coupon
+
+
+def restore_session_state(snapshot: SessionSnapshot, data: ShopData) -> ConversationState:
+    """Rehace el estado de un checkpoint enlazándolo con el catálogo y los cupones actuales."""
+    state = new_session_state(data)
+    state.update({name: value for name, value in snapshot.fields.items() if name in CHECKPOINT_FIELDS})
+    state["bot_message"] = ""
+    state["chat_history"] = ChatHistory(snapshot.chat_history, start=snapshot.chat_start, catalog=data.catalog)
+
+    cart = state["cart"]
+    for product_id, quantity in snapshot.cart_lines.items():
+        product = find_product_by_id(data.catalog, product_id)
+        if product is not None:
+            cart.add_item(product, quantity)
+    code = state.get("applied_coupon_code")
+    if code:
+        cart.applied_coupon = find_coupon_by_code(data.coupons, code)
+        if cart.applied_coupon is None:
+            state["applied_coupon_code"] = None
+    return state
+
+
+def session_record(state: ConversationState) -> tuple[dict, dict[int, int], ChatHistory, int]:
+    """Lo que se guarda de una sesión: (campos, líneas del carrito, historial, inicio del historial)."""
+    cart = state["cart"]
+    fields = {name: state.get(name) for name in CHECKPOINT_FIELDS}
+    fields["applied_coupon_code"] = cart.applied_coupon.code if cart.applied_coupon else None
+    lines = {product_id: item.quantity for product_id, item in cart.items.items()}
+    history = state["chat_history"]
+    return fields, lines, history, history.start
+
+
+def load_session_state(sid: str, data: ShopData) -> ConversationState:
+    state = _store.get(sid, data)
+    if state is None:
+        snapshot = _checkpointer.load(sid) if _checkpointer is not None else None
+        if snapshot is None:
+            # Sesión nueva: un segmento que quedara con este sid no es suyo.
+            _drop_spill(sid)
+            state = new_session_state(data)
+        else:
+            state = restore_session_state(snapshot, data)
+        _store.put(sid, state)
+    state["chat_history"].spill_path = _spill_path(sid)
+    if state.get("data_version") != data.version:
+        sync_shop_data(state, data)
+    return state
+
+
+def save_session_state(sid: str, state: ConversationState) -> None:
+    _store.put(sid, state)
+    if _checkpointer is not None:
+        _checkpointer.save(sid, *session_record(state))
+
+
+def finish_turn(sid: str, state: ConversationState) -> ConversationState:
+    """Tras ejecutar el turno: totales, respuesta al historial y guardar el estado."""
+    if not state["cart"].is_empty():
+        state["discount_summary"] = calculate_totals(state["cart"])
+    else:
+        state["discount_summary"] = None
+
+    ref = state.pop("bot_message_ref", None)
+    if state.get("bot_message"):
+        state["chat_history"].append(("bot", state["bot_message"]), ref)
+
+    save_session_state(sid, state)
+    return state
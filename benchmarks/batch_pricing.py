@@ -0,0 +1,54 @@
+"""
+Benchmark de precios en lote: bucle de calculate_totals frente a CartBatch.
+
+Ejecución (requiere numpy):
+    python -m benchmarks.batch_pricing [n_carritos]
+"""
+import random
+import sys
+import time
+
+from domain.batch_pricing import CartBatch, PricingParams, with_cart_threshold
+from domain.models import Cart, Coupon, Product
+from domain.pricing import calculate_totals, get_promotion_plan
+
+COUPONS = [
+    Coupon(code="VIP20", type="percent", value=20, min_total=100),
+    Coupon(code="SUPER5", type="fixed", value=5, min_total=0),
+]
+
+
+def build_carts(n: int) -> list[Cart]:
+    rng = random.Random(1)
+    products = [Product(id=i, name=f"P{i}", price=round(rng.uniform(5, 90), 2)) for i in range(200)]
+    carts = []
+    for _ in range(n):
+        cart = Cart()
+        for product in rng.sample(products, rng.randint(1, 4)):
+            cart.add_item(product, rng.randint(1, 4))
+        cart.applied_coupon = rng.choice(COUPONS + [None, None])
+        carts.append(cart)
+    return carts
+
+
+def main(n: int = 200_000) -> None:
+    carts = build_carts(n)
+
+    start = time.perf_counter()
+    for cart in carts:
+        cart._totals_cache = None  # medir el cálculo, no la caché
+        calculate_totals(cart)
+    scalar = time.perf_counter() - start
+
+    batch = CartBatch.from_carts(carts)
+    start = time.perf_counter()
+    batch.simulate(PricingParams(plan=with_cart_threshold(get_promotion_plan(), 80)))
+    vectorized = time.perf_counter() - start
+
+    print(f"Carritos: {n}")
+    print(f"  calculate_totals en bucle   {scalar * 1000:9.1f} ms")
+    print(f"  CartBatch.simulate          {vectorized * 1000:9.1f} ms  (x{scalar / vectorized:.0f})")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
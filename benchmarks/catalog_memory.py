@@ -0,0 +1,81 @@
+"""
+Benchmark de memoria del catálogo: list[Product] frente a CompactCatalog.
+
+Ejecución:
+    python -m benchmarks.catalog_memory [n_productos]
+"""
+from dataclasses import dataclass
+from typing import Optional
+import sys
+import tracemalloc
+
+from domain.catalog import CatalogIndex
+from domain.compact_catalog import CompactCatalog, CompactProducts
+from domain.models import Product
+
+CATEGORIES = ["Ropa", "Calzado", "Accesorios", "Electrónica"]
+NOUNS = ["Camiseta", "Sudadera", "Pantalón", "Chaqueta", "Zapatillas", "Botas",
+         "Mochila", "Gorra", "Bufanda", "Reloj", "Auriculares", "Calcetines"]
+COLORS = ["azul", "roja", "negra", "gris", "blanca", "verde", "amarilla", "marrón"]
+STYLES = ["básica", "deportiva", "urbana", "ligera", "premium", "clásica", "slim"]
+
+
+@dataclass
+class DictProduct:
+    # Réplica del Product original (dataclass con __dict__), como referencia.
+    id: int
+    name: str
+    price: float
+    category: Optional[str] = None
+    description: Optional[str] = None
+    image: Optional[str] = None
+
+
+def synthetic_rows(n: int) -> list[dict]:
+    return [
+        {
+            "id": 100000 + i,
+            "name": f"{NOUNS[i % 12]} {COLORS[(i // 12) % 8]} {STYLES[(i // 96) % 7]} talla {i % 50}",
+            "price": round(5 + (i % 500) * 0.37, 2),
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "description": f"Descripción del producto {i}.",
+            "image": f"img/products/{100000 + i}.jpg",
+        }
+        for i in range(n)
+    ]
+
+
+def measure(build) -> tuple[object, int]:
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size
+
+
+def main(n: int = 200_000) -> None:
+    rows = synthetic_rows(n)
+
+    # Las cadenas de entrada se comparten entre todas las variantes; se
+    # copian para que cada medición incluya las suyas (como al leer el JSON).
+    def fresh():
+        return ({k: v.encode().decode() if isinstance(v, str) else v for k, v in r.items()} for r in rows)
+
+    results = {}
+    for label, build in [
+        ("list[DictProduct] (dataclass con __dict__)", lambda: [DictProduct(**r) for r in fresh()]),
+        ("list[Product] (slots)", lambda: [Product(**r) for r in fresh()]),
+        ("CompactProducts (solo almacenamiento)", lambda: CompactProducts(Product(**r) for r in fresh())),
+        ("CatalogIndex", lambda: CatalogIndex(Product(**r) for r in fresh())),
+        ("CompactCatalog", lambda: CompactCatalog(Product(**r) for r in fresh())),
+    ]:
+        _, size = measure(build)
+        results[label] = size
+
+    print(f"Productos: {n}")
+    for label, size in results.items():
+        print(f"  {label:<45} {size / 1e6:8.1f} MB  {size / n:7.1f} B/producto")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,61 @@
+"""
+Coste por turno: grafo de LangGraph (graph.invoke) frente a la tabla de
+conversation.dispatcher, con los mismos nodos y los mismos mensajes.
+
+Ejecución:
+    python -m benchmarks.dispatch [n_turnos]
+"""
+import sys
+import time
+
+from conversation.dispatcher import TurnDispatcher
+from conversation.graph import build_graph
+from domain.catalog import load_catalog
+from domain.coupons import load_coupon_registry
+from domain.models import Cart
+
+MESSAGES = ["hola", "ayuda", "ver carrito", "añade 1 gorra negra", "muéstrame el catálogo", "no sé"]
+
+
+def new_state() -> dict:
+    return {
+        "mode": "catalog",
+        "cart": Cart(),
+        "catalog": load_catalog(),
+        "coupons": load_coupon_registry(),
+        "applied_coupon_code": None,
+        "last_user_message": "",
+        "shipping_name": None,
+        "shipping_city": None,
+        "bot_message": "",
+        "discount_summary": None,
+        "chat_history": [],
+        "order_confirmed": False,
+    }
+
+
+def run(engine, messages: list[str], n: int) -> float:
+    state = new_state()
+    start = time.perf_counter()
+    for i in range(n):
+        state["last_user_message"] = messages[i % len(messages)]
+        state = engine.invoke(state)
+        if len(state["cart"].items) and i % 100 == 0:
+            state["cart"].clear()
+    return time.perf_counter() - start
+
+
+def main(n: int = 20_000) -> None:
+    engines = {"LangGraph": build_graph(), "tabla": TurnDispatcher()}
+    print(f"Turnos: {n}")
+    for label, messages in (("estáticos", ["hola", "ayuda", "no sé"]), ("mezcla", MESSAGES)):
+        times = {name: run(engine, messages, n) for name, engine in engines.items()}
+        graph_time, table_time = times["LangGraph"], times["tabla"]
+        print(
+            f"  {label:<10} LangGraph {graph_time * 1e6 / n:8.1f} µs/turno   "
+            f"tabla {table_time * 1e6 / n:8.1f} µs/turno  (x{graph_time / table_time:.1f})"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
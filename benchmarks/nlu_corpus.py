@@ -0,0 +1,239 @@
+"""
+Corpus etiquetado para medir el NLU en velocidad y en acierto.
+
+Genera mensajes en español a partir de plantillas por intención (todas las
+de IntentType), con los productos de data/products.json, los cupones de
+data/coupons.json, cantidades e ids, y variaciones de mayúsculas, acentos y
+signos. Después pasa el corpus por parse_user_message e informa de:
+- precisión y recall por intención, y acierto de los slots (id, cantidad, cupón),
+- mensajes por segundo y latencias p50/p99 por mensaje.
+
+Ejecución:
+    python -m benchmarks.nlu_corpus [n_mensajes]
+"""
+from collections import Counter
+from typing import Optional, get_args
+import random
+import sys
+import time
+import unicodedata
+
+from conversation.nlu import IntentType, parse_cache_info, parse_user_message
+from domain.catalog import read_products
+from domain.coupons import load_coupons
+
+# Marcadores: {product} nombre, {id} id, {qty} cantidad, {old} otra cantidad, {coupon} código.
+TEMPLATES: dict[str, list[str]] = {
+    "show_catalog": [
+        "muéstrame el catálogo",
+        "¿qué productos tenéis?",
+        "quiero ver productos",
+        "enséñame la tienda",
+        "ver catálogo",
+        "¿qué tienes?",
+        "siguiente página",
+        "página {qty}",
+        "más productos",
+    ],
+    "show_cart": [
+        "ver carrito",
+        "¿qué llevo en el carrito?",
+        "enséñame la cesta",
+        "mostrar carrito",
+        "¿cómo va mi carro?",
+    ],
+    "add_to_cart": [
+        "añade {qty} {product}",
+        "añade {product}",
+        "pon {qty} unidades de {product}",
+        "agrega el producto {id}",
+        "mete {qty} del {id}",
+        "quiero comprar {product}",
+        "échame {qty} {product}",
+        "incluye {product} x{qty}",
+        "añade {product} al carrito",
+        "pon el producto {id} en la cesta",
+    ],
+    "remove_from_cart": [
+        "quita {product}",
+        "elimina el producto {id}",
+        "borra {product} de la lista",
+        "saca el artículo {id}",
+        "quítame {product}",
+        "retira {product}",
+    ],
+    "update_quantity": [
+        "cambia {product} a {qty}",
+        "modifica el producto {id} a {qty} unidades",
+        "pon {qty} en lugar de {old} del producto {id}",
+        "actualiza {product} a {qty}",
+        "deja {qty} de {product}",
+        "ajusta el producto {id} a {qty}",
+    ],
+    "checkout": [
+        "quiero finalizar la compra",
+        "pagar",
+        "tramitar pedido",
+        "confirmar compra",
+        "quiero realizar el pago",
+    ],
+    "apply_coupon": [
+        "aplica el cupón {coupon}",
+        "tengo el cupón {coupon}",
+        "usa el descuento {coupon}",
+        "promo {coupon}",
+    ],
+    "best_coupon": [
+        "¿qué cupón me conviene?",
+        "¿cuál es el mejor cupón?",
+        "dame el mejor descuento",
+        "¿cuál cupón me sale mejor?",
+    ],
+    "exit": [
+        "salir",
+        "adiós",
+        "hasta luego",
+        "quiero terminar",
+        "cerrar sesión",
+    ],
+    "smalltalk": [
+        "¿qué tiempo hace?",
+        "¿cómo está el clima hoy?",
+        "¿va a hacer buen tiempo mañana?",
+    ],
+    "help": [
+        "ayuda",
+        "¿cómo funciona esto?",
+        "¿qué puedo hacer?",
+        "instrucciones",
+        "ayúdame por favor",
+    ],
+    "greeting": [
+        "hola",
+        "buenas tardes",
+        "buenos días",
+        "hey",
+        "¿qué tal?",
+    ],
+    "unknown": [
+        "no sé",
+        "vale",
+        "mmm",
+        "{product}",
+        "jajaja",
+        "gracias",
+    ],
+}
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(
+        ch for ch in unicodedata.normalize("NFD", text) if unicodedata.category(ch) != "Mn"
+    )
+
+
+def _vary(text: str, rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.15:
+        text = _strip_accents(text)
+    elif roll < 0.25:
+        text = text.upper()
+    elif roll < 0.5:
+        text = text[:1].upper() + text[1:]
+    if rng.random() < 0.2:
+        text = text.rstrip("?") + rng.choice(["!", ".", "", " por favor"])
+    return text
+
+
+def generate_corpus(n: int, seed: int = 11) -> list[tuple[str, str, dict[str, Optional[object]]]]:
+    """
+    Lista de (mensaje, intención esperada, slots esperados). Los slots solo
+    incluyen lo que la plantilla fija sin ambigüedad (id, cantidad, cupón).
+    """
+    rng = random.Random(seed)
+    products = read_products()
+    coupons = [c.code for c in load_coupons()]
+    intents = list(TEMPLATES)
+    missing = set(get_args(IntentType)) - set(intents)
+    assert not missing, f"Intenciones sin plantillas: {missing}"
+
+    corpus = []
+    for _ in range(n):
+        intent = rng.choice(intents)
+        template = rng.choice(TEMPLATES[intent])
+        product = rng.choice(products)
+        qty = rng.randint(2, 9)
+        old = qty - 1
+        coupon = rng.choice(coupons)
+        message = template.format(
+            product=product.name.lower(), id=product.id, qty=qty, old=old, coupon=coupon,
+        )
+
+        slots: dict[str, Optional[object]] = {}
+        if "{id}" in template:
+            slots["product_id"] = product.id
+        if "{qty}" in template and intent in ("add_to_cart", "update_quantity"):
+            slots["quantity"] = qty
+        if "{coupon}" in template:
+            slots["coupon_code"] = coupon
+        corpus.append((_vary(message, rng), intent, slots))
+    return corpus
+
+
+def _percentile(sorted_values: list[int], p: float) -> int:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def main(n: int = 100_000) -> None:
+    corpus = generate_corpus(n)
+
+    results = []
+    latencies: list[int] = []
+    slot_total = slot_ok = 0
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for message, _, _ in corpus:
+        t0 = clock()
+        parsed = parse_user_message(message)
+        latencies.append(clock() - t0)
+        results.append(parsed)
+    elapsed = time.perf_counter() - start
+
+    predicted = [parsed.intent for parsed in results]
+    for (_, _, slots), parsed in zip(corpus, results):
+        for name, value in slots.items():
+            slot_total += 1
+            slot_ok += getattr(parsed, name) == value
+
+    true_positive: Counter = Counter()
+    predicted_count: Counter = Counter(predicted)
+    expected_count: Counter = Counter(intent for _, intent, _ in corpus)
+    confusions: Counter = Counter()
+    for (_, expected, _), got in zip(corpus, predicted):
+        if expected == got:
+            true_positive[expected] += 1
+        else:
+            confusions[(expected, got)] += 1
+
+    print(f"Mensajes: {n}")
+    print(f"{'intención':<18}{'precisión':>10}{'recall':>10}{'n':>9}")
+    for intent in TEMPLATES:
+        precision = true_positive[intent] / predicted_count[intent] if predicted_count[intent] else 0.0
+        recall = true_positive[intent] / expected_count[intent] if expected_count[intent] else 0.0
+        print(f"{intent:<18}{precision:>10.3f}{recall:>10.3f}{expected_count[intent]:>9}")
+    accuracy = sum(true_positive.values()) / n
+    print(f"Acierto global de intención: {accuracy:.3f}")
+    if slot_total:
+        print(f"Acierto de slots: {slot_ok / slot_total:.3f} ({slot_total} slots)")
+    for (expected, got), count in confusions.most_common(5):
+        print(f"  confusión {expected} -> {got}: {count}")
+
+    latencies.sort()
+    cache = parse_cache_info()
+    print(f"Rendimiento: {n / elapsed:,.0f} mensajes/s")
+    print(f"Latencia: p50 {_percentile(latencies, 0.5) / 1000:.1f} µs  p99 {_percentile(latencies, 0.99) / 1000:.1f} µs")
+    print(f"Caché del NLU: {cache.hits} aciertos, {cache.misses} fallos")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,140 @@
+"""
+Benchmark de parse_user_message: detección de keywords con un único patrón
+compilado (keyword_hits) y caché por texto normalizado, frente a la versión
+anterior, que reconstruía las listas de keywords en cada llamada y las
+recorría con any(k in text ...).
+
+La referencia reproduce la detección de keywords anterior; la extracción de
+slots (ids, cantidades, cupón) es la misma en ambas, así que también se
+comprueba que las dos devuelven exactamente el mismo ParsedIntent.
+
+Ejecución:
+    python -m benchmarks.nlu_keywords [n_mensajes]
+"""
+import random
+import re
+import sys
+import time
+
+from conversation.nlu import (
+    ParsedIntent,
+    extract_product_id,
+    extract_quantity,
+    normalize,
+    parse_user_message,
+    pick_update_quantity,
+)
+
+MESSAGES = [
+    "hola",
+    "buenas tardes",
+    "ayuda",
+    "ver carrito",
+    "qué llevo en el carrito",
+    "muéstrame el catálogo",
+    "qué productos tenéis",
+    "siguiente página",
+    "añade 2 camisetas azules",
+    "pon 1 producto 101",
+    "añade 2 del 402",
+    "quita la gorra negra",
+    "elimina producto 101",
+    "cambia la camiseta azul a 3",
+    "pon 3 en lugar de 1 del producto 402",
+    "aplica el cupón VIP20",
+    "¿qué cupón me conviene?",
+    "quiero finalizar la compra",
+    "¿qué tiempo hace?",
+    "salir",
+    "Soy Ana de Madrid",
+    "no sé",
+]
+
+
+def legacy_parse_user_message(message: str) -> ParsedIntent:
+    raw = message
+    text = normalize(message)
+
+    exit_keywords = ["salir", "terminar", "cerrar", "adios", "hasta luego"]
+    cart_keywords = ["carrito", "carro", "cesta", "basket"]
+    coupon_keywords = ["cupon", "cupones", "descuento", "promo", "promocion"]
+    best_coupon_keywords = [
+        "conviene", "mejor cupon", "mejor descuento", "mejor promo", "que cupon", "cual cupon", "mas ahorro",
+    ]
+    checkout_keywords = ["finalizar", "pagar", "tramitar pedido", "terminar compra", "confirmar compra",
+                         "quiero finalizar la compra", "realizar el pago", "finalizar compra"]
+    catalog_keywords = ["catalogo", "productos", "tienda", "que teneis", "que tienes", "muestrame el catalogo",
+                        "mostrar catalogo", "ver catalogo", "ver productos", "que puedo comprar", "pagina",
+                        "mas productos"]
+    add_keywords = ["anade", "añade", "agrega", "añadir", "meter", "mete", "pon", "incluye", "sumar", "compra",
+                    "comprar", "agregame", "echame"]
+    remove_keywords = ["quita", "quitar", "elimina", "borra", "saca", "retira", "eliminalo", "quitame"]
+    update_keywords = ["cambia", "cambiar", "ajusta", "ajustar", "modifica", "modificar", "actualiza",
+                       "actualizar", "deja"]
+    greeting_keywords = ["hola", "buenas", "buenos dias", "buenas tardes", "buenas noches", "hey", "que tal",
+                         "que hay"]
+    help_keywords = ["ayuda", "como funciona", "que puedo hacer", "que sabes hacer", "como te uso",
+                     "instrucciones", "ayudame"]
+
+    if any(k in text for k in exit_keywords):
+        return ParsedIntent(intent="exit")
+    if any(k in text for k in greeting_keywords):
+        return ParsedIntent(intent="greeting")
+    if any(k in text for k in help_keywords):
+        return ParsedIntent(intent="help")
+    if any(k in text for k in cart_keywords):
+        return ParsedIntent(intent="show_cart")
+    if any(k in text for k in coupon_keywords) and any(k in text for k in best_coupon_keywords):
+        return ParsedIntent(intent="best_coupon")
+    if any(k in text for k in coupon_keywords):
+        m = re.search(r"(?:cupon|cup[oó]n|descuento|promo)\s+([a-zA-Z0-9_-]+)", raw, re.IGNORECASE)
+        return ParsedIntent(intent="apply_coupon", coupon_code=m.group(1) if m else None)
+    if any(k in text for k in checkout_keywords):
+        return ParsedIntent(intent="checkout")
+    if any(k in text for k in update_keywords) or (
+        re.search(r"\ben\s+(lugar|vez)\s+de\b", text) and "pon" in text
+    ):
+        pid = extract_product_id(raw)
+        return ParsedIntent(intent="update_quantity", product_id=pid, quantity=pick_update_quantity(text, pid),
+                            product_name=raw if pid is None else None)
+    if any(k in text for k in add_keywords):
+        pid = extract_product_id(raw)
+        qty = extract_quantity(text)
+        if pid is not None and qty == pid:
+            qty = None
+        return ParsedIntent(intent="add_to_cart", product_id=pid, quantity=qty,
+                            product_name=raw if pid is None else None)
+    if any(k in text for k in remove_keywords):
+        pid = extract_product_id(raw)
+        return ParsedIntent(intent="remove_from_cart", product_id=pid, product_name=raw if pid is None else None)
+    if any(k in text for k in catalog_keywords):
+        return ParsedIntent(intent="show_catalog")
+    if "tiempo" in text or "clima" in text:
+        return ParsedIntent(intent="smalltalk")
+    return ParsedIntent(intent="unknown")
+
+
+def measure(parse, messages: list[str]) -> float:
+    start = time.perf_counter()
+    for message in messages:
+        parse(message)
+    return time.perf_counter() - start
+
+
+def main(n: int = 200_000) -> None:
+    rng = random.Random(5)
+    messages = [rng.choice(MESSAGES) for _ in range(n)]
+
+    for message in MESSAGES:
+        assert parse_user_message(message) == legacy_parse_user_message(message), message
+
+    legacy_time = measure(legacy_parse_user_message, messages)
+    compiled_time = measure(parse_user_message, messages)
+
+    print(f"Mensajes: {n}")
+    print(f"  listas + any()      {legacy_time * 1e6 / n:6.2f} µs/mensaje")
+    print(f"  patrón + caché     {compiled_time * 1e6 / n:6.2f} µs/mensaje  (x{legacy_time / compiled_time:.2f})")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,89 @@
+"""
+Benchmark del motor de promociones con más de 100 reglas activas:
+plan compilado (una pasada por línea) frente a evaluar regla por regla
+recorriendo el carrito en cada una.
+
+Ejecución:
+    python -m benchmarks.promotions [n_carritos]
+"""
+import random
+import sys
+import time
+
+from domain.models import Cart, Product
+from domain.promotions import compile_rules
+
+CATEGORIES = [f"Categoría {i}" for i in range(40)]
+
+
+def build_rules() -> list[dict]:
+    rules = []
+    for i, category in enumerate(CATEGORIES):
+        rules.append({"id": f"multi-{i}", "type": "multibuy", "group_size": 2 + i % 3,
+                      "discount": 0.2 + (i % 5) * 0.05, "categories": [category]})
+        rules.append({"id": f"pct-{i}", "type": "percent", "rate": 0.05, "categories": [category],
+                      "stackable": i % 2 == 0})
+    for i in range(40):
+        rules.append({"id": f"sku-{i}", "type": "percent", "rate": 0.1, "product_ids": [i * 25]})
+    rules.append({"id": "3x", "type": "multibuy", "group_size": 3, "discount": 0.25})
+    rules.append({"id": "tramos", "type": "cart_threshold",
+                  "tiers": [{"min_total": 100, "rate": 0.05}, {"min_total": 250, "rate": 0.1}]})
+    return rules
+
+
+def naive_line_discount(rules: list[dict], cart: Cart) -> float:
+    """Referencia: cada regla recorre todo el carrito."""
+    best: dict[int, float] = {}
+    stacked: dict[int, float] = {}
+    for rule in rules:
+        if rule["type"] == "cart_threshold":
+            continue
+        for item in cart.items.values():
+            p = item.product
+            if "categories" in rule and p.category not in rule["categories"]:
+                continue
+            if "product_ids" in rule and p.id not in rule["product_ids"]:
+                continue
+            if rule["type"] == "multibuy":
+                amount = (item.quantity // rule["group_size"]) * p.price * rule["discount"]
+            else:
+                amount = p.price * item.quantity * rule["rate"]
+            if rule.get("stackable"):
+                stacked[p.id] = stacked.get(p.id, 0.0) + amount
+            else:
+                best[p.id] = max(best.get(p.id, 0.0), amount)
+    return sum(
+        min(best.get(i.product.id, 0.0) + stacked.get(i.product.id, 0.0), i.product.price * i.quantity)
+        for i in cart.items.values()
+    )
+
+
+def main(n: int = 20_000) -> None:
+    rng = random.Random(3)
+    rules = build_rules()
+    plan = compile_rules(rules)
+    products = [Product(id=i, name=f"P{i}", price=round(rng.uniform(5, 90), 2),
+                        category=rng.choice(CATEGORIES)) for i in range(1000)]
+    carts = []
+    for _ in range(n):
+        cart = Cart()
+        for product in rng.sample(products, rng.randint(1, 6)):
+            cart.add_item(product, rng.randint(1, 5))
+        carts.append(cart)
+
+    start = time.perf_counter()
+    naive = [naive_line_discount(rules, cart) for cart in carts]
+    naive_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = [plan.evaluate_lines(cart.items.values())[1] for cart in carts]
+    compiled_time = time.perf_counter() - start
+
+    assert all(abs(a - b) < 1e-9 for a, b in zip(naive, compiled))
+    print(f"Reglas activas: {len(rules)}  Carritos: {n}")
+    print(f"  regla por regla   {naive_time * 1e6 / n:8.1f} µs/carrito")
+    print(f"  plan compilado    {compiled_time * 1e6 / n:8.1f} µs/carrito  (x{naive_time / compiled_time:.0f})")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,66 @@
+"""
+Benchmark de ProductMatcher sobre un catálogo sintético grande: tiempo de
+construcción del índice y latencia media y p99 por consulta, con consultas
+de palabras muy comunes ('quita las botas'), plurales, erratas y códigos
+de modelo.
+
+Ejecución:
+    python -m benchmarks.search [n_productos]
+"""
+import sys
+import time
+
+from benchmarks.catalog_memory import synthetic_rows
+from domain.models import Product
+from domain.search import ProductMatcher
+
+MODELS = ["XT", "HS", "PRO", "AIR", "MAX", "LT"]
+
+QUERIES = [
+    "quita las botas",
+    "añade 2 camisetas azules",
+    "pon la mochila negra urbana",
+    "quiero la sudadera gris deportiva talla 12",
+    "zapatilas blancas",
+    "añade el reloj MAX-0421",
+    "pon una gorra air-1235",
+    "quiero algo que no tengáis",
+]
+
+
+def synthetic_products(n: int) -> list[Product]:
+    return [
+        Product(
+            id=row["id"],
+            name=f"{row['name']} {MODELS[i % len(MODELS)]}-{i % 5000:04d}",
+            price=row["price"],
+            category=row["category"],
+        )
+        for i, row in enumerate(synthetic_rows(n))
+    ]
+
+
+def main(n: int = 200_000, repeat: int = 200) -> None:
+    products = synthetic_products(n)
+
+    start = time.perf_counter()
+    matcher = ProductMatcher(products)
+    build = time.perf_counter() - start
+    print(f"Productos: {n}   índice construido en {build:.2f} s")
+
+    print(f"  {'consulta':<45} {'media':>10} {'p99':>10}  mejor resultado")
+    for query in QUERIES:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            matches = matcher.search(query)
+            times.append(time.perf_counter() - start)
+        times.sort()
+        best = f"{matches[0].product.name} ({matches[0].score})" if matches else "-"
+        print(
+            f"  {query:<45} {sum(times) / repeat * 1e3:>7.3f} ms {times[int(repeat * 0.99)] * 1e3:>7.3f} ms  {best}"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
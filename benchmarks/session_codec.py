@@ -0,0 +1,76 @@
+"""
+Tamaño y velocidad de app.session_codec frente a serializar el estado
+entero con pickle, con el catálogo y los cupones como listas y el
+historial expandido (arrastra además los Product de cada línea del carrito).
+
+Ejecución:
+    python -m benchmarks.session_codec [n_repeticiones]
+"""
+import pickle
+import sys
+import time
+
+from app.session_codec import decode_state, encode_state
+from app.sessions import new_session_state
+from conversation.dispatcher import TurnDispatcher
+from domain.catalog import load_catalog
+from domain.coupons import load_coupon_registry
+from domain.shop_data import ShopData
+
+CONVERSATION = [
+    "muéstrame el catálogo",
+    "añade 2 camisetas azules",
+    "añade 1 gorra negra",
+    "ayuda",
+    "siguiente página",
+    "ver carrito",
+    "aplica el cupón BIENVENIDA10",
+    "quiero finalizar la compra",
+]
+
+
+def build_state(data: ShopData) -> dict:
+    """Una sesión a mitad de compra, con historial, como la deja la app."""
+    engine = TurnDispatcher()
+    state = new_session_state(data)
+    for message in CONVERSATION:
+        state["last_user_message"] = message
+        state["chat_history"].append(("user", message))
+        state = engine.invoke(state)
+        state["chat_history"].append(("bot", state["bot_message"]), state.pop("bot_message_ref", None))
+    return state
+
+
+def timed(fn, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n
+
+
+def main(n: int = 5_000) -> None:
+    data = ShopData(version=1, catalog=load_catalog(), coupons=load_coupon_registry())
+    state = build_state(data)
+    naive = {
+        **state,
+        "catalog": list(data.catalog),
+        "coupons": list(data.coupons),
+        "chat_history": list(state["chat_history"]),
+    }
+
+    blob = encode_state(state)
+    pickled = pickle.dumps(naive)
+
+    print(f"Productos en el catálogo: {len(data.catalog)}   mensajes en el historial: {len(state['chat_history'])}")
+    print(f"  {'':<8} {'bytes':>8} {'codificar':>12} {'decodificar':>12}")
+    for label, size, encode, decode in (
+        ("pickle", len(pickled), lambda: pickle.dumps(naive), lambda: pickle.loads(pickled)),
+        ("codec", len(blob), lambda: encode_state(state), lambda: decode_state(blob, data)),
+    ):
+        print(
+            f"  {label:<8} {size:>8} {timed(encode, n) * 1e6:>9.1f} µs {timed(decode, n) * 1e6:>9.1f} µs"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000)
@@ -0,0 +1,50 @@
+"""
+Alternativa ligera al grafo compilado de LangGraph.
+
+El flujo de un turno es siempre router -> un nodo -> fin, así que se puede
+resolver con una tabla: se ejecuta el router, route_decision elige el nodo y
+se llama directamente a su función (NODE_HANDLERS), sin la gestión de canales
+ni las copias de estado de LangGraph. Los nodos puramente estáticos (ayuda,
+saludo, charla, no entendido) devuelven su respuesta ya construida.
+
+TurnDispatcher tiene la misma interfaz que el grafo (`invoke(state)` y
+`ainvoke(state)`), pero modifica y devuelve el mismo dict en lugar de una copia.
+"""
+import asyncio
+
+from .graph import (
+    GREETING_MESSAGE,
+    HELP_MESSAGE,
+    NODE_HANDLERS,
+    SMALLTALK_MESSAGE,
+    UNKNOWN_MESSAGE,
+    route_decision,
+    router_node,
+)
+from .state import ConversationState
+
+STATIC_RESPONSES = {
+    "help": HELP_MESSAGE,
+    "greeting": GREETING_MESSAGE,
+    "smalltalk": SMALLTALK_MESSAGE,
+    "unknown": UNKNOWN_MESSAGE,
+}
+
+
+class TurnDispatcher:
+    def invoke(self, state: ConversationState) -> ConversationState:
+        state = router_node(state)
+        node = route_decision(state)
+        response = STATIC_RESPONSES.get(node)
+        if response is not None:
+            state["bot_message"] = response
+            return state
+        return NODE_HANDLERS[node](state)
+
+    async def ainvoke(self, state: ConversationState) -> ConversationState:
+        # Los nodos son síncronos: se ejecutan en un hilo, fuera del event loop.
+        return await asyncio.to_thread(self.invoke, state)
+
+
+def build_dispatcher() -> TurnDispatcher:
+    return TurnDispatcher()
@@ -1,24 +1,68 @@
 from langgraph.graph import StateGraph, END
+from .history import MessageRef, register_static_message, register_template
 from .state import ConversationState
-from .nlu import parse_user_message
-from domain.catalog import find_product_by_id, find_product_by_name
-from domain.coupons import find_coupon_by_code
-from domain.pricing import calculate_totals
+from .nlu import parse_user_message, parse_operations, normalize, extract_page_request
+from domain.catalog import CatalogIndex, as_catalog_index, find_product_by_id, search_products
+from domain.coupons import as_coupon_registry
+from domain.pricing import calculate_totals, render_cart_fragment
 
+from collections import OrderedDict
+from math import ceil
 import re
+import threading
+import weakref
+
+
+# Intenciones que pueden esconder varias operaciones de carrito en un mensaje.
+CART_EDIT_INTENTS = ("add_to_cart", "remove_from_cart", "update_quantity", "show_cart")
+_SEVERAL_PARTS_RE = re.compile(r",|\by\b", re.IGNORECASE)
 
 
 def router_node(state: ConversationState) -> ConversationState:
-    # Nodo de entrada, no modifica el estado.
+    # Nodo de entrada: interpreta el mensaje una sola vez por turno; el
+    # ruteo y los nodos reutilizan state["parsed_intent"].
+    message = state["last_user_message"]
+    parsed = parse_user_message(message)
+    state["parsed_intent"] = parsed
+
+    operations = []
+    if parsed.intent in CART_EDIT_INTENTS and _SEVERAL_PARTS_RE.search(message):
+        operations = parse_operations(message, as_catalog_index(state["catalog"]).gazetteer)
+    state["cart_operations"] = operations if len(operations) > 1 else []
     return state
 
 
-def handle_catalog(state: ConversationState) -> ConversationState:
-    """
-    Muestra el catálogo en forma de tabla HTML.
-    """
+def _current_intent(state: ConversationState):
+    # Un nodo llamado sin pasar por el router interpreta el mensaje él mismo.
+    parsed = state.get("parsed_intent")
+    if parsed is None:
+        parsed = parse_user_message(state["last_user_message"])
+        state["parsed_intent"] = parsed
+    return parsed
+
+
+CATALOG_PAGE_SIZE = 10
+CATALOG_PAGE_CACHE_SIZE = 256
+
+# Fragmentos HTML de páginas del catálogo, por catálogo (una recarga crea un
+# catálogo nuevo, así que sus páginas se regeneran) y por (categoría, página).
+# El mismo str se reutiliza en todas las sesiones.
+# Lo comparten los hilos de todas las sesiones, así que se consulta con un lock.
+_catalog_page_cache: "weakref.WeakKeyDictionary[CatalogIndex, OrderedDict]" = weakref.WeakKeyDictionary()
+_catalog_page_lock = threading.Lock()
+
+
+def _render_catalog_page(catalog: CatalogIndex, category: str | None, page: int) -> str:
+    key = (category, page)
+    with _catalog_page_lock:
+        pages = _catalog_page_cache.setdefault(catalog, OrderedDict())
+        if key in pages:
+            pages.move_to_end(key)
+            return pages[key]
+
+    total_pages = max(1, ceil(catalog.count(category) / CATALOG_PAGE_SIZE))
     rows = []
-    for p in state["catalog"]:
+    for p in catalog.page(page, CATALOG_PAGE_SIZE, category):
         rows.append(
             "<tr>"
             f"<td>{p.id}</td>"
@@ -27,20 +71,85 @@ def handle_catalog(state: ConversationState) -> ConversationState:
             "</tr>"
         )
 
+    title = f" de <strong>{category}</strong>" if category else ""
     html = (
-        "<p>Estos son algunos de nuestros productos, ¿deseas añadir alguno?</p>"
+        f"<p>Estos son algunos de nuestros productos{title}, ¿deseas añadir alguno?</p>"
         "<table class='catalog-table'>"
         "<thead><tr><th>ID producto</th><th>Nombre</th><th>Precio</th></tr></thead>"
         "<tbody>"
         + "".join(rows)
         + "</tbody></table>"
     )
+    if total_pages > 1:
+        html += (
+            f"<p>Página {page} de {total_pages}. Escribe <em>'siguiente página'</em>, "
+            "<em>'página anterior'</em> o <em>'página 3'</em> para moverte.</p>"
+        )
+    categories = catalog.categories
+    if len(categories) > 1 and category is None:
+        html += f"<p>Puedes filtrar por categoría: {', '.join(categories)}.</p>"
 
-    state["bot_message"] = html
+    with _catalog_page_lock:
+        pages[key] = html
+        if len(pages) > CATALOG_PAGE_CACHE_SIZE:
+            pages.popitem(last=False)
+    return html
+
+
+register_template("catalog_page", _render_catalog_page, uses_catalog=True)
+
+
+def handle_catalog(state: ConversationState) -> ConversationState:
+    """
+    Muestra una página del catálogo en forma de tabla HTML.
+    Soporta filtro por categoría ('catálogo de ropa') y navegación
+    ('siguiente página', 'página anterior', 'página 3').
+    """
+    catalog = as_catalog_index(state["catalog"])
+    text = normalize(state["last_user_message"])
+
+    category = next(
+        (c for c in catalog.categories if re.search(rf"\b{re.escape(normalize(c))}\b", text)),
+        None,
+    )
+    page_request = extract_page_request(text)
+
+    if category is None and page_request is not None:
+        # Se navega dentro del listado que se estaba viendo.
+        category = state.get("catalog_category")
+        page = state.get("catalog_page") or 1
+        if page_request == "next":
+            page += 1
+        elif page_request == "prev":
+            page -= 1
+        else:
+            page = page_request
+    elif isinstance(page_request, int):
+        page = page_request
+    else:
+        page = 1
+
+    total_pages = max(1, ceil(catalog.count(category) / CATALOG_PAGE_SIZE))
+    page = min(max(page, 1), total_pages)
+
+    state["catalog_category"] = category
+    state["catalog_page"] = page
+    state["bot_message"] = _render_catalog_page(catalog, category, page)
+    state["bot_message_ref"] = MessageRef("catalog_page", (category, page))
     state["mode"] = "catalog"
     return state
 
 
+PRODUCT_NOT_FOUND = (
+    "No encuentro ese producto. Puedes usar el id (por ejemplo 101) "
+    "o pedirme que te muestre el catálogo."
+)
+
+# Si los dos mejores candidatos puntúan a menos de esta distancia,
+# preguntamos en vez de elegir uno.
+AMBIGUITY_MARGIN = 0.1
+
+
 def _resolve_product_from_intent(state: ConversationState, intent) -> tuple[object | None, str]:
     """
     Utilidad interna para no repetir lógica: dados el estado y un ParsedIntent,
@@ -54,19 +163,24 @@ def _resolve_product_from_intent(state: ConversationState, intent) -> tuple[obje
         product = find_product_by_id(catalog, intent.product_id)
 
     if product is None and intent.product_name:
-        product = find_product_by_name(catalog, intent.product_name)
+        matches = search_products(catalog, intent.product_name, limit=3)
+        if len(matches) >= 2 and matches[0].score - matches[1].score < AMBIGUITY_MARGIN:
+            tied = [m for m in matches if matches[0].score - m.score < AMBIGUITY_MARGIN]
+            options = " o ".join(
+                f"<strong>{m.product.name}</strong> ({m.product.id})" for m in tied
+            )
+            return None, f"¿Te refieres a {options}? Dímelo con el nombre completo o el id."
+        if matches:
+            product = matches[0].product
 
     if product is None:
-        return None, (
-            "No encuentro ese producto. Puedes usar el id (por ejemplo 101) "
-            "o pedirme que te muestre el catálogo."
-        )
+        return None, PRODUCT_NOT_FOUND
 
     return product, ""
 
 
 def handle_add_to_cart(state: ConversationState) -> ConversationState:
-    intent = parse_user_message(state["last_user_message"])
+    intent = _current_intent(state)
     product, error = _resolve_product_from_intent(state, intent)
 
     if product is None:
@@ -96,9 +210,13 @@ def handle_add_to_cart(state: ConversationState) -> ConversationState:
 
 
 def handle_remove_from_cart(state: ConversationState) -> ConversationState:
-    intent = parse_user_message(state["last_user_message"])
+    intent = _current_intent(state)
     product, error = _resolve_product_from_intent(state, intent)
 
+    if product is None and error != PRODUCT_NOT_FOUND:
+        state["bot_message"] = f"<p>{error}</p>"
+        return state
+
     if product is None:
         state["bot_message"] = (
             "<p>No entiendo qué producto quieres eliminar del carrito. "
@@ -129,7 +247,7 @@ def handle_update_quantity(state: ConversationState) -> ConversationState:
     - 'pon 3 en la camiseta azul'
     - 'pon 3 en lugar de 1'
     """
-    intent = parse_user_message(state["last_user_message"])
+    intent = _current_intent(state)
 
     if intent.quantity is None:
         state["bot_message"] = (
@@ -176,21 +294,61 @@ def handle_update_quantity(state: ConversationState) -> ConversationState:
     return state
 
 
-def handle_show_cart(state: ConversationState) -> ConversationState:
+def handle_batch_cart(state: ConversationState) -> ConversationState:
     """
-    Muestra el carrito como tabla HTML con totales y descuentos.
+    Aplica de una vez varias operaciones de un mismo mensaje
+    ('añade 2 camisetas azules y 1 gorra negra, y quita las botas') y
+    calcula y muestra el total una sola vez al final.
     """
     cart = state["cart"]
+    catalog = state["catalog"]
+    lines = []
+    for operation in state["cart_operations"]:
+        product = find_product_by_id(catalog, operation.product_id)
+        if product is None:
+            lines.append(f"No encuentro el producto {operation.product_id}.")
+            continue
+
+        if operation.action == "add":
+            quantity = operation.quantity or 1
+            try:
+                cart.add_item(product, quantity)
+            except ValueError as e:
+                lines.append(str(e))
+                continue
+            lines.append(f"Añadido: <strong>{quantity}</strong> x <strong>{product.name}</strong>.")
+            continue
+
+        if product.id not in cart.items:
+            lines.append(f"<strong>{product.name}</strong> no está en tu carrito.")
+            continue
+
+        if operation.action == "remove" or (operation.quantity is not None and operation.quantity <= 0):
+            cart.remove_item(product.id)
+            lines.append(f"Eliminado: <strong>{product.name}</strong>.")
+        elif operation.quantity is None:
+            lines.append(f"No he entendido la cantidad nueva de <strong>{product.name}</strong>.")
+        else:
+            cart.set_quantity(product.id, operation.quantity)
+            lines.append(
+                f"Cantidad de <strong>{product.name}</strong>: <strong>{operation.quantity}</strong>."
+            )
+
+    html = "<p>He hecho estos cambios en tu carrito:</p><ul>" + "".join(f"<li>{line}</li>" for line in lines) + "</ul>"
     if cart.is_empty():
-        state["bot_message"] = (
-            "<p>Tu carrito está vacío. "
-            "Si quieres, puedo <strong>mostrarte el catálogo</strong> para que añadas productos.</p>"
-        )
-        return state
+        state["discount_summary"] = None
+        html += "<p>Tu carrito ha quedado vacío.</p>"
+    else:
+        summary = calculate_totals(cart)
+        state["discount_summary"] = summary
+        html += f"<p><strong>Total:</strong> {summary.final_total:.2f} €</p>"
+
+    state["bot_message"] = html
+    state["mode"] = "cart_edit"
+    return state
 
-    summary = calculate_totals(cart)
-    state["discount_summary"] = summary
 
+def _render_cart_table(cart, summary) -> str:
     rows = []
     for item in cart.items.values():
         line_total = item.product.price * item.quantity
@@ -224,8 +382,24 @@ def handle_show_cart(state: ConversationState) -> ConversationState:
         )
 
     html += f"<p><strong>Total final:</strong> {summary.final_total:.2f} €</p></div>"
+    return html
 
-    state["bot_message"] = html
+
+def handle_show_cart(state: ConversationState) -> ConversationState:
+    """
+    Muestra el carrito como tabla HTML con totales y descuentos. La tabla se
+    reutiliza mientras el carrito no cambie (pricing.render_cart_fragment).
+    """
+    cart = state["cart"]
+    if cart.is_empty():
+        state["bot_message"] = (
+            "<p>Tu carrito está vacío. "
+            "Si quieres, puedo <strong>mostrarte el catálogo</strong> para que añadas productos.</p>"
+        )
+        return state
+
+    state["discount_summary"] = calculate_totals(cart)
+    state["bot_message"] = render_cart_fragment(cart, "chat", _render_cart_table)
     state["mode"] = "cart_edit"
     return state
 
@@ -239,10 +413,18 @@ def handle_checkout(state: ConversationState) -> ConversationState:
         state["mode"] = "catalog"
         return state
 
+    # Si el cupón se ha agotado desde que se aplicó, se retira antes de dar el total.
+    warning = ""
+    coupon = cart.applied_coupon
+    if coupon is not None and not as_coupon_registry(state["coupons"]).is_available(coupon):
+        cart.applied_coupon = None
+        state["applied_coupon_code"] = None
+        warning = f"<p>El cupón <strong>{coupon.code}</strong> se ha agotado y lo he retirado.</p>"
+
     summary = calculate_totals(cart)
     state["discount_summary"] = summary
 
-    state["bot_message"] = (
+    state["bot_message"] = warning + (
         f"<p>Vamos a finalizar tu compra. El total es "
         f"<strong>{summary.final_total:.2f} €</strong>.</p>"
         "<p>Puedes decirme tu <strong>nombre y ciudad de envío en una sola frase</strong>, "
@@ -334,20 +516,27 @@ def handle_shipping(state: ConversationState) -> ConversationState:
 
 
 def handle_apply_coupon(state: ConversationState) -> ConversationState:
-    intent = parse_user_message(state["last_user_message"])
+    intent = _current_intent(state)
     if not intent.coupon_code:
         state["bot_message"] = (
             "<p>Indícame el <strong>código</strong> del cupón (por ejemplo: <code>VIP20</code>).</p>"
         )
         return state
 
-    coupon = find_coupon_by_code(state["coupons"], intent.coupon_code)
+    coupons = as_coupon_registry(state["coupons"])
+    coupon = coupons.get(intent.coupon_code)
     if coupon is None:
         state["bot_message"] = (
             "<p>Ese cupón no es válido. Si quieres, puedo mostrarte el catálogo o tu carrito.</p>"
         )
         return state
 
+    if not coupons.is_available(coupon):
+        state["bot_message"] = (
+            f"<p>El cupón <strong>{coupon.code}</strong> se ha agotado y ya no se puede usar.</p>"
+        )
+        return state
+
     # Subtotal actual para feedback
     summary = calculate_totals(state["cart"])
     current_total = summary.final_total
@@ -376,60 +565,126 @@ def handle_apply_coupon(state: ConversationState) -> ConversationState:
     return state
 
 
-def handle_smalltalk(state: ConversationState) -> ConversationState:
+def handle_best_coupon(state: ConversationState) -> ConversationState:
+    """
+    Recomienda el cupón que más ahorra sobre el carrito actual. El cupón se
+    aplica sobre el total tras los descuentos por cantidades y por total.
+    """
+    cart = state["cart"]
+    if cart.is_empty():
+        state["bot_message"] = (
+            "<p>Tu carrito está vacío. Añade algún producto y te diré qué cupón te conviene.</p>"
+        )
+        return state
+
+    summary = calculate_totals(cart)
+    after_line = summary.subtotal - summary.line_discounts
+    after_cart = after_line - summary.cart_discount
+
+    best = as_coupon_registry(state["coupons"]).best_for(after_cart)
+    if best is None:
+        state["bot_message"] = (
+            f"<p>Ahora mismo ningún cupón se puede aplicar a tu carrito "
+            f"(<strong>{after_cart:.2f} €</strong>).</p>"
+        )
+        return state
+
+    coupon, saving = best
+    applied = cart.applied_coupon
+    if applied is not None and applied.code.upper() == coupon.code.upper():
+        state["bot_message"] = (
+            f"<p>Ya tienes aplicado el mejor cupón, <strong>{coupon.code}</strong>: "
+            f"te ahorra <strong>{saving:.2f} €</strong>.</p>"
+        )
+        return state
+
     state["bot_message"] = (
-        "<p>Soy un asistente de tienda online. No sé el tiempo que hace, "
-        "pero sí puedo ayudarte con tu compra.</p>"
-        "<p>Puedo mostrarte el catálogo, añadir o quitar productos, aplicar cupones "
-        "y ayudarte a finalizar el pedido.</p>"
+        f"<p>El cupón que más te conviene es <strong>{coupon.code}</strong>: "
+        f"te ahorra <strong>{saving:.2f} €</strong>.</p>"
+        f"<p>Si quieres usarlo, escribe <em>'aplica el cupón {coupon.code}'</em>.</p>"
     )
     return state
 
 
+SMALLTALK_MESSAGE = (
+    "<p>Soy un asistente de tienda online. No sé el tiempo que hace, "
+    "pero sí puedo ayudarte con tu compra.</p>"
+    "<p>Puedo mostrarte el catálogo, añadir o quitar productos, aplicar cupones "
+    "y ayudarte a finalizar el pedido.</p>"
+)
+
+
+def handle_smalltalk(state: ConversationState) -> ConversationState:
+    state["bot_message"] = SMALLTALK_MESSAGE
+    return state
+
+
+GREETING_MESSAGE = (
+    "<p>¡Hola! Soy tu asistente de compras.</p>"
+    "<p>Puedo mostrarte el catálogo, añadir artículos al carrito, aplicar cupones "
+    "y ayudarte a finalizar la compra.</p>"
+    "<p>Por ejemplo, puedes decirme <em>'muestra el catálogo'</em> o "
+    "<em>'añade 2 camisetas azules'</em>.</p>"
+)
+
+
 def handle_greeting(state: ConversationState) -> ConversationState:
-    state["bot_message"] = (
-        "<p>¡Hola! Soy tu asistente de compras.</p>"
-        "<p>Puedo mostrarte el catálogo, añadir artículos al carrito, aplicar cupones "
-        "y ayudarte a finalizar la compra.</p>"
-        "<p>Por ejemplo, puedes decirme <em>'muestra el catálogo'</em> o "
-        "<em>'añade 2 camisetas azules'</em>.</p>"
-    )
+    state["bot_message"] = GREETING_MESSAGE
     return state
 
 
+HELP_MESSAGE = (
+    "<p>Puedo ayudarte con estas cosas:</p>"
+    "<ul>"
+    "<li><strong>Ver catálogo:</strong> "
+    "<em>'muestra el catálogo'</em>, <em>'qué productos tenéis'</em></li>"
+    "<li><strong>Añadir producto:</strong> "
+    "<em>'añade 2 camisetas azules'</em>, <em>'pon 1 producto 101'</em></li>"
+    "<li><strong>Quitar producto:</strong> "
+    "<em>'quita la camiseta azul'</em>, <em>'elimina producto 101'</em></li>"
+    "<li><strong>Varias cosas a la vez:</strong> "
+    "<em>'añade 2 camisetas azules y 1 gorra negra, y quita las botas'</em></li>"
+    "<li><strong>Ver carrito:</strong> "
+    "<em>'qué llevo en el carrito'</em>, <em>'mostrar carrito'</em></li>"
+    "<li><strong>Cambiar cantidades:</strong> "
+    "<em>'cambia la camiseta azul a 3'</em>, <em>'pon 2 en lugar de 1'</em></li>"
+    "<li><strong>Aplicar cupón:</strong> "
+    "<em>'aplica el cupón BIENVENIDA10'</em></li>"
+    "<li><strong>Mejor cupón:</strong> "
+    "<em>'¿qué cupón me conviene?'</em></li>"
+    "<li><strong>Finalizar compra:</strong> "
+    "<em>'quiero finalizar la compra'</em></li>"
+    "<li><strong>Salir:</strong> <em>'salir'</em>, <em>'terminar'</em></li>"
+    "</ul>"
+)
+
+
 def handle_help(state: ConversationState) -> ConversationState:
-    state["bot_message"] = (
-        "<p>Puedo ayudarte con estas cosas:</p>"
-        "<ul>"
-        "<li><strong>Ver catálogo:</strong> "
-        "<em>'muestra el catálogo'</em>, <em>'qué productos tenéis'</em></li>"
-        "<li><strong>Añadir producto:</strong> "
-        "<em>'añade 2 camisetas azules'</em>, <em>'pon 1 producto 101'</em></li>"
-        "<li><strong>Quitar producto:</strong> "
-        "<em>'quita la camiseta azul'</em>, <em>'elimina producto 101'</em></li>"
-        "<li><strong>Ver carrito:</strong> "
-        "<em>'qué llevo en el carrito'</em>, <em>'mostrar carrito'</em></li>"
-        "<li><strong>Cambiar cantidades:</strong> "
-        "<em>'cambia la camiseta azul a 3'</em>, <em>'pon 2 en lugar de 1'</em></li>"
-        "<li><strong>Aplicar cupón:</strong> "
-        "<em>'aplica el cupón BIENVENIDA10'</em></li>"
-        "<li><strong>Finalizar compra:</strong> "
-        "<em>'quiero finalizar la compra'</em></li>"
-        "<li><strong>Salir:</strong> <em>'salir'</em>, <em>'terminar'</em></li>"
-        "</ul>"
-    )
+    state["bot_message"] = HELP_MESSAGE
     return state
 
 
+UNKNOWN_MESSAGE = (
+    "<p>No he entendido bien tu petición.</p>"
+    "<p>Puedes pedirme que te muestre el catálogo, que añada o quite productos, "
+    "que cambie cantidades en tu carrito o que te muestre el total.</p>"
+    "<p>Si necesitas más detalles, puedes escribir <strong>'ayuda'</strong>.</p>"
+)
+
+
 def handle_unknown(state: ConversationState) -> ConversationState:
-    state["bot_message"] = (
-        "<p>No he entendido bien tu petición.</p>"
-        "<p>Puedes pedirme que te muestre el catálogo, que añada o quite productos, "
-        "que cambie cantidades en tu carrito o que te muestre el total.</p>"
-        "<p>Si necesitas más detalles, puedes escribir <strong>'ayuda'</strong>.</p>"
-    )
+    state["bot_message"] = UNKNOWN_MESSAGE
     return state
 
+
+for _template, _text in (
+    ("smalltalk", SMALLTALK_MESSAGE),
+    ("greeting", GREETING_MESSAGE),
+    ("help", HELP_MESSAGE),
+    ("unknown", UNKNOWN_MESSAGE),
+):
+    register_static_message(_template, _text)
+
 def handle_confirmation(state: ConversationState) -> ConversationState:
     """
     - Al entrar por primera vez, “cierra” el pedido:
@@ -438,6 +693,14 @@ def handle_confirmation(state: ConversationState) -> ConversationState:
     """
     # Si aún no se ha “confirmado” formalmente el pedido, lo hacemos ahora
     if not state.get("order_confirmed", False):
+        # El canje del cupón se registra al cerrar el pedido; si otra sesión
+        # agotó el cupón mientras tanto, el pedido sigue adelante sin él.
+        warning = ""
+        coupon = state["cart"].applied_coupon
+        if coupon is not None and not as_coupon_registry(state["coupons"]).redeem(coupon):
+            state["cart"].applied_coupon = None
+            warning = f"<p>El cupón <strong>{coupon.code}</strong> se ha agotado y no se ha aplicado.</p>"
+
         # Capturar totales antes de vaciar
         summary = calculate_totals(state["cart"]) if not state["cart"].is_empty() else None
         total = summary.final_total if summary else 0.0
@@ -455,7 +718,7 @@ def handle_confirmation(state: ConversationState) -> ConversationState:
         state["applied_coupon_code"] = None
         state["discount_summary"] = None
 
-        state["bot_message"] = (
+        state["bot_message"] = warning + (
             "<p><strong>Pedido registrado correctamente.</strong></p>"
             f"<p>Envío a nombre de <strong>{name}</strong> en <strong>{city}</strong>.</p>"
             f"<p>Total pagado: <strong>{total:.2f} €</strong>.</p>"
@@ -493,95 +756,95 @@ def handle_exit(state: ConversationState) -> ConversationState:
     return state
 
 
+def route_decision(state: ConversationState) -> str:
+    """Nodo al que va el turno; lo usan el grafo y conversation.dispatcher."""
+    parsed = _current_intent(state)
+
+    # 1) SHIPPING: permitir exit/help incluso durante shipping
+    if state["mode"] == "shipping":
+        if parsed.intent in ("exit", "help"):
+            return parsed.intent
+        return "shipping"
+
+    # 2) CONFIRMATION: permitir salir/ayuda/catálogo/carrito
+    if state["mode"] == "confirmation":
+        if parsed.intent in ("exit", "help", "show_catalog", "show_cart"):
+            return {
+                "exit": "exit",
+                "help": "help",
+                "show_catalog": "catalog",
+                "show_cart": "show_cart",
+            }[parsed.intent]
+        return "confirmation"
+
+    # 3) Ruteo normal por intención
+    if state.get("cart_operations"):
+        return "batch_cart"
+
+    intent = parsed.intent
+
+    if intent == "show_catalog":
+        return "catalog"
+    if intent == "add_to_cart":
+        return "add_to_cart"
+    if intent == "remove_from_cart":
+        return "remove_from_cart"
+    if intent == "update_quantity":
+        return "update_quantity"
+    if intent == "show_cart":
+        return "show_cart"
+    if intent == "checkout":
+        return "checkout"
+    if intent == "apply_coupon":
+        return "apply_coupon"
+    if intent == "best_coupon":
+        return "best_coupon"
+    if intent == "smalltalk":
+        return "smalltalk"
+    if intent == "greeting":
+        return "greeting"
+    if intent == "help":
+        return "help"
+    if intent == "exit":
+        return "exit"
+
+    return "unknown"
+
+
+# Nodo -> función que lo atiende (el router aparte).
+NODE_HANDLERS = {
+    "catalog": handle_catalog,
+    "add_to_cart": handle_add_to_cart,
+    "remove_from_cart": handle_remove_from_cart,
+    "update_quantity": handle_update_quantity,
+    "show_cart": handle_show_cart,
+    "batch_cart": handle_batch_cart,
+    "checkout": handle_checkout,
+    "shipping": handle_shipping,
+    "confirmation": handle_confirmation,
+    "apply_coupon": handle_apply_coupon,
+    "best_coupon": handle_best_coupon,
+    "smalltalk": handle_smalltalk,
+    "greeting": handle_greeting,
+    "help": handle_help,
+    "unknown": handle_unknown,
+    "exit": handle_exit,
+}
+
+
 def build_graph():
     graph = StateGraph(ConversationState)
 
     graph.add_node("router", router_node)
-    graph.add_node("catalog", handle_catalog)
-    graph.add_node("add_to_cart", handle_add_to_cart)
-    graph.add_node("remove_from_cart", handle_remove_from_cart)
-    graph.add_node("update_quantity", handle_update_quantity)
-    graph.add_node("show_cart", handle_show_cart)
-    graph.add_node("checkout", handle_checkout)
-    graph.add_node("shipping", handle_shipping)
-    graph.add_node("confirmation", handle_confirmation)
-    graph.add_node("apply_coupon", handle_apply_coupon)
-    graph.add_node("smalltalk", handle_smalltalk)
-    graph.add_node("greeting", handle_greeting)
-    graph.add_node("help", handle_help)
-    graph.add_node("unknown", handle_unknown)
-    graph.add_node("exit", handle_exit)
+    for name, handler in NODE_HANDLERS.items():
+        graph.add_node(name, handler)
 
     graph.set_entry_point("router")
 
-    def route_decision(state: ConversationState) -> str:
-        parsed = parse_user_message(state["last_user_message"])
-
-        # 1) SHIPPING: permitir exit/help incluso durante shipping
-        if state["mode"] == "shipping":
-            if parsed.intent in ("exit", "help"):
-                return parsed.intent
-            return "shipping"
-
-        # 2) CONFIRMATION: permitir salir/ayuda/catálogo/carrito
-        if state["mode"] == "confirmation":
-            if parsed.intent in ("exit", "help", "show_catalog", "show_cart"):
-                return {
-                    "exit": "exit",
-                    "help": "help",
-                    "show_catalog": "catalog",
-                    "show_cart": "show_cart",
-                }[parsed.intent]
-            return "confirmation"
-
-        # 3) Ruteo normal por intención
-        intent = parsed.intent
-
-        if intent == "show_catalog":
-            return "catalog"
-        if intent == "add_to_cart":
-            return "add_to_cart"
-        if intent == "remove_from_cart":
-            return "remove_from_cart"
-        if intent == "update_quantity":
-            return "update_quantity"
-        if intent == "show_cart":
-            return "show_cart"
-        if intent == "checkout":
-            return "checkout"
-        if intent == "apply_coupon":
-            return "apply_coupon"
-        if intent == "smalltalk":
-            return "smalltalk"
-        if intent == "greeting":
-            return "greeting"
-        if intent == "help":
-            return "help"
-        if intent == "exit":
-            return "exit"
-
-        return "unknown"
-
     graph.add_conditional_edges(
         "router",
         route_decision,
-        {
-            "catalog": "catalog",
-            "add_to_cart": "add_to_cart",
-            "remove_from_cart": "remove_from_cart",
-            "update_quantity": "update_quantity",
-            "show_cart": "show_cart",
-            "checkout": "checkout",
-            "apply_coupon": "apply_coupon",
-            "smalltalk": "smalltalk",
-            "greeting": "greeting",
-            "help": "help",
-            "shipping": "shipping",
-            "confirmation": "confirmation",
-            "exit": "exit",
-            "unknown": "unknown",
-            END: END,
-        },
+        {**{name: name for name in NODE_HANDLERS}, END: END},
     )
 
     graph.add_edge("exit", END)
@@ -0,0 +1,169 @@
+"""
+Historial de chat acotado.
+
+ChatHistory guarda en memoria solo los últimos `limit` mensajes (un buffer
+circular); los más antiguos pasan a un segmento en disco (JSON lines) si la
+sesión tiene uno asignado, o se descartan si no. El segmento solo se lee
+cuando alguien pide los mensajes anteriores (`older`).
+
+Los mensajes del bot que se repiten (ayuda, saludo, páginas del catálogo...)
+no se guardan como HTML sino como MessageRef(plantilla, parámetros) y se
+generan al leerlos:
+- los textos fijos se registran con `register_static_message` y se
+  reconocen solos al añadirlos,
+- el resto se registra con `register_template` y el nodo deja la referencia
+  en state["bot_message_ref"] junto a state["bot_message"].
+
+Las plantillas registradas con `uses_catalog=True` (las páginas del catálogo)
+no guardan el catálogo en sus parámetros: se generan con el `catalog` del
+historial. Cuando la sesión cambia de catálogo (`rebind_catalog`, tras una
+recarga), esos mensajes se fijan como texto con el catálogo con el que se
+mostraron: el historial no cambia de precios y no retiene catálogos antiguos.
+
+Se comporta como la lista de (rol, texto) de antes para quien la recorre:
+iteración, len, índices y slices sobre los mensajes en memoria.
+"""
+from collections import deque
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
+import json
+
+CHAT_HISTORY_LIMIT = 40
+
+
+class MessageRef(NamedTuple):
+    template: str
+    params: tuple = ()
+
+
+_TEMPLATES: dict[str, Callable[..., str]] = {}
+_STATIC_MESSAGES: dict[str, MessageRef] = {}
+_STATIC_TEMPLATES: set[str] = set()
+_CATALOG_TEMPLATES: set[str] = set()
+
+
+def register_template(template: str, render: Callable[..., str], uses_catalog: bool = False) -> None:
+    """Con `uses_catalog`, `render` recibe el catálogo antes de los parámetros."""
+    _TEMPLATES[template] = render
+    if uses_catalog:
+        _CATALOG_TEMPLATES.add(template)
+
+
+def register_static_message(template: str, text: str) -> None:
+    register_template(template, lambda: text)
+    _STATIC_MESSAGES[text] = MessageRef(template)
+    _STATIC_TEMPLATES.add(template)
+
+
+def is_static_message(ref: MessageRef) -> bool:
+    return ref.template in _STATIC_TEMPLATES
+
+
+def render_message(ref: MessageRef, catalog=None) -> str:
+    render = _TEMPLATES[ref.template]
+    if ref.template in _CATALOG_TEMPLATES:
+        return render(catalog, *ref.params)
+    return render(*ref.params)
+
+
+class ChatHistory:
+    def __init__(
+        self,
+        messages: Iterable[tuple[str, str]] = (),
+        limit: int = CHAT_HISTORY_LIMIT,
+        start: int = 0,
+        spill_path: Optional[Path] = None,
+        catalog=None,
+    ):
+        self.limit = limit
+        # Número de mensajes que ya no están en memoria (volcados o descartados).
+        self.start = start
+        self.spill_path = spill_path
+        # Catálogo con el que se generan las plantillas que lo usan.
+        self.catalog = catalog
+        self._entries: deque[tuple[str, "str | MessageRef"]] = deque()
+        for message in messages:
+            self.append(message)
+
+    @classmethod
+    def from_entries(
+        cls,
+        entries: Iterable[tuple[str, "str | MessageRef"]],
+        start: int = 0,
+        **kwargs,
+    ) -> "ChatHistory":
+        """Reconstruye un historial a partir de `entries()` sin volver a expandir las referencias."""
+        history = cls(start=start, **kwargs)
+        for role, payload in entries:
+            if isinstance(payload, MessageRef):
+                history.append((role, ""), payload)
+            else:
+                history.append((role, payload))
+        return history
+
+    def entries(self) -> list[tuple[str, "str | MessageRef"]]:
+        """Los mensajes en memoria tal como se guardan (texto o MessageRef)."""
+        return list(self._entries)
+
+    @property
+    def total(self) -> int:
+        """Mensajes de toda la conversación, incluidos los que ya no están en memoria."""
+        return self.start + len(self._entries)
+
+    def append(self, message: tuple[str, str], ref: Optional[MessageRef] = None) -> None:
+        role, text = message
+        if ref is None and role == "bot":
+            ref = _STATIC_MESSAGES.get(text)
+        self._entries.append((role, ref if ref is not None else text))
+        if len(self._entries) > self.limit:
+            self._spill(self._entries.popleft())
+
+    def rebind_catalog(self, catalog) -> None:
+        """Cambia de catálogo fijando antes como texto los mensajes generados con el anterior."""
+        if catalog is self.catalog:
+            return
+        if self.catalog is not None:
+            self._entries = deque(
+                (role, self._expand(payload))
+                if isinstance(payload, MessageRef) and payload.template in _CATALOG_TEMPLATES
+                else (role, payload)
+                for role, payload in self._entries
+            )
+        self.catalog = catalog
+
+    def _expand(self, payload: "str | MessageRef") -> str:
+        return render_message(payload, self.catalog) if isinstance(payload, MessageRef) else payload
+
+    def _spill(self, entry: tuple[str, "str | MessageRef"]) -> None:
+        if self.spill_path is not None:
+            role, payload = entry
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps([self.start, role, self._expand(payload)], ensure_ascii=False) + "\n")
+        self.start += 1
+
+    def older(self, before: Optional[int] = None, limit: int = CHAT_HISTORY_LIMIT) -> list[tuple[int, str, str]]:
+        """Hasta `limit` mensajes volcados a disco anteriores a `before`, como (seq, rol, texto)."""
+        before = self.start if before is None else min(before, self.start)
+        if self.spill_path is None or limit <= 0 or not self.spill_path.exists():
+            return []
+        found: deque[tuple[int, str, str]] = deque(maxlen=limit)
+        with open(self.spill_path, encoding="utf-8") as f:
+            for line in f:
+                seq, role, text = json.loads(line)
+                if seq >= before:
+                    break
+                found.append((seq, role, text))
+        return list(found)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[tuple[str, str]]:
+        for role, payload in self._entries:
+            yield role, self._expand(payload)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [(role, self._expand(payload)) for role, payload in list(self._entries)[index]]
+        role, payload = self._entries[index]
+        return role, self._expand(payload)
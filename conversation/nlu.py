@@ -1,7 +1,10 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from typing import Literal, Optional
 import re
-import unicodedata
+
+from domain.gazetteer import ProductGazetteer, stem, tokenize
+from domain.text import normalize
 
 
 IntentType = Literal[
@@ -12,6 +15,7 @@ IntentType = Literal[
     "update_quantity",
     "checkout",
     "apply_coupon",
+    "best_coupon",
     "exit",
     "smalltalk",
     "help",
@@ -20,7 +24,7 @@ IntentType = Literal[
 ]
 
 
-@dataclass
+@dataclass(frozen=True)
 class ParsedIntent:
     intent: IntentType
     product_name: Optional[str] = None
@@ -29,18 +33,41 @@ class ParsedIntent:
     coupon_code: Optional[str] = None
 
 
+CartAction = Literal["add", "remove", "set"]
+
+
+@dataclass(frozen=True)
+class CartOperation:
+    """Una operación sobre el carrito dentro de un mensaje con varias."""
+    action: CartAction
+    product_id: int
+    quantity: Optional[int] = None
+
+
 # -----------------------
-# Utilidades de parsing
+# Patrones (compilados una vez al importar)
 # -----------------------
 
-def normalize(text: str) -> str:
-    """Minúsculas + quitar acentos para facilitar matching."""
-    text = text.lower().strip()
-    text = unicodedata.normalize("NFD", text)
-    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
-    return text
+_PRODUCT_ID_RE = re.compile(
+    r"(producto|id|articulo|artículo)\s*(?:n[ºo]\s*)?(?:del\s+|de\s+)?(\d+)", re.IGNORECASE
+)
+_DEL_ID_RE = re.compile(r"\bdel\s+(\d+)\b", re.IGNORECASE)
+_UNITS_RE = re.compile(r"\b(\d+)\s*(unidades?|uds?)\b", re.IGNORECASE)
+_TIMES_RE = re.compile(r"\bx\s*(\d+)\b", re.IGNORECASE)
+_LEADING_NUMBER_RE = re.compile(r"\s*(\d+)\b")
+_NUMBER_RE = re.compile(r"\b(\d+)\b")
+_DIGITS_RE = re.compile(r"\d+")
+_INSTEAD_OF_RE = re.compile(r"\ben\s+(lugar|vez)\s+de\b")
+_PAGE_NUMBER_RE = re.compile(r"\bpagina\s+(\d+)\b")
+_NEXT_PAGE_RE = re.compile(r"\b(siguiente|mas productos)\b")
+_PREV_PAGE_RE = re.compile(r"\banterior\b")
+_COUPON_CODE_RE = re.compile(r"(?:cupon|cup[oó]n|descuento|promo)\s+([a-zA-Z0-9_-]+)", re.IGNORECASE)
 
 
+# -----------------------
+# Utilidades de parsing
+# -----------------------
+
 def extract_product_id(text: str) -> Optional[int]:
     """
     Busca patrones tipo:
@@ -50,15 +77,11 @@ def extract_product_id(text: str) -> Optional[int]:
     - 'producto nº 103'
     - 'del 103'
     """
-    m = re.search(
-        r"(producto|id|articulo|artículo)\s*(?:n[ºo]\s*)?(?:del\s+|de\s+)?(\d+)",
-        text,
-        re.IGNORECASE,
-    )
+    m = _PRODUCT_ID_RE.search(text)
     if m:
         return int(m.group(2))
 
-    m2 = re.search(r"\bdel\s+(\d+)\b", text, re.IGNORECASE)
+    m2 = _DEL_ID_RE.search(text)
     if m2:
         return int(m2.group(1))
 
@@ -74,22 +97,22 @@ def extract_quantity(text: str) -> Optional[int]:
     - 'añade 2 camisetas' (número en mitad del texto)
     """
     # '3 unidades', '3 uds'
-    m = re.search(r"\b(\d+)\s*(unidades?|uds?)\b", text, re.IGNORECASE)
+    m = _UNITS_RE.search(text)
     if m:
         return int(m.group(1))
 
     # 'x3'
-    m = re.search(r"\bx\s*(\d+)\b", text, re.IGNORECASE)
+    m = _TIMES_RE.search(text)
     if m:
         return int(m.group(1))
 
     # número al principio: '2 camisetas'
-    m = re.match(r"\s*(\d+)\b", text)
+    m = _LEADING_NUMBER_RE.match(text)
     if m:
         return int(m.group(1))
 
     # fallback: primer número que aparezca en cualquier parte
-    m = re.search(r"\b(\d+)\b", text)
+    m = _NUMBER_RE.search(text)
     if m:
         return int(m.group(1))
 
@@ -102,12 +125,12 @@ def pick_update_quantity(text: str, product_id: Optional[int]) -> Optional[int]:
     - Caso especial: "pon 3 en lugar de 1 ..." => la cantidad nueva es el PRIMER número (3).
     - Resto: elegimos el último número que no sea el product_id.
     """
-    nums = [int(n) for n in re.findall(r"\d+", text)]
+    nums = [int(n) for n in _DIGITS_RE.findall(text)]
     if not nums:
         return None
 
     # Caso "en lugar de" / "en vez de" => primer número = cantidad NUEVA
-    if re.search(r"\ben\s+(lugar|vez)\s+de\b", text):
+    if _INSTEAD_OF_RE.search(text):
         if product_id is None:
             return nums[0]
         for n in nums:
@@ -126,154 +149,286 @@ def pick_update_quantity(text: str, product_id: Optional[int]) -> Optional[int]:
     return None
 
 
+def extract_page_request(text: str) -> Optional[int | str]:
+    """
+    Navegación por páginas del catálogo (texto ya normalizado):
+    - 'pagina 3' => 3
+    - 'siguiente pagina', 'mas productos' => 'next'
+    - 'pagina anterior' => 'prev'
+    """
+    m = _PAGE_NUMBER_RE.search(text)
+    if m:
+        return int(m.group(1))
+    if _NEXT_PAGE_RE.search(text):
+        return "next"
+    if _PREV_PAGE_RE.search(text):
+        return "prev"
+    return None
+
+
+# -----------------------
+# Keywords por intención
+# -----------------------
+
+EXIT_KEYWORDS = ("salir", "terminar", "cerrar", "adios", "hasta luego")
+CART_KEYWORDS = ("carrito", "carro", "cesta", "basket")
+COUPON_KEYWORDS = ("cupon", "cupones", "descuento", "promo", "promocion")
+# Sin 'mejor' suelto: un código como MEJOR10 no debe convertir 'aplica el cupón MEJOR10' en una consulta.
+BEST_COUPON_KEYWORDS = (
+    "conviene", "mejor cupon", "mejor descuento", "mejor promo", "que cupon", "cual cupon", "mas ahorro",
+)
+CHECKOUT_KEYWORDS = (
+    "finalizar",
+    "pagar",
+    "tramitar pedido",
+    "terminar compra",
+    "confirmar compra",
+    "quiero finalizar la compra",
+    "realizar el pago",
+    "finalizar compra",
+)
+CATALOG_KEYWORDS = (
+    "catalogo",
+    "productos",
+    "tienda",
+    "que teneis",
+    "que tienes",
+    "muestrame el catalogo",
+    "mostrar catalogo",
+    "ver catalogo",
+    "ver productos",
+    "que puedo comprar",
+    "pagina",
+    "mas productos",
+)
+ADD_KEYWORDS = (
+    "anade",
+    "añade",
+    "agrega",
+    "añadir",
+    "meter",
+    "mete",
+    "pon",
+    "incluye",
+    "sumar",
+    "compra",
+    "comprar",
+    "agregame",
+    "echame",
+)
+REMOVE_KEYWORDS = (
+    "quita",
+    "quitar",
+    "elimina",
+    "borra",
+    "saca",
+    "retira",
+    "eliminalo",
+    "quitame",
+)
+UPDATE_KEYWORDS = (
+    "cambia",
+    "cambiar",
+    "ajusta",
+    "ajustar",
+    "modifica",
+    "modificar",
+    "actualiza",
+    "actualizar",
+    "deja",
+)
+GREETING_KEYWORDS = (
+    "hola",
+    "buenas",
+    "buenos dias",
+    "buenas tardes",
+    "buenas noches",
+    "hey",
+    "que tal",
+    "que hay",
+)
+HELP_KEYWORDS = (
+    "ayuda",
+    "como funciona",
+    "que puedo hacer",
+    "que sabes hacer",
+    "como te uso",
+    "instrucciones",
+    "ayudame",
+)
+SMALLTALK_KEYWORDS = ("tiempo", "clima")
+
+KEYWORD_GROUPS: dict[str, tuple[str, ...]] = {
+    "exit": EXIT_KEYWORDS,
+    "cart": CART_KEYWORDS,
+    "coupon": COUPON_KEYWORDS,
+    "best_coupon": BEST_COUPON_KEYWORDS,
+    "checkout": CHECKOUT_KEYWORDS,
+    "catalog": CATALOG_KEYWORDS,
+    "add": ADD_KEYWORDS,
+    "remove": REMOVE_KEYWORDS,
+    "update": UPDATE_KEYWORDS,
+    "greeting": GREETING_KEYWORDS,
+    "help": HELP_KEYWORDS,
+    "smalltalk": SMALLTALK_KEYWORDS,
+}
+
+
+def _trie_pattern(words: list[str]) -> str:
+    """
+    Alternancia en forma de trie ('carr(?:ito|o)' en vez de 'carrito|carro'):
+    en cada posición el motor de regex avanza carácter a carácter en lugar de
+    probar todas las keywords, y los cuantificadores codiciosos dan la más larga.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        ends = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        inner = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if ends:
+            return f"(?:{inner})?"
+        return inner
+
+    return build(trie)
+
+
+def _build_keyword_matcher() -> tuple[re.Pattern, dict[str, frozenset[str]]]:
+    """
+    Un único patrón con todas las keywords dentro de un lookahead, de modo que
+    finditer prueba cada posición del texto y devuelve la keyword más larga
+    que empieza en ella. Las más cortas que empiezan en la misma posición son
+    subcadenas de esa, así que cada keyword arrastra los grupos de todas las
+    keywords contenidas en ella: el resultado equivale a hacer `k in text`
+    con cada keyword, pero en una sola pasada.
+    """
+    groups_of: dict[str, set[str]] = {}
+    for group, keywords in KEYWORD_GROUPS.items():
+        for keyword in keywords:
+            groups_of.setdefault(keyword, set()).add(group)
+
+    implied = {
+        keyword: frozenset(
+            group for other, groups in groups_of.items() if other in keyword for group in groups
+        )
+        for keyword in groups_of
+    }
+    pattern = re.compile(f"(?=({_trie_pattern(list(groups_of))}))")
+    return pattern, implied
+
+
+_KEYWORD_RE, _KEYWORD_GROUPS_OF = _build_keyword_matcher()
+
+
+def keyword_hits(text: str) -> set[str]:
+    """Grupos de KEYWORD_GROUPS con alguna keyword contenida en `text` (ya normalizado)."""
+    hits: set[str] = set()
+    for m in _KEYWORD_RE.finditer(text):
+        hits |= _KEYWORD_GROUPS_OF[m.group(1)]
+    return hits
+
+
 # -----------------------
 # Parsing principal
 # -----------------------
 
+# Resultados recientes por texto normalizado: mensajes como "ver carrito" o
+# "salir" se repiten muchísimo. Los ParsedIntent son inmutables, así que el
+# mismo objeto se puede devolver a todas las sesiones.
+PARSE_CACHE_SIZE = 4096
+
+
 def parse_user_message(message: str) -> ParsedIntent:
     """
-    Parser rule-based: keywords + regex.
+    Parser rule-based: keywords + regex. Las keywords se detectan todas de
+    una pasada (keyword_hits) y después se aplica el orden de prioridad.
+
+    El análisis se cachea por texto normalizado; los slots que dependen del
+    texto original (nombre de producto y código de cupón) se rellenan con el
+    mensaje recibido.
     """
-    raw = message
-    text = normalize(message)
-
-    exit_keywords = ["salir", "terminar", "cerrar", "adios", "hasta luego"]
-    cart_keywords = ["carrito", "carro", "cesta", "basket"]
-    coupon_keywords = ["cupon", "cupones", "descuento", "promo", "promocion"]
-    checkout_keywords = [
-        "finalizar",
-        "pagar",
-        "tramitar pedido",
-        "terminar compra",
-        "confirmar compra",
-        "quiero finalizar la compra",
-        "realizar el pago",
-        "finalizar compra",
-    ]
-    catalog_keywords = [
-        "catalogo",
-        "productos",
-        "tienda",
-        "que teneis",
-        "que tienes",
-        "muestrame el catalogo",
-        "mostrar catalogo",
-        "ver catalogo",
-        "ver productos",
-        "que puedo comprar",
-    ]
-    add_keywords = [
-        "anade",
-        "añade",
-        "agrega",
-        "añadir",
-        "meter",
-        "mete",
-        "pon",
-        "incluye",
-        "sumar",
-        "compra",
-        "comprar",
-        "agregame",
-        "echame",
-    ]
-    remove_keywords = [
-        "quita",
-        "quitar",
-        "elimina",
-        "borra",
-        "saca",
-        "retira",
-        "eliminalo",
-        "quitame",
-    ]
-    update_keywords = [
-        "cambia",
-        "cambiar",
-        "ajusta",
-        "ajustar",
-        "modifica",
-        "modificar",
-        "actualiza",
-        "actualizar",
-        "deja",
-    ]
-    greeting_keywords = [
-        "hola",
-        "buenas",
-        "buenos dias",
-        "buenas tardes",
-        "buenas noches",
-        "hey",
-        "que tal",
-        "que hay",
-    ]
-    help_keywords = [
-        "ayuda",
-        "como funciona",
-        "que puedo hacer",
-        "que sabes hacer",
-        "como te uso",
-        "instrucciones",
-        "ayudame",
-    ]
+    parsed = _parse_normalized(normalize(message))
+    if parsed.product_name is not None and parsed.product_name != message:
+        parsed = replace(parsed, product_name=message)
+    if parsed.intent == "apply_coupon":
+        m = _COUPON_CODE_RE.search(message)
+        if m:
+            parsed = replace(parsed, coupon_code=m.group(1))
+    return parsed
+
+
+def parse_cache_info():
+    """Aciertos, fallos y tamaño de la caché de parse_user_message."""
+    return _parse_normalized.cache_info()
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_normalized(text: str) -> ParsedIntent:
+    # Solo depende del texto normalizado: product_name queda como marcador
+    # y el código de cupón lo extrae parse_user_message del mensaje original.
+    hits = keyword_hits(text)
 
     # 1) SALIR
-    if any(k in text for k in exit_keywords):
+    if "exit" in hits:
         return ParsedIntent(intent="exit")
 
     # 2) SALUDO
-    if any(k in text for k in greeting_keywords):
+    if "greeting" in hits:
         return ParsedIntent(intent="greeting")
 
     # 3) AYUDA
-    if any(k in text for k in help_keywords):
+    if "help" in hits:
         return ParsedIntent(intent="help")
 
     # 4) VER CARRITO
-    if any(k in text for k in cart_keywords):
+    if "cart" in hits:
         return ParsedIntent(intent="show_cart")
 
+    # 4.5) MEJOR CUPÓN ('¿qué cupón me conviene?'), antes que aplicar cupón
+    if "coupon" in hits and "best_coupon" in hits:
+        return ParsedIntent(intent="best_coupon")
+
     # 5) CUPÓN
-    if any(k in text for k in coupon_keywords):
-        m = re.search(
-            r"(?:cupon|cup[oó]n|descuento|promo)\s+([a-zA-Z0-9_-]+)",
-            raw,
-            re.IGNORECASE,
-        )
-        code = m.group(1) if m else None
-        return ParsedIntent(intent="apply_coupon", coupon_code=code)
+    if "coupon" in hits:
+        return ParsedIntent(intent="apply_coupon")
 
     # 6) CHECKOUT
-    if any(k in text for k in checkout_keywords):
+    if "checkout" in hits:
         return ParsedIntent(intent="checkout")
 
     # 7) UPDATE (antes que add)
-    if any(k in text for k in update_keywords):
-        pid = extract_product_id(raw)
+    if "update" in hits:
+        pid = extract_product_id(text)
         qty = pick_update_quantity(text, pid)
         return ParsedIntent(
             intent="update_quantity",
             product_id=pid,
             quantity=qty,
-            product_name=raw if pid is None else None,
+            product_name=text if pid is None else None,
         )
     
     # 7.5) Caso especial: "pon X en lugar de Y ..." => update_quantity
     # (aunque "pon" sea keyword de add, aquí prima el patrón de actualización)
-    if re.search(r"\ben\s+(lugar|vez)\s+de\b", text) and ("pon" in text):
-        pid = extract_product_id(raw)
+    if "pon" in text and _INSTEAD_OF_RE.search(text):
+        pid = extract_product_id(text)
         qty = pick_update_quantity(text, pid)
         return ParsedIntent(
             intent="update_quantity",
             product_id=pid,
             quantity=qty,
-            product_name=raw if pid is None else None,
+            product_name=text if pid is None else None,
     )
 
     # 8) ADD
-    if any(k in text for k in add_keywords):
-        pid = extract_product_id(raw)
+    if "add" in hits:
+        pid = extract_product_id(text)
         qty = extract_quantity(text)
 
         # Caso "pon el producto 402": qty detecta 402 pero es el id.
@@ -284,25 +439,113 @@ def parse_user_message(message: str) -> ParsedIntent:
             intent="add_to_cart",
             product_id=pid,
             quantity=qty,
-            product_name=raw if pid is None else None,
+            product_name=text if pid is None else None,
         )
 
     # 9) REMOVE
-    if any(k in text for k in remove_keywords):
-        pid = extract_product_id(raw)
+    if "remove" in hits:
+        pid = extract_product_id(text)
         return ParsedIntent(
             intent="remove_from_cart",
             product_id=pid,
-            product_name=raw if pid is None else None,
+            product_name=text if pid is None else None,
         )
 
     # 10) CATÁLOGO
-    if any(k in text for k in catalog_keywords):
+    if "catalog" in hits:
         return ParsedIntent(intent="show_catalog")
 
     # 11) SMALLTALK
-    if "tiempo" in text or "clima" in text:
+    if "smalltalk" in hits:
         return ParsedIntent(intent="smalltalk")
 
     # 12) UNKNOWN
-    return ParsedIntent(intent="unknown")
\ No newline at end of file
+    return ParsedIntent(intent="unknown")
+
+
+# -----------------------
+# Varias operaciones en un mensaje
+# -----------------------
+
+NUMBER_WORDS = {
+    stem(word): n
+    for word, n in (
+        ("un", 1), ("una", 1), ("uno", 1), ("dos", 2), ("tres", 3), ("cuatro", 4), ("cinco", 5),
+        ("seis", 6), ("siete", 7), ("ocho", 8), ("nueve", 9), ("diez", 10),
+    )
+}
+_ACTION_WORDS: dict[str, CartAction] = {
+    **{stem(normalize(k)): "add" for k in ADD_KEYWORDS},
+    **{stem(normalize(k)): "remove" for k in REMOVE_KEYWORDS},
+    **{stem(normalize(k)): "set" for k in UPDATE_KEYWORDS},
+}
+_ID_WORDS = {"producto", "articulo", "id"}
+_TIMES_TOKEN_RE = re.compile(r"x(\d+)")
+
+
+def _number(token: Optional[str]) -> Optional[int]:
+    if token is None:
+        return None
+    if token.isdigit():
+        return int(token)
+    return NUMBER_WORDS.get(token)
+
+
+def parse_operations(message: str, gazetteer: ProductGazetteer) -> list[CartOperation]:
+    """
+    Operaciones de carrito de un mensaje como
+    'añade 2 camisetas azules y 1 gorra negra, y quita las botas'.
+
+    Se recorre el mensaje una vez: cada verbo (añade, quita, cambia...) fija
+    la acción de los productos que le siguen, un número justo antes de un
+    producto es su cantidad, y los productos se localizan con el gazetteer
+    (nombre completo o alias) o con 'producto 101'. Los productos que
+    aparecen antes de cualquier verbo se ignoran.
+    """
+    tokens = tokenize(message)
+    operations: list[CartOperation] = []
+    action: Optional[CartAction] = None
+    quantity: Optional[int] = None
+
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token in _ACTION_WORDS:
+            action = _ACTION_WORDS[token]
+            quantity = None
+            i += 1
+            continue
+
+        product_id = None
+        end = i + 1
+        if token in _ID_WORDS and i + 1 < len(tokens) and tokens[i + 1].isdigit():
+            product_id = int(tokens[i + 1])
+            end = i + 2
+        else:
+            match = gazetteer.match_at(tokens, i)
+            if match is not None:
+                product_id, end = match.product_id, match.end
+
+        if product_id is None:
+            number = _number(token)
+            if number is not None:
+                quantity = number
+            i += 1
+            continue
+
+        if quantity is None and action != "remove":
+            # Cantidad detrás del producto: 'gorra x2', 'cambia la gorra a 3'.
+            nxt = tokens[end] if end < len(tokens) else None
+            times = _TIMES_TOKEN_RE.fullmatch(nxt or "")
+            if times:
+                quantity, end = int(times.group(1)), end + 1
+            elif nxt == "a" and end + 1 < len(tokens) and tokens[end + 1].isdigit():
+                quantity, end = int(tokens[end + 1]), end + 2
+            elif action == "set" and nxt is not None and nxt.isdigit():
+                quantity, end = int(nxt), end + 1
+
+        if action is not None:
+            operations.append(CartOperation(action, product_id, quantity))
+        quantity = None
+        i = end
+    return operations
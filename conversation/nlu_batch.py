@@ -0,0 +1,176 @@
+"""
+Reanálisis masivo de mensajes con parse_user_message.
+
+Sirve para volver a pasar el histórico de conversaciones cuando cambian las
+keywords y ver qué mensajes cambian de intención. Los mensajes se leen en
+streaming, se reparten en bloques entre un pool de procesos (una CPU por
+proceso) y los resultados salen en el mismo orden que la entrada, con un
+número acotado de bloques en vuelo para no cargar el fichero entero en memoria.
+
+Uso:
+    python -m conversation.nlu_batch mensajes.jsonl -o resultados.jsonl
+    python -m conversation.nlu_batch mensajes.txt -o nuevos.jsonl --previous resultados.jsonl
+
+Entrada: texto (un mensaje por línea) o JSONL con el mensaje en "text" o
+"message". Salida: JSONL con el mensaje, la intención y los slots.
+"""
+from collections import Counter, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import asdict
+from itertools import islice
+from typing import Iterable, Iterator, Optional, TextIO
+import argparse
+import json
+import os
+import sys
+
+from .nlu import ParsedIntent, parse_user_message
+
+CHUNK_SIZE = 2000
+SLOTS = ("product_name", "product_id", "quantity", "coupon_code")
+
+
+def _parse_chunk(messages: list[str]) -> list[ParsedIntent]:
+    return [parse_user_message(message) for message in messages]
+
+
+def _chunks(messages: Iterable[str], size: int) -> Iterator[list[str]]:
+    it = iter(messages)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def parse_many(
+    messages: Iterable[str],
+    workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[ParsedIntent]:
+    """
+    Igual que [parse_user_message(m) for m in messages], pero repartido
+    entre `workers` procesos (por defecto, uno por CPU). Con workers=1 se
+    analiza en el propio proceso.
+    """
+    for _, parsed in parse_many_with_text(messages, workers, chunk_size):
+        yield parsed
+
+
+def parse_many_with_text(
+    messages: Iterable[str],
+    workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[tuple[str, ParsedIntent]]:
+    """Como parse_many, pero emparejando cada resultado con su mensaje."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in _chunks(messages, chunk_size):
+            yield from zip(chunk, _parse_chunk(chunk))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from _parse_in_pool(pool, _chunks(messages, chunk_size), max_in_flight=workers * 2)
+
+
+def _parse_in_pool(
+    pool: Executor, chunks: Iterator[list[str]], max_in_flight: int
+) -> Iterator[tuple[str, ParsedIntent]]:
+    pending: deque = deque()
+    for chunk in chunks:
+        pending.append((chunk, pool.submit(_parse_chunk, chunk)))
+        if len(pending) >= max_in_flight:
+            chunk, future = pending.popleft()
+            yield from zip(chunk, future.result())
+    while pending:
+        chunk, future = pending.popleft()
+        yield from zip(chunk, future.result())
+
+
+def read_messages(file: TextIO) -> Iterator[str]:
+    """Mensajes de un fichero de texto o JSONL (se detecta por línea)."""
+    for line in file:
+        line = line.rstrip("\n")
+        if not line.strip():
+            continue
+        if line.lstrip().startswith("{"):
+            record = json.loads(line)
+            yield record.get("text") or record.get("message") or ""
+        else:
+            yield line
+
+
+def to_record(message: str, parsed: ParsedIntent) -> dict:
+    return {"text": message, **asdict(parsed)}
+
+
+def diff_records(previous: Iterable[dict], current: Iterable[dict]) -> Iterator[tuple[dict, dict]]:
+    """
+    Pares (anterior, actual) de los mensajes cuya intención o slots han
+    cambiado. Ambas ejecuciones deben venir de la misma entrada (mismo orden).
+    """
+    for old, new in zip(previous, current):
+        if old["text"] != new["text"]:
+            raise ValueError(f"Las ejecuciones no corresponden a la misma entrada: {old['text']!r} / {new['text']!r}")
+        if old["intent"] != new["intent"] or any(old.get(s) != new.get(s) for s in SLOTS):
+            yield old, new
+
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description="Reanaliza mensajes con parse_user_message.")
+    parser.add_argument("messages", help="Fichero de texto (un mensaje por línea) o JSONL")
+    parser.add_argument("-o", "--output", help="JSONL de resultados (por defecto, salida estándar)")
+    parser.add_argument("--previous", help="Resultados de una ejecución anterior con los que comparar")
+    parser.add_argument("--workers", type=int, help="Procesos (por defecto, uno por CPU)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    with open(args.messages, "r", encoding="utf-8") as source:
+        results = parse_many_with_text(read_messages(source), args.workers, args.chunk_size)
+        records = (to_record(m, p) for m, p in results)
+        if not args.previous:
+            _write(records, args.output)
+            return
+
+        changes: Counter = Counter()
+        examples: dict[tuple[str, str], str] = {}
+        current = _tee_to_output(records, args.output)
+        with open(args.previous, "r", encoding="utf-8") as previous_file:
+            previous = (json.loads(line) for line in previous_file if line.strip())
+            changed = 0
+            for old, new in diff_records(previous, current):
+                changed += 1
+                key = (old["intent"], new["intent"])
+                changes[key] += 1
+                examples.setdefault(key, new["text"])
+            # Se agota la salida aunque la ejecución anterior fuese más corta.
+            for _ in current:
+                pass
+
+    print(f"Mensajes con cambios: {changed}", file=sys.stderr)
+    for (old_intent, new_intent), n in changes.most_common():
+        print(f"  {old_intent:>16} -> {new_intent:<16} {n:8d}  p. ej. {examples[(old_intent, new_intent)]!r}",
+              file=sys.stderr)
+
+
+def _write(records: Iterable[dict], path: Optional[str]) -> None:
+    out = open(path, "w", encoding="utf-8") if path else sys.stdout
+    try:
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if path:
+            out.close()
+
+
+def _tee_to_output(records: Iterable[dict], path: Optional[str]) -> Iterator[dict]:
+    out = open(path, "w", encoding="utf-8") if path else None
+    try:
+        for record in records:
+            if out:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            yield record
+    finally:
+        if out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
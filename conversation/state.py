@@ -1,20 +1,33 @@
 from typing import Literal, TypedDict, Optional
-from domain.models import Cart, Product, Coupon, DiscountSummary
+from domain.models import Cart, DiscountSummary
+from domain.catalog import CatalogIndex
+from domain.coupons import CouponRegistry
+from .history import ChatHistory, MessageRef
+from .nlu import CartOperation, ParsedIntent
 
 ConversationMode = Literal["catalog", "cart_edit", "confirmation", "shipping", "end"]
 
 class ConversationState(TypedDict, total=False):
     mode: ConversationMode
     cart: Cart
-    catalog: list[Product]
-    coupons: list[Coupon]
+    catalog: CatalogIndex
+    coupons: CouponRegistry
+    data_version: int
+    catalog_page: int
+    catalog_category: Optional[str]
     applied_coupon_code: Optional[str]
     last_user_message: str
+    # Intención de last_user_message; la calcula el router una vez por turno.
+    parsed_intent: Optional[ParsedIntent]
+    # Operaciones de un mensaje con varios productos ('añade X y quita Y').
+    cart_operations: list[CartOperation]
     shipping_name: Optional[str]
     shipping_city: Optional[str]
     bot_message: str
+    # Plantilla y parámetros de bot_message, para guardarlo compacto en el historial.
+    bot_message_ref: Optional[MessageRef]
     discount_summary: Optional[DiscountSummary]
-    chat_history: list[tuple[str, str]]
+    chat_history: ChatHistory
 
     last_order_name: Optional[str]
     last_order_city: Optional[str]
@@ -0,0 +1,373 @@
+"""
+Precios en lote con NumPy para simular promociones sobre carritos históricos.
+
+Aplica exactamente un PromotionPlan (por defecto el activo en
+domain/pricing.py): reglas de línea por categoría o id, apilables o no, y
+tramos de descuento por total, con las mismas operaciones y en el mismo
+orden, así que los resultados coinciden con calculate_totals. Trabaja sobre
+arrays: una pasada vectorizada por escenario y grupo de reglas en lugar de
+un bucle de Python por carrito.
+
+Requiere numpy (está en requirements.txt).
+
+Uso:
+    python -m domain.batch_pricing carritos.jsonl --threshold 80 --coupon VIP20=15
+
+Cada línea del JSONL es un carrito; product_id y category son opcionales
+(sin ellos solo aplican las reglas globales):
+    {"lines": [{"price": 15.99, "quantity": 2, "product_id": 101, "category": "Ropa"}, ...],
+     "coupon": "VIP20"}
+"""
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Iterable, Optional
+import argparse
+import json
+import math
+import sys
+
+import numpy as np
+
+from .coupons import load_coupons
+from .models import Cart, Coupon
+from .pricing import get_promotion_plan
+from .promotions import DATA_PATH, PromotionError, PromotionPlan, compile_rules, load_promotions
+
+COUPON_NONE, COUPON_PERCENT, COUPON_FIXED = 0, 1, 2
+_COUPON_TYPES = {"percent": COUPON_PERCENT, "fixed": COUPON_FIXED}
+
+
+@dataclass(frozen=True)
+class PricingParams:
+    """Parámetros de un escenario; por defecto, el plan de promociones activo."""
+    plan: Optional[PromotionPlan] = None
+    # Valor alternativo de cupones concretos, p. ej. {"VIP20": 15}
+    coupon_values: dict[str, float] = field(default_factory=dict)
+
+
+def with_cart_threshold(
+    plan: PromotionPlan,
+    min_total: Optional[float] = None,
+    rate: Optional[float] = None,
+) -> PromotionPlan:
+    """
+    Copia de `plan` con otro umbral y/o porcentaje en su descuento por total
+    (los actuales si no se indican). Con varios tramos no está claro cuál
+    cambiar: en ese caso el escenario tiene que ser un plan completo.
+    """
+    tiers = plan.tiers
+    if len(tiers) > 1:
+        raise PromotionError("El plan tiene varios tramos de descuento por total: define el escenario como un plan")
+    if not tiers and (min_total is None or rate is None):
+        raise PromotionError("El plan no tiene descuento por total: indica umbral y porcentaje")
+    tier = {
+        "min_total": tiers[0].min_total if min_total is None else min_total,
+        "rate": tiers[0].rate if rate is None else rate,
+    }
+    definitions = [
+        {**d, "tiers": [tier]} if d.get("type") == "cart_threshold" and d.get("active", True) else d
+        for d in plan.definitions
+    ]
+    if not tiers:
+        definitions.append({"id": "escenario-total", "type": "cart_threshold", "tiers": [tier]})
+    return compile_rules(definitions)
+
+
+@dataclass
+class BatchTotals:
+    """Totales por carrito (arrays de longitud n_carts)."""
+    subtotal: np.ndarray
+    line_discounts: np.ndarray
+    cart_discount: np.ndarray
+    coupon_discount: np.ndarray
+    final_total: np.ndarray
+
+
+@dataclass
+class ScenarioResult:
+    revenue: float
+    subtotal: float
+    line_discounts: float
+    cart_discount: float
+    coupon_discount: float
+    carts_with_cart_discount: int
+    carts_with_coupon_discount: int
+
+
+def _fsum_by_cart(line_cart: np.ndarray, values: np.ndarray, n: int) -> np.ndarray:
+    """
+    Suma de `values` por carrito con el mismo resultado que math.fsum (la
+    suma exacta redondeada una vez), que es como suma el Cart.
+
+    Se acumula en doble-double (suma + error exacto de cada suma) columna a
+    columna, una línea de cada carrito por pasada. El redondeo final solo es
+    dudoso si el resto queda a un pelo de medio ulp; esos carritos (casi
+    nunca hay) se suman con math.fsum.
+    """
+    counts = np.bincount(line_cart, minlength=n)
+    if len(values) == 0:
+        return np.zeros(n)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    if np.all(line_cart[1:] >= line_cart[:-1]):
+        carts = line_cart
+    else:
+        order = np.argsort(line_cart, kind="stable")
+        carts, values = line_cart[order], values[order]
+    position = np.arange(len(carts)) - starts[carts]
+    # Fila k: la k-ésima línea de cada carrito (0 si tiene menos).
+    columns = np.zeros((int(counts.max()), n))
+    columns[position, carts] = values
+
+    hi = np.zeros(n)
+    lo = np.zeros(n)
+    # Si lo se ha acumulado sin redondeos, hi + lo es la suma exacta.
+    lo_exact = np.ones(n, dtype=bool)
+    for column in columns:
+        total = hi + column
+        back = total - hi
+        error = (hi - (total - back)) + (column - back)
+        new_lo = lo + error
+        back = new_lo - lo
+        lo_exact &= (lo - (new_lo - back)) + (error - back) == 0
+        lo = new_lo
+        hi = total
+    result = hi + lo
+    back = result - hi
+    rest = (hi - (result - back)) + (lo - back)
+
+    half_ulp = np.spacing(np.abs(result)) / 2
+    doubtful = np.flatnonzero(~lo_exact & (np.abs(rest) >= half_ulp * (1 - 2.0 ** -20)))
+    for cart in doubtful:
+        result[cart] = math.fsum(columns[:counts[cart], cart].tolist())
+    return result
+
+
+class CartBatch:
+    """
+    Carritos codificados en arrays planos:
+    - una fila por línea: carrito al que pertenece, precio, cantidad y clave
+      (índice en `keys` del par (id de producto, categoría), que decide qué
+      reglas de línea le aplican),
+    - un código de cupón por carrito (índice en `coupon_codes`, -1 = sin cupón),
+    - la definición de cada cupón (tipo, valor y mínimo) en arrays paralelos.
+    """
+
+    def __init__(
+        self,
+        line_cart: np.ndarray,
+        prices: np.ndarray,
+        quantities: np.ndarray,
+        cart_coupon: np.ndarray,
+        coupons: list[Coupon],
+        line_key: Optional[np.ndarray] = None,
+        keys: Optional[list[tuple[Optional[int], Optional[str]]]] = None,
+    ):
+        self.line_cart = np.asarray(line_cart, dtype=np.int64)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        self.quantities = np.asarray(quantities, dtype=np.int64)
+        self.cart_coupon = np.asarray(cart_coupon, dtype=np.int64)
+        self.coupons = list(coupons)
+        self.coupon_codes = [c.code.upper() for c in self.coupons]
+        if line_key is None:
+            # Sin producto ni categoría: solo aplican las reglas globales.
+            line_key, keys = np.zeros(len(self.prices), dtype=np.int64), [(None, None)]
+        self.line_key = np.asarray(line_key, dtype=np.int64)
+        self.keys = list(keys)
+
+    @property
+    def n_carts(self) -> int:
+        return len(self.cart_coupon)
+
+    @classmethod
+    def from_carts(cls, carts: Iterable[Cart]) -> "CartBatch":
+        line_cart, prices, quantities, line_key, cart_coupon = [], [], [], [], []
+        keys: dict[tuple[Optional[int], Optional[str]], int] = {}
+        coupons: list[Coupon] = []
+        coupon_index: dict[str, int] = {}
+
+        for n, cart in enumerate(carts):
+            for item in cart.items.values():
+                line_cart.append(n)
+                prices.append(item.product.price)
+                quantities.append(item.quantity)
+                line_key.append(keys.setdefault((item.product.id, item.product.category), len(keys)))
+            coupon = cart.applied_coupon
+            if coupon is None:
+                cart_coupon.append(-1)
+                continue
+            key = coupon.code.upper()
+            if key not in coupon_index:
+                coupon_index[key] = len(coupons)
+                coupons.append(coupon)
+            cart_coupon.append(coupon_index[key])
+
+        return cls(line_cart, prices, quantities, cart_coupon, coupons, line_key, list(keys))
+
+    @classmethod
+    def from_jsonl(cls, lines: Iterable[str], coupons: Iterable[Coupon]) -> "CartBatch":
+        known = {c.code.upper(): c for c in coupons}
+        line_cart, prices, quantities, line_key, cart_coupon = [], [], [], [], []
+        keys: dict[tuple[Optional[int], Optional[str]], int] = {}
+        used: list[Coupon] = []
+        used_index: dict[str, int] = {}
+
+        n = 0
+        for raw in lines:
+            if not raw.strip():
+                continue
+            record = json.loads(raw)
+            for line in record.get("lines", []):
+                line_cart.append(n)
+                prices.append(line["price"])
+                quantities.append(line["quantity"])
+                line_key.append(keys.setdefault((line.get("product_id"), line.get("category")), len(keys)))
+            code = (record.get("coupon") or "").upper()
+            if code in known:
+                if code not in used_index:
+                    used_index[code] = len(used)
+                    used.append(known[code])
+                cart_coupon.append(used_index[code])
+            else:
+                cart_coupon.append(-1)
+            n += 1
+
+        return cls(line_cart, prices, quantities, cart_coupon, used, line_key, list(keys))
+
+    def _line_discounts(self, plan: PromotionPlan, line_totals: np.ndarray) -> np.ndarray:
+        """
+        PromotionPlan.line_discount de cada línea: las líneas se agrupan por
+        las reglas que les aplican y cada grupo se calcula de una vez.
+        """
+        groups: dict[tuple, int] = {}
+        key_group = np.array(
+            [groups.setdefault(plan.rules_for_key(*key), len(groups)) for key in self.keys], dtype=np.int64
+        )
+        line_group = key_group[self.line_key] if len(self.line_key) else self.line_key
+
+        discounts = np.zeros(len(self.prices))
+        for rules, group in groups.items():
+            if not rules:
+                continue
+            lines = np.flatnonzero(line_group == group)
+            prices, quantities = self.prices[lines], self.quantities[lines]
+            best = np.zeros(len(lines))
+            stacked = np.zeros(len(lines))
+            for rule in rules:
+                if rule.kind == "multibuy":
+                    amount = np.floor(quantities / rule.group_size) * prices * rule.amount
+                else:
+                    amount = prices * quantities * rule.amount
+                if rule.stackable:
+                    stacked = stacked + amount
+                else:
+                    best = np.maximum(best, amount)
+            discounts[lines] = np.where(stacked != 0, np.minimum(best + stacked, line_totals[lines]), best)
+        return discounts
+
+    def _coupon_arrays(self, params: PricingParams) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        overrides = {code.upper(): value for code, value in params.coupon_values.items()}
+        types = np.array([_COUPON_TYPES.get(c.type, COUPON_NONE) for c in self.coupons] + [COUPON_NONE])
+        values = np.array(
+            [overrides.get(code, c.value) for code, c in zip(self.coupon_codes, self.coupons)] + [0.0],
+            dtype=np.float64,
+        )
+        mins = np.array([c.min_total for c in self.coupons] + [0.0], dtype=np.float64)
+        # El índice -1 (sin cupón) apunta a la entrada extra del final.
+        return types[self.cart_coupon], values[self.cart_coupon], mins[self.cart_coupon]
+
+    def price(self, params: PricingParams = PricingParams()) -> BatchTotals:
+        n = self.n_carts
+        plan = params.plan or get_promotion_plan()
+
+        # Subtotal y descuentos de línea, sumados por carrito como el Cart.
+        line_totals = self.prices * self.quantities
+        subtotal = _fsum_by_cart(self.line_cart, line_totals, n)
+        line_discount = _fsum_by_cart(self.line_cart, self._line_discounts(plan, line_totals), n)
+        after_line = subtotal - line_discount
+
+        # Descuento por total: el primer tramo superado, de mayor a menor mínimo.
+        cart_discount = np.zeros(n)
+        pending = np.ones(n, dtype=bool)
+        for tier in plan.tiers:
+            hit = pending & (after_line > tier.min_total)
+            cart_discount[hit] = after_line[hit] * tier.rate
+            pending &= ~hit
+        after_cart = after_line - cart_discount
+
+        # Descuento por cupón
+        types, values, mins = self._coupon_arrays(params)
+        eligible = after_cart >= mins
+        coupon_discount = np.zeros(n)
+        percent = eligible & (types == COUPON_PERCENT)
+        fixed = eligible & (types == COUPON_FIXED)
+        coupon_discount[percent] = after_cart[percent] * (values[percent] / 100)
+        coupon_discount[fixed] = np.minimum(values[fixed], after_cart[fixed])
+
+        final_total = np.maximum(after_cart - coupon_discount, 0.0)
+        return BatchTotals(subtotal, line_discount, cart_discount, coupon_discount, final_total)
+
+    def simulate(self, params: PricingParams = PricingParams()) -> ScenarioResult:
+        totals = self.price(params)
+        return ScenarioResult(
+            revenue=float(totals.final_total.sum()),
+            subtotal=float(totals.subtotal.sum()),
+            line_discounts=float(totals.line_discounts.sum()),
+            cart_discount=float(totals.cart_discount.sum()),
+            coupon_discount=float(totals.coupon_discount.sum()),
+            carts_with_cart_discount=int((totals.cart_discount > 0).sum()),
+            carts_with_coupon_discount=int((totals.coupon_discount > 0).sum()),
+        )
+
+
+def compare_scenarios(
+    batch: CartBatch,
+    scenarios: dict[str, PricingParams],
+    baseline: Optional[PricingParams] = None,
+) -> dict[str, tuple[ScenarioResult, float]]:
+    """
+    Devuelve, por escenario, su resultado y la diferencia de ingresos
+    respecto al escenario base (el plan activo si no se indica).
+    """
+    base = batch.simulate(baseline or PricingParams())
+    return {
+        name: (result, result.revenue - base.revenue)
+        for name, result in ((name, batch.simulate(params)) for name, params in scenarios.items())
+    }
+
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description="Simulación de promociones sobre carritos históricos.")
+    parser.add_argument("carts", help="Fichero JSONL con un carrito por línea")
+    parser.add_argument("--promotions", type=Path, default=DATA_PATH,
+                        help="Promociones vigentes (por defecto, las de la aplicación)")
+    parser.add_argument("--threshold", type=float, help="Umbral del descuento por total")
+    parser.add_argument("--rate", type=float, help="Porcentaje (0-1) del descuento por total")
+    parser.add_argument("--coupon", action="append", default=[], metavar="CODIGO=VALOR",
+                        help="Valor alternativo de un cupón (repetible)")
+    args = parser.parse_args(argv)
+
+    current = PricingParams(plan=load_promotions(args.promotions))
+    scenario = current
+    if args.threshold is not None or args.rate is not None:
+        scenario = replace(scenario, plan=with_cart_threshold(current.plan, args.threshold, args.rate))
+    if args.coupon:
+        values = {code: float(value) for code, value in (c.split("=", 1) for c in args.coupon)}
+        scenario = replace(scenario, coupon_values=values)
+
+    with open(args.carts, "r", encoding="utf-8") as file:
+        batch = CartBatch.from_jsonl(file, load_coupons())
+
+    base = batch.simulate(current)
+    (result, delta), = compare_scenarios(batch, {"escenario": scenario}, current).values()
+    print(f"Carritos: {batch.n_carts}")
+    for label, r in (("Actual", base), ("Escenario", result)):
+        print(
+            f"{label:<10} ingresos {r.revenue:14.2f} €  cantidades -{r.line_discounts:.2f} €  "
+            f"total -{r.cart_discount:.2f} € ({r.carts_with_cart_discount} carritos)  "
+            f"cupones -{r.coupon_discount:.2f} € ({r.carts_with_coupon_discount} carritos)"
+        )
+    print(f"Diferencia de ingresos: {delta:+.2f} €")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,20 +1,182 @@
 import json
+from array import array
+from functools import cached_property
 from pathlib import Path
+from typing import Iterable, Iterator, Sequence
+from .gazetteer import ProductGazetteer
 from .models import Product
+from .search import ProductMatch, ProductMatcher
 
 DATA_PATH = Path(__file__).resolve().parents[1] / "data" / "products.json"
 
-def load_catalog() -> list[Product]:
-    with open(DATA_PATH, "r", encoding="utf-8") as file:
+
+class CatalogIndex:
+    """
+    Catálogo indexado: se construye una sola vez y permite
+    - búsqueda por id en O(1),
+    - búsqueda por nombre a través de un índice de palabras,
+    - búsqueda aproximada y ordenada por puntuación (índice de trigramas).
+    Se puede iterar como la lista de productos original (mismo orden).
+    """
+
+    def __init__(self, products: Iterable[Product]):
+        self.products: Sequence[Product] = self._store(products)
+        self._build_id_index()
+
+    def _store(self, products: Iterable[Product]) -> Sequence[Product]:
+        return list(products)
+
+    def _build_id_index(self) -> None:
+        self._by_id: dict[int, Product] = {}
+        for product in self.products:
+            self._by_id.setdefault(product.id, product)
+
+    @cached_property
+    def _by_token(self) -> dict[str, array]:
+        # Se construye en la primera búsqueda por nombre, no al cargar.
+        by_token: dict[str, array] = {}
+        for position, product in enumerate(self.products):
+            for token in set(product.name.lower().split()):
+                by_token.setdefault(token, array("I")).append(position)
+        return by_token
+
+    def __iter__(self) -> Iterator[Product]:
+        return iter(self.products)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def get(self, product_id: int) -> Product | None:
+        return self._by_id.get(product_id)
+
+    def find_by_name(self, name: str) -> Product | None:
+        """
+        Solo se comparan los productos que comparten alguna palabra con el texto
+        (admitiendo plurales simples: 'gorras' -> 'gorra'); sobre esos candidatos
+        se aplica la regla de siempre (uno contenido en el otro).
+        """
+        name_lower = name.lower()
+        positions: set[int] = set()
+        for token in name_lower.split():
+            for variant in (token, token[:-1], token[:-2]):
+                positions.update(self._by_token.get(variant, ()))
+
+        for position in sorted(positions):
+            product = self.products[position]
+            product_name = product.name.lower()
+            if product_name in name_lower or name_lower in product_name:
+                return product
+        return None
+
+    @cached_property
+    def _by_category(self) -> dict[str, array]:
+        by_category: dict[str, array] = {}
+        for position, product in enumerate(self.products):
+            if product.category:
+                by_category.setdefault(product.category, array("I")).append(position)
+        return by_category
+
+    @property
+    def categories(self) -> list[str]:
+        return list(self._by_category)
+
+    def page(self, page: int, size: int, category: str | None = None) -> list[Product]:
+        """
+        Productos de la página `page` (empezando en 1), opcionalmente
+        filtrados por categoría. Solo se materializan los de esa página.
+        """
+        start = (page - 1) * size
+        if category is None:
+            return [self.products[i] for i in range(start, min(start + size, len(self.products)))]
+        positions = self._by_category.get(category, array("I"))
+        return [self.products[i] for i in positions[start:start + size]]
+
+    def count(self, category: str | None = None) -> int:
+        if category is None:
+            return len(self.products)
+        return len(self._by_category.get(category, ()))
+
+    @cached_property
+    def matcher(self) -> ProductMatcher:
+        # Se construye en la primera búsqueda aproximada, no al cargar.
+        return ProductMatcher(self.products)
+
+    def search(self, text: str, limit: int = 5) -> list[ProductMatch]:
+        return self.matcher.search(text, limit)
+
+    @cached_property
+    def gazetteer(self) -> ProductGazetteer:
+        # Para localizar varios productos en una misma frase; perezoso como el matcher.
+        return ProductGazetteer(self.products)
+
+    def updated(self, products: list[Product]) -> "CatalogIndex":
+        """
+        Devuelve un índice nuevo con `products` sin tocar el actual (para poder
+        intercambiarlos de forma atómica). Los productos que no cambian se
+        reutilizan tal cual y, si ningún nombre ni posición cambia, también se
+        comparten el índice de palabras y el de trigramas.
+        Si no hay ningún cambio devuelve el propio índice.
+        """
+        old = self.products
+        same_layout = len(products) == len(old) and all(
+            a.id == b.id and a.name == b.name for a, b in zip(old, products)
+        )
+        if same_layout and all(a == b for a, b in zip(old, products)):
+            return self
+
+        if same_layout:
+            merged = [a if a == b else b for a, b in zip(old, products)]
+        else:
+            merged = []
+            for product in products:
+                previous = self._by_id.get(product.id)
+                merged.append(previous if previous == product else product)
+
+        index = CatalogIndex(merged)
+        if same_layout:
+            if "_by_token" in self.__dict__:
+                index._by_token = self._by_token
+            if "matcher" in self.__dict__:
+                index.matcher = self.matcher.rebind(index.products)
+            if "gazetteer" in self.__dict__:
+                # Solo guarda nombres e ids, que no cambian con el mismo layout.
+                index.gazetteer = self.gazetteer
+        return index
+
+
+def read_products(path: Path = DATA_PATH) -> list[Product]:
+    with open(path, "r", encoding="utf-8") as file:
         raw = json.load(file)
     return [Product(**item) for item in raw]
 
-def find_product_by_id(catalog: list[Product], product_id: int) -> Product | None:
-    return next((p for p in catalog if p.id == product_id), None)
+def load_catalog(compact: bool = False) -> CatalogIndex:
+    """
+    Si existe un snapshot binario al día (python -m domain.snapshot) se mapea
+    en memoria en vez de leer el JSON. Con compact=True se usa la
+    representación columnar (CompactCatalog), pensada para catálogos grandes.
+    """
+    from .snapshot import SnapshotCatalog, snapshot_is_fresh
+
+    if snapshot_is_fresh(DATA_PATH):
+        try:
+            return SnapshotCatalog()
+        except ValueError:
+            pass  # Snapshot de otra versión: se ignora y se lee el JSON.
+
+    products = read_products()
+    if compact:
+        from .compact_catalog import CompactCatalog
+        return CompactCatalog(products)
+    return CatalogIndex(products)
+
+def as_catalog_index(catalog: CatalogIndex | list[Product]) -> CatalogIndex:
+    return catalog if isinstance(catalog, CatalogIndex) else CatalogIndex(catalog)
+
+def find_product_by_id(catalog: CatalogIndex | list[Product], product_id: int) -> Product | None:
+    return as_catalog_index(catalog).get(product_id)
+
+def find_product_by_name(catalog: CatalogIndex | list[Product], name: str) -> Product | None:
+    return as_catalog_index(catalog).find_by_name(name)
 
-def find_product_by_name(catalog: list[Product], name: str) -> Product | None:
-    name_lower = name.lower()
-    return next(
-        (p for p in catalog if p.name.lower() in name_lower or name_lower in p.name.lower()),
-        None,
-    )
\ No newline at end of file
+def search_products(catalog: CatalogIndex | list[Product], text: str, limit: int = 5) -> list[ProductMatch]:
+    return as_catalog_index(catalog).search(text, limit)
@@ -0,0 +1,128 @@
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator, Optional, Sequence
+
+from .catalog import CatalogIndex
+from .models import Product
+
+
+class StringPool:
+    """
+    Tabla de cadenas internadas: cada valor distinto se guarda una sola vez
+    y las filas solo almacenan su código. El código 0 representa None.
+    """
+
+    __slots__ = ("values", "_codes")
+
+    def __init__(self):
+        self.values: list[Optional[str]] = [None]
+        self._codes: dict[str, int] = {}
+
+    def code(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+
+class StringHeap:
+    """
+    Cadenas únicas (nombres, descripciones, rutas) codificadas en UTF-8 dentro
+    de un único bytearray; cada entrada se identifica por su índice y se
+    decodifica al leerla. La entrada 0 representa None.
+    """
+
+    __slots__ = ("data", "ends")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.ends = array("Q", [0, 0])
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        self.data += value.encode("utf-8")
+        self.ends.append(len(self.data))
+        return len(self.ends) - 2
+
+    def get(self, index: int) -> Optional[str]:
+        if index == 0:
+            return None
+        return self.data[self.ends[index]:self.ends[index + 1]].decode("utf-8")
+
+
+class CompactProducts(Sequence[Product]):
+    """
+    Almacenamiento columnar del catálogo:
+    - ids y precios en arrays tipados,
+    - categorías como códigos de un StringPool (hay pocas distintas),
+    - nombres, descripciones e imágenes en un StringHeap.
+    Los Product se crean solo al acceder a una posición (vistas ligeras).
+    """
+
+    __slots__ = ("ids", "prices", "names", "descriptions", "categories", "images", "pool", "heap")
+
+    def __init__(self, products: Iterable[Product]):
+        self.ids = array("q")
+        self.prices = array("d")
+        self.names = array("I")
+        self.descriptions = array("I")
+        self.categories = array("I")
+        self.images = array("I")
+        self.pool = StringPool()
+        self.heap = StringHeap()
+
+        for product in products:
+            self.ids.append(product.id)
+            self.prices.append(product.price)
+            self.names.append(self.heap.add(product.name))
+            self.descriptions.append(self.heap.add(product.description))
+            self.categories.append(self.pool.code(product.category))
+            self.images.append(self.heap.add(product.image))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, position: int) -> Product:
+        if position < 0:
+            position += len(self.ids)
+        heap = self.heap
+        return Product(
+            id=self.ids[position],
+            name=heap.get(self.names[position]),
+            price=self.prices[position],
+            category=self.pool.values[self.categories[position]],
+            description=heap.get(self.descriptions[position]),
+            image=heap.get(self.images[position]),
+        )
+
+    def __iter__(self) -> Iterator[Product]:
+        for position in range(len(self.ids)):
+            yield self[position]
+
+
+class CompactCatalog(CatalogIndex):
+    """
+    CatalogIndex sobre CompactProducts. En vez de un dict id -> Product,
+    la búsqueda por id es una bisección sobre los ids ordenados (O(log n)),
+    para no mantener un objeto por producto en memoria.
+    """
+
+    def _store(self, products: Iterable[Product]) -> Sequence[Product]:
+        return CompactProducts(products)
+
+    def _build_id_index(self) -> None:
+        rows = self.products
+        order = sorted(range(len(rows)), key=rows.ids.__getitem__)
+        self._sorted_ids = array("q", (rows.ids[i] for i in order))
+        self._sorted_rows = array("I", order)
+
+    def get(self, product_id: int) -> Product | None:
+        i = bisect_left(self._sorted_ids, product_id)
+        if i < len(self._sorted_ids) and self._sorted_ids[i] == product_id:
+            return self.products[self._sorted_rows[i]]
+        return None
@@ -0,0 +1,105 @@
+from bisect import bisect_right
+from typing import Callable, Iterable, Optional
+import threading
+
+from .models import Coupon
+from .pricing import calculate_coupon_discount
+
+
+class _CouponLadder:
+    """
+    Cupones de un mismo tipo ordenados por min_total en un árbol de
+    segmentos que guarda, para cada tramo, la posición del de mayor `value`.
+    Para un total T los aplicables son un prefijo (bisect) y el mejor de
+    ellos sale en O(log n). Un cupón agotado se quita del árbol, también en
+    O(log n), la primera vez que sale como mejor: no se vuelve a mirar.
+    """
+
+    def __init__(self, coupons: list[Coupon]):
+        self.coupons = sorted(coupons, key=lambda c: c.min_total)
+        self.mins = [c.min_total for c in self.coupons]
+        self._size = 1
+        while self._size < len(self.coupons):
+            self._size *= 2
+        # Hojas en _tree[_size + i]; -1 es un tramo sin cupones disponibles.
+        self._tree = [-1] * (2 * self._size)
+        self._tree[self._size:self._size + len(self.coupons)] = range(len(self.coupons))
+        for node in range(self._size - 1, 0, -1):
+            self._tree[node] = self._better(self._tree[2 * node], self._tree[2 * node + 1])
+        self._lock = threading.Lock()
+
+    def _better(self, a: int, b: int) -> int:
+        # A igual valor gana el de menor mínimo, como al recorrerlos en orden.
+        if a < 0 or b < 0:
+            return max(a, b)
+        value_a, value_b = self.coupons[a].value, self.coupons[b].value
+        return b if value_b > value_a or (value_b == value_a and b < a) else a
+
+    def _prefix_best(self, end: int) -> int:
+        best = -1
+        lo, hi = self._size, self._size + end
+        while lo < hi:
+            if lo & 1:
+                best = self._better(best, self._tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                best = self._better(best, self._tree[hi])
+            lo //= 2
+            hi //= 2
+        return best
+
+    def _remove(self, i: int) -> None:
+        node = self._size + i
+        self._tree[node] = -1
+        node //= 2
+        while node:
+            self._tree[node] = self._better(self._tree[2 * node], self._tree[2 * node + 1])
+            node //= 2
+
+    def best(self, total: float, available: Callable[[Coupon], bool]) -> Optional[Coupon]:
+        end = bisect_right(self.mins, total)
+        with self._lock:
+            while True:
+                i = self._prefix_best(end)
+                if i < 0:
+                    return None
+                if available(self.coupons[i]):
+                    return self.coupons[i]
+                self._remove(i)
+
+
+class CouponOptimizer:
+    """
+    Encuentra el cupón que más ahorra sobre un total en O(log n):
+    - porcentaje: ahorra total * valor / 100, gana el de mayor porcentaje aplicable,
+    - fijo: ahorra min(valor, total), gana el de mayor valor aplicable,
+    y se comparan los dos ganadores con calculate_coupon_discount.
+
+    Los cupones para los que `available` devuelve False se descartan para
+    siempre (como los agotados de CouponRegistry, cuyos contadores solo
+    crecen), así que cada optimizador debe usarse con un único `available`.
+    """
+
+    def __init__(self, coupons: Iterable[Coupon]):
+        coupons = list(coupons)
+        self._ladders = [
+            _CouponLadder([c for c in coupons if c.type == "percent"]),
+            _CouponLadder([c for c in coupons if c.type == "fixed"]),
+        ]
+
+    def best(
+        self,
+        total_after_cart_discount: float,
+        available: Callable[[Coupon], bool] = lambda coupon: True,
+    ) -> Optional[tuple[Coupon, float]]:
+        """Devuelve (cupón, ahorro) o None si ningún cupón ahorra nada."""
+        best: Optional[tuple[Coupon, float]] = None
+        for ladder in self._ladders:
+            coupon = ladder.best(total_after_cart_discount, available)
+            if coupon is None:
+                continue
+            saving = calculate_coupon_discount(total_after_cart_discount, coupon)
+            if saving > 0 and (best is None or saving > best[1]):
+                best = (coupon, saving)
+        return best
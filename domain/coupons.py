@@ -1,15 +1,131 @@
 import json
+import threading
+from functools import cached_property
 from pathlib import Path
+from typing import Iterable, Iterator, Optional
 from .models import Coupon
 
 DATA_PATH = Path(__file__).resolve().parents[1] / "data" / "coupons.json"
+CAMPAIGNS_PATH = Path(__file__).resolve().parents[1] / "data" / "campaigns.json"
+
+
+class RedemptionCounters:
+    """
+    Contadores de canjes protegidos por locks "a rayas": cada clave cae en
+    una de N franjas con su propio lock y su propio dict, así que canjes de
+    cupones distintos casi nunca compiten por el mismo lock.
+    """
+
+    def __init__(self, stripes: int = 64):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._counts: list[dict[str, int]] = [{} for _ in range(stripes)]
+
+    def _stripe(self, key: str) -> int:
+        return hash(key) % len(self._locks)
+
+    def get(self, key: str) -> int:
+        return self._counts[self._stripe(key)].get(key, 0)
+
+    def try_increment(self, limits: dict[str, Optional[int]]) -> bool:
+        """
+        Incrementa todas las claves de `limits` si ninguna ha llegado a su
+        límite (None = sin límite); si alguna lo ha alcanzado no toca ninguna.
+        Los locks se toman en orden fijo para evitar interbloqueos.
+        """
+        stripes = sorted({self._stripe(key) for key in limits})
+        for stripe in stripes:
+            self._locks[stripe].acquire()
+        try:
+            for key, limit in limits.items():
+                if limit is not None and self.get(key) >= limit:
+                    return False
+            for key in limits:
+                counts = self._counts[self._stripe(key)]
+                counts[key] = counts.get(key, 0) + 1
+            return True
+        finally:
+            for stripe in reversed(stripes):
+                self._locks[stripe].release()
+
+
+class CouponRegistry:
+    """
+    Cupones indexados por código (sin distinguir mayúsculas) con límites de
+    canje por código (Coupon.max_redemptions) y por campaña (campaign_limits).
+    Los contadores se pueden pasar de un registro a otro para que una recarga
+    de cupones no los reinicie.
+    """
+
+    def __init__(
+        self,
+        coupons: Iterable[Coupon],
+        campaign_limits: Optional[dict[str, int]] = None,
+        counters: Optional[RedemptionCounters] = None,
+    ):
+        self.coupons: list[Coupon] = list(coupons)
+        self.campaign_limits: dict[str, int] = dict(campaign_limits or {})
+        self.counters = counters or RedemptionCounters()
+        self._by_code: dict[str, Coupon] = {}
+        for coupon in self.coupons:
+            self._by_code.setdefault(coupon.code.upper(), coupon)
+
+    def __iter__(self) -> Iterator[Coupon]:
+        return iter(self.coupons)
+
+    def __len__(self) -> int:
+        return len(self.coupons)
+
+    def same_definitions(self, other: "CouponRegistry") -> bool:
+        return self.coupons == other.coupons and self.campaign_limits == other.campaign_limits
+
+    def get(self, code: str) -> Coupon | None:
+        return self._by_code.get(code.upper())
+
+    def _limits(self, coupon: Coupon) -> dict[str, Optional[int]]:
+        limits = {f"code:{coupon.code.upper()}": coupon.max_redemptions}
+        if coupon.campaign:
+            limits[f"campaign:{coupon.campaign}"] = self.campaign_limits.get(coupon.campaign)
+        return limits
+
+    def is_available(self, coupon: Coupon) -> bool:
+        """Comprobación sin lock: puede quedar desfasada, el canje es lo que cuenta."""
+        return all(
+            limit is None or self.counters.get(key) < limit
+            for key, limit in self._limits(coupon).items()
+        )
+
+    def redeem(self, coupon: Coupon) -> bool:
+        """Registra un canje; devuelve False si el cupón o su campaña están agotados."""
+        return self.counters.try_increment(self._limits(coupon))
+
+    @cached_property
+    def optimizer(self):
+        from .coupon_optimizer import CouponOptimizer
+        return CouponOptimizer(self.coupons)
+
+    def best_for(self, total_after_cart_discount: float) -> Optional[tuple[Coupon, float]]:
+        """(cupón disponible que más ahorra, ahorro) o None; ver CouponOptimizer."""
+        return self.optimizer.best(total_after_cart_discount, self.is_available)
+
 
 def load_coupons() -> list[Coupon]:
     with open(DATA_PATH, "r", encoding="utf-8") as file:
         raw = json.load(file)
     return [Coupon(**item) for item in raw]
 
-def find_coupon_by_code(coupons: list[Coupon], code: str) -> Coupon | None:
-    code_upper = code.upper()
-    return next((coupon for coupon in coupons if coupon.code.upper() == code_upper), None)
+def load_campaign_limits() -> dict[str, int]:
+    """data/campaigns.json es opcional: [{"campaign": "...", "max_redemptions": N}, ...]"""
+    if not CAMPAIGNS_PATH.exists():
+        return {}
+    with open(CAMPAIGNS_PATH, "r", encoding="utf-8") as file:
+        raw = json.load(file)
+    return {item["campaign"]: item["max_redemptions"] for item in raw}
+
+def load_coupon_registry(counters: Optional[RedemptionCounters] = None) -> CouponRegistry:
+    return CouponRegistry(load_coupons(), load_campaign_limits(), counters)
+
+def as_coupon_registry(coupons: CouponRegistry | list[Coupon]) -> CouponRegistry:
+    return coupons if isinstance(coupons, CouponRegistry) else CouponRegistry(coupons)
 
+def find_coupon_by_code(coupons: CouponRegistry | list[Coupon], code: str) -> Coupon | None:
+    return as_coupon_registry(coupons).get(code)
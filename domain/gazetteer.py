@@ -0,0 +1,80 @@
+from typing import Iterable, Iterator, NamedTuple
+
+from .models import Product
+from .search import WORD_RE
+from .text import normalize
+
+_END = ""
+
+
+def stem(word: str) -> str:
+    """Plural simple a singular: 'camisetas' -> 'camiseta', 'azules' -> 'azul'."""
+    if len(word) > 4 and word.endswith("es") and word[-3] not in "aeiou":
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    return [stem(word) for word in WORD_RE.findall(normalize(text))]
+
+
+class GazetteerMatch(NamedTuple):
+    start: int
+    end: int
+    product_id: int
+
+
+class ProductGazetteer:
+    """
+    Trie de nombres de producto por palabras (normalizadas y en singular)
+    para localizar productos dentro de una frase en una sola pasada.
+
+    Además del nombre completo, la primera palabra del nombre ('gorra' en
+    'Gorra negra') sirve de alias cuando solo la tiene un producto.
+    """
+
+    def __init__(self, products: Iterable[Product]):
+        self._root: dict = {}
+        heads: dict[str, set[int]] = {}
+        for product in products:
+            tokens = tokenize(product.name)
+            if not tokens:
+                continue
+            self._insert(tokens, product.id)
+            heads.setdefault(tokens[0], set()).add(product.id)
+        for head, ids in heads.items():
+            if len(ids) == 1:
+                node = self._root.setdefault(head, {})
+                node.setdefault(_END, next(iter(ids)))
+
+    def _insert(self, tokens: list[str], product_id: int) -> None:
+        node = self._root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        # Con nombres repetidos gana el primero, como en CatalogIndex.get.
+        node.setdefault(_END, product_id)
+
+    def match_at(self, tokens: list[str], start: int) -> GazetteerMatch | None:
+        """Coincidencia más larga que empieza en `start`."""
+        node = self._root
+        best = None
+        for i in range(start, len(tokens)):
+            node = node.get(tokens[i])
+            if node is None:
+                break
+            if _END in node:
+                best = GazetteerMatch(start, i + 1, node[_END])
+        return best
+
+    def find_all(self, tokens: list[str]) -> Iterator[GazetteerMatch]:
+        """Coincidencias de izquierda a derecha, sin solaparse."""
+        i = 0
+        while i < len(tokens):
+            match = self.match_at(tokens, i)
+            if match is None:
+                i += 1
+                continue
+            yield match
+            i = match.end
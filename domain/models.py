@@ -1,7 +1,9 @@
 from dataclasses import dataclass, field
 from typing import Dict, Optional
+import hashlib
+import math
 
-@dataclass
+@dataclass(slots=True)
 class Product:
     id: int
     name: str
@@ -10,7 +12,7 @@ class Product:
     description: Optional[str] = None
     image: Optional[str] = None
 
-@dataclass
+@dataclass(slots=True)
 class CartItem:
     product: Product
     quantity: int
@@ -21,11 +23,134 @@ class Coupon:
     type: str # ej, 'percent' or 'fixed'
     value: float
     min_total: float=0.0
+    max_redemptions: Optional[int] = None # None = sin límite
+    campaign: Optional[str] = None
+
+_DIGEST_MODULUS = 2 ** 128
+
+
+def _line_digest(product: Product, quantity: int) -> int:
+    # 128 bits de blake2b: dos carritos distintos no comparten suma en la práctica.
+    key = repr((product.id, product.price, product.category or "", quantity)).encode()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=16).digest(), "little")
+
 
 @dataclass
 class Cart:
+    """
+    Además de las líneas, el carrito lleva:
+    - `version`, que aumenta con cada cambio de líneas,
+    - el subtotal y el descuento por cantidades de cada línea, actualizados
+      solo para la línea que cambia; los totales se suman con math.fsum la
+      primera vez que se piden tras un cambio, así que no dependen del orden
+      de las operaciones (añadir y quitar no deja restos de coma flotante),
+    - `lines_digest`, un resumen de las líneas (id, precio, categoría,
+      cantidad) que no depende de su orden y se actualiza sumando y restando
+      el de la línea que cambia (ver pricing_cache.cart_fingerprint),
+    - el último DiscountSummary calculado, válido mientras no cambien
+      la versión, el cupón ni las promociones (ver pricing.calculate_totals),
+    - el último HTML de cada vista del carrito, con la misma validez
+      (ver pricing.render_cart_fragment).
+    """
     items: Dict[int, CartItem] = field(default_factory=dict)
     applied_coupon: Optional[Coupon] = None
+    version: int = field(default=0, compare=False)
+    # product_id -> (subtotal de la línea, descuento por cantidades de la línea)
+    _line_totals: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+    _sums: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+    # product_id -> resumen de la línea; lines_digest es su suma módulo 2**128.
+    _line_digests: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+    lines_digest: int = field(default=0, init=False, repr=False, compare=False)
+    _totals_cache: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+    _rules_version: int = field(default=0, init=False, repr=False, compare=False)
+    _fragments: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if self.items:
+            # _rules_version = 0 no es la de ningún plan: se calculan todas las líneas.
+            self._update_line(None)
+
+    def _totals(self) -> tuple:
+        if self._sums is None:
+            lines = self._line_totals.values()
+            self._sums = (math.fsum(base for base, _ in lines), math.fsum(disc for _, disc in lines))
+        return self._sums
+
+    @property
+    def base_total(self) -> float:
+        return self._totals()[0]
+
+    @property
+    def line_discount(self) -> float:
+        return self._totals()[1]
+
+    def cached_totals(self, rules_version: int) -> Optional["DiscountSummary"]:
+        if self._totals_cache is None:
+            return None
+        version, coupon, cached_rules, summary = self._totals_cache
+        if version == self.version and coupon is self.applied_coupon and cached_rules == rules_version:
+            return summary
+        return None
+
+    def store_totals(self, rules_version: int, summary: "DiscountSummary") -> None:
+        self._totals_cache = (self.version, self.applied_coupon, rules_version, summary)
+
+    def cached_fragment(self, view: str, rules_version: int) -> Optional[str]:
+        cached = self._fragments.get(view)
+        if cached is None:
+            return None
+        version, coupon, cached_rules, html = cached
+        if version == self.version and coupon is self.applied_coupon and cached_rules == rules_version:
+            return html
+        return None
+
+    def store_fragment(self, view: str, rules_version: int, html: str) -> None:
+        self._fragments[view] = (self.version, self.applied_coupon, rules_version, html)
+
+    def sync_promotions(self, plan) -> None:
+        """Recalcula todas las líneas si `plan` no es con el que se calcularon."""
+        if self._rules_version != plan.version:
+            self._line_totals = {
+                product_id: (item.product.price * item.quantity, plan.line_discount(item.product, item.quantity))
+                for product_id, item in self.items.items()
+            }
+            self._sums = None
+            self._rules_version = plan.version
+
+    def _update_digest(self, product_id: int) -> None:
+        old = self._line_digests.pop(product_id, 0)
+        item = self.items.get(product_id)
+        new = 0
+        if item is not None:
+            new = _line_digest(item.product, item.quantity)
+            self._line_digests[product_id] = new
+        self.lines_digest = (self.lines_digest - old + new) % _DIGEST_MODULUS
+
+    def _update_line(self, product: Optional[Product]) -> None:
+        """Actualiza los importes de la línea de `product` (o de ninguna, si es None)."""
+        from .pricing import get_promotion_plan  # pricing importa este módulo
+
+        plan = get_promotion_plan()
+        self.version += 1
+        self._sums = None
+        if product is not None:
+            self._update_digest(product.id)
+        elif not self.items:
+            self._line_digests.clear()
+            self.lines_digest = 0
+        else:
+            for product_id in self.items:
+                self._update_digest(product_id)
+        if self._rules_version != plan.version:
+            self.sync_promotions(plan)
+        elif product is not None:
+            item = self.items.get(product.id)
+            if item is None:
+                self._line_totals.pop(product.id, None)
+            else:
+                self._line_totals[product.id] = (
+                    item.product.price * item.quantity, plan.line_discount(item.product, item.quantity)
+                )
 
     def add_item(self, product: Product, quantity: int) -> None:
         if quantity <= 0:
@@ -34,26 +159,41 @@ class Cart:
             self.items[product.id].quantity += quantity
         else:
             self.items[product.id] = CartItem(product=product, quantity=quantity)
+        self._update_line(product)
     
     def set_quantity(self, product_id: int, quantity: int) -> None:
         if quantity <= 0:
-            self.items.pop(product_id, None)
+            self.remove_item(product_id)
             return
         if product_id not in self.items:
             raise KeyError("Este producto no está añadido al carrito.")
-        self.items[product_id].quantity = quantity
+        item = self.items[product_id]
+        item.quantity = quantity
+        self._update_line(item.product)
     
     def remove_item(self, product_id: int) -> None:
-        self.items.pop(product_id, None)
+        item = self.items.pop(product_id, None)
+        if item is not None:
+            self._update_line(item.product)
+
+    def rebind_product(self, product: Product) -> None:
+        """Sustituye el producto de una línea (p. ej. tras recargar el catálogo con otro precio)."""
+        item = self.items.get(product.id)
+        if item is None or item.product is product:
+            return
+        item.product = product
+        self._update_line(product)
 
     def clear(self) -> None:
         self.items.clear()
         self.applied_coupon = None
+        self._line_totals.clear()
+        self._update_line(None)
     
     def is_empty(self) -> bool:
         return len(self.items) == 0
     
-@dataclass
+@dataclass(frozen=True)
 class DiscountSummary:
     subtotal: float
     line_discounts: float
@@ -1,28 +1,67 @@
-from math import floor
-from .models import Cart, DiscountSummary, Coupon
+from typing import Callable, Optional
+
+from .models import Cart, DiscountSummary, Coupon, Product
+from .promotions import PromotionPlan, compile_rules
+from .pricing_cache import PricingCache, cart_fingerprint
+
+# Reglas de descuento por defecto
+QUANTITY_GROUP_SIZE = 3
+QUANTITY_GROUP_DISCOUNT = 0.25
+CART_DISCOUNT_THRESHOLD = 100
+CART_DISCOUNT_RATE = 0.10
+
+DEFAULT_RULES = [
+    {
+        "id": "3x-tercera-25",
+        "type": "multibuy",
+        "group_size": QUANTITY_GROUP_SIZE,
+        "discount": QUANTITY_GROUP_DISCOUNT,
+    },
+    {
+        "id": "carrito-mas-de-100",
+        "type": "cart_threshold",
+        "tiers": [{"min_total": CART_DISCOUNT_THRESHOLD, "rate": CART_DISCOUNT_RATE}],
+    },
+]
+
+_active_plan: PromotionPlan = compile_rules(DEFAULT_RULES)
+
+# Resúmenes compartidos entre sesiones: muchos carritos son idénticos.
+PRICING_CACHE = PricingCache()
+
+def get_promotion_plan() -> PromotionPlan:
+    return _active_plan
+
+def set_promotion_plan(plan: PromotionPlan) -> None:
+    """
+    Cambia las promociones activas. Los carritos detectan el cambio por
+    plan.version y recalculan sus descuentos en el siguiente cálculo.
+    """
+    global _active_plan
+    _active_plan = plan
+
+def line_discount(product: Product, quantity: int) -> float:
+    """
+    Descuento de una línea según las promociones activas. Con las reglas por
+    defecto: por cada grupo de 3 uds del mismo producto, la tercera tiene
+    un 25% de descuento.
+    """
+    return _active_plan.line_discount(product, quantity)
 
 def calculate_line_discount(cart: Cart) -> float:
     """
-    Descuento por cantidades:
-    - Por cada grupo de 3 uds del mismo producto,
-    La tercera tiene un 25% de descuento.
+    Descuento por cantidades de todo el carrito (recorriendo las líneas).
+    calculate_totals usa el acumulado incremental del Cart, que es equivalente.
     """
-    total_discount = 0.0
-    for item in cart.items.values():
-        qty = item.quantity
-        price = item.product.price
-        group_of_three = floor(qty / 3)
-        total_discount += group_of_three * price * 0.25
-    return total_discount
+    return _active_plan.evaluate_lines(cart.items.values())[1]
 
 def calculate_cart_discount(subtotal_after_line_discount: float) -> float:
     """
-    Si el subtotal tras los descuentos por cantidad supera los 100€,
+    Descuento por total según las promociones activas. Con las reglas por
+    defecto: si el subtotal tras los descuentos por cantidad supera los 100€,
     se aplica un 10% de descuento adicional.
     """
-    if subtotal_after_line_discount > 100:
-        return subtotal_after_line_discount * 0.10
-    return 0.0
+    return _active_plan.cart_discount(subtotal_after_line_discount)
 
 def calculate_coupon_discount(total_after_cart_discount: float, coupon:  Coupon | None) -> float:
     """
@@ -39,15 +78,34 @@ def calculate_coupon_discount(total_after_cart_discount: float, coupon:  Coupon
     return 0.0
 
 def calculate_totals(cart: Cart) -> DiscountSummary:
-    # Subtotal sin descuentos
-    base_total = sum(item.product.price * item.quantity for item in cart.items.values())
+    plan = _active_plan
+
+    # Mientras el carrito, el cupón y las promociones no cambien, el resumen anterior sigue valiendo.
+    cached = cart.cached_totals(plan.version)
+    if cached is not None:
+        return cached
+
+    if cart.is_empty():
+        fingerprint = None
+    else:
+        fingerprint = cart_fingerprint(cart, plan.version)
+        shared = PRICING_CACHE.get(fingerprint)
+        if shared is not None:
+            cart.store_totals(plan.version, shared)
+            return shared
 
-    # Descuentos por cantidades
-    line_discount = calculate_line_discount(cart)
+    # Si las promociones cambiaron desde la última operación, el carrito recalcula sus líneas.
+    cart.sync_promotions(plan)
+
+    # Subtotal sin descuentos (mantenido por el Cart)
+    base_total = cart.base_total
+
+    # Descuentos por cantidades (mantenido por el Cart)
+    line_discount = cart.line_discount
     after_line = base_total - line_discount
 
     # Descuento por total del carrito
-    cart_discount = calculate_cart_discount(after_line)
+    cart_discount = plan.cart_discount(after_line)
     after_cart = after_line - cart_discount
 
     # Descuento por cupón
@@ -56,10 +114,33 @@ def calculate_totals(cart: Cart) -> DiscountSummary:
     # Total final (No puede ser negativo)
     final_total = max(after_cart - coupon_discount, 0.0)
 
-    return DiscountSummary(
+    summary = DiscountSummary(
         subtotal=base_total,
         line_discounts=line_discount,
         cart_discount=cart_discount,
         coupon_discount=coupon_discount,
         final_total=final_total,
-    )
\ No newline at end of file
+    )
+    cart.store_totals(plan.version, summary)
+    if fingerprint is not None:
+        PRICING_CACHE.put(fingerprint, summary)
+    return summary
+
+def render_cart_fragment(
+    cart: Cart,
+    view: str,
+    render: Callable[[Cart, Optional[DiscountSummary]], str],
+) -> str:
+    """
+    HTML de una vista del carrito ('chat', 'panel'...) generado con
+    `render(cart, resumen)`. Se reutiliza mientras no cambien la versión del
+    carrito, el cupón ni las promociones, así que un turno que no toca el
+    carrito no vuelve a renderizarlo.
+    """
+    plan = _active_plan
+    html = cart.cached_fragment(view, plan.version)
+    if html is None:
+        summary = calculate_totals(cart) if not cart.is_empty() else None
+        html = render(cart, summary)
+        cart.store_fragment(view, plan.version, html)
+    return html
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Hashable, Optional
+import threading
+
+from .models import Cart, DiscountSummary
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def cart_fingerprint(cart: Cart, rules_version: int) -> Hashable:
+    """
+    Clave del precio de un carrito: el resumen de sus líneas (id, precio,
+    categoría, cantidad) que el Cart mantiene al cambiar cada línea, el
+    número de líneas, la definición del cupón y la versión de las
+    promociones. Se construye en O(1), sin recorrer las líneas. Si cambia un
+    precio, una categoría (afecta a las promociones por categoría), un cupón
+    o las reglas, la clave es otra, así que una recarga nunca devuelve un
+    precio antiguo.
+    """
+    coupon = cart.applied_coupon
+    coupon_key = None if coupon is None else (coupon.code.upper(), coupon.type, coupon.value, coupon.min_total)
+    return cart.lines_digest, len(cart.items), coupon_key, rules_version
+
+
+class PricingCache:
+    """
+    LRU acotada de DiscountSummary compartida por todas las sesiones.
+    Los resúmenes son inmutables, así que se pueden devolver tal cual.
+    """
+
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, DiscountSummary]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: Hashable) -> Optional[DiscountSummary]:
+        with self._lock:
+            summary = self._entries.get(key)
+            if summary is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return summary
+
+    def put(self, key: Hashable, summary: DiscountSummary) -> None:
+        with self._lock:
+            self._entries[key] = summary
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions, len(self._entries), self.maxsize)
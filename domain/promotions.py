@@ -0,0 +1,177 @@
+"""
+Motor de promociones declarativas.
+
+Las promociones se definen como datos (data/promotions.json) y se compilan
+en un PromotionPlan que evalúa el carrito en una sola pasada por sus líneas:
+cada línea solo consulta las reglas que le aplican (globales, de su
+categoría o de su id), ya agrupadas al compilar.
+
+Tipos de regla:
+- "multibuy": por cada `group_size` uds, una tiene `discount` de descuento
+  (fracción). Opcionalmente limitada a `categories` y/o `product_ids`.
+- "percent": `rate` (fracción) de descuento sobre la línea, con los mismos filtros.
+- "cart_threshold": tramos [{"min_total": X, "rate": R}, ...]; se aplica el
+  mayor tramo cuyo mínimo se supera (estrictamente) con el subtotal tras
+  los descuentos de línea.
+
+En cada línea se aplica el mayor de los descuentos de línea, salvo las reglas
+con "stackable": true, que se suman. Reglas con "active": false se ignoran.
+
+Los cupones no son reglas del plan: se definen en data/coupons.json, cada
+carrito lleva como mucho uno y se aplica siempre después del plan, sobre el
+total tras el descuento por tramos (pricing.calculate_coupon_discount). Es
+decir, un cupón se acumula con todas las promociones, pero no con otro
+cupón; lo que se apila dentro del plan son las reglas de línea "stackable".
+Una definición de tipo "coupon" se rechaza para que no se ignore en silencio.
+"""
+from dataclasses import dataclass
+from itertools import count
+from math import floor, fsum
+from pathlib import Path
+from typing import Iterable, Optional
+import json
+
+from .models import CartItem, Product
+
+DATA_PATH = Path(__file__).resolve().parents[1] / "data" / "promotions.json"
+
+_plan_versions = count(1)
+
+
+class PromotionError(ValueError):
+    pass
+
+
+class LineRule:
+    __slots__ = ("rule_id", "kind", "group_size", "amount", "stackable")
+
+    def __init__(self, rule_id: str, kind: str, group_size: int, amount: float, stackable: bool):
+        self.rule_id = rule_id
+        self.kind = kind
+        self.group_size = group_size
+        self.amount = amount
+        self.stackable = stackable
+
+    def discount(self, price: float, quantity: int) -> float:
+        if self.kind == "multibuy":
+            return floor(quantity / self.group_size) * price * self.amount
+        return price * quantity * self.amount
+
+
+@dataclass(frozen=True)
+class ThresholdTier:
+    min_total: float
+    rate: float
+
+
+class PromotionPlan:
+    """
+    Reglas compiladas. `version` cambia con cada compilación, así que sirve
+    para invalidar cualquier resultado calculado con un plan anterior.
+    """
+
+    def __init__(self, definitions: list[dict]):
+        self.definitions = definitions
+        self.version = next(_plan_versions)
+        self._global: list[LineRule] = []
+        self._by_category: dict[str, list[LineRule]] = {}
+        self._by_product: dict[int, list[LineRule]] = {}
+        self._filtered: list[tuple[LineRule, Optional[set], Optional[set]]] = []
+        self._for_product: dict[tuple[Optional[int], Optional[str]], tuple[LineRule, ...]] = {}
+        tiers: list[ThresholdTier] = []
+
+        for definition in definitions:
+            if not definition.get("active", True):
+                continue
+            kind = definition.get("type")
+            rule_id = definition.get("id", kind)
+            if kind == "cart_threshold":
+                tiers.extend(ThresholdTier(t["min_total"], t["rate"]) for t in definition["tiers"])
+                continue
+            if kind == "multibuy":
+                rule = LineRule(rule_id, kind, int(definition["group_size"]), definition["discount"],
+                                definition.get("stackable", False))
+            elif kind == "percent":
+                rule = LineRule(rule_id, kind, 1, definition["rate"], definition.get("stackable", False))
+            elif kind == "coupon":
+                raise PromotionError(
+                    f"Los cupones se definen en data/coupons.json, no como promociones ({rule_id})"
+                )
+            else:
+                raise PromotionError(f"Tipo de promoción desconocido: {kind!r} ({rule_id})")
+
+            categories = definition.get("categories")
+            product_ids = definition.get("product_ids")
+            if categories and product_ids:
+                # Ambos filtros a la vez: se comprueban al resolver el producto.
+                self._filtered.append((rule, set(categories), set(product_ids)))
+            elif categories:
+                for category in categories:
+                    self._by_category.setdefault(category, []).append(rule)
+            elif product_ids:
+                for product_id in product_ids:
+                    self._by_product.setdefault(product_id, []).append(rule)
+            else:
+                self._global.append(rule)
+
+        # De mayor a menor mínimo: el primer tramo superado es el mejor.
+        self._tiers = sorted(tiers, key=lambda t: t.min_total, reverse=True)
+
+    @property
+    def tiers(self) -> tuple[ThresholdTier, ...]:
+        """Tramos del descuento por total, de mayor a menor mínimo."""
+        return tuple(self._tiers)
+
+    def rules_for(self, product: Product) -> tuple[LineRule, ...]:
+        return self.rules_for_key(product.id, product.category)
+
+    def rules_for_key(self, product_id: Optional[int], category: Optional[str]) -> tuple[LineRule, ...]:
+        key = (product_id, category)
+        rules = self._for_product.get(key)
+        if rules is None:
+            rules = tuple(
+                self._global
+                + self._by_category.get(category, [])
+                + self._by_product.get(product_id, [])
+                + [r for r, cats, ids in self._filtered if category in cats and product_id in ids]
+            )
+            self._for_product[key] = rules
+        return rules
+
+    def line_discount(self, product: Product, quantity: int) -> float:
+        best = 0.0
+        stacked = 0.0
+        for rule in self.rules_for(product):
+            amount = rule.discount(product.price, quantity)
+            if rule.stackable:
+                stacked += amount
+            elif amount > best:
+                best = amount
+        if stacked:
+            return min(best + stacked, product.price * quantity)
+        return best
+
+    def cart_discount(self, subtotal_after_line_discount: float) -> float:
+        for tier in self._tiers:
+            if subtotal_after_line_discount > tier.min_total:
+                return subtotal_after_line_discount * tier.rate
+        return 0.0
+
+    def evaluate_lines(self, items: Iterable[CartItem]) -> tuple[float, float]:
+        """Una pasada por las líneas: (subtotal, descuento por líneas)."""
+        bases = []
+        discounts = []
+        for item in items:
+            bases.append(item.product.price * item.quantity)
+            discounts.append(self.line_discount(item.product, item.quantity))
+        # fsum: el resultado no depende del orden de las líneas.
+        return fsum(bases), fsum(discounts)
+
+
+def compile_rules(definitions: Iterable[dict]) -> PromotionPlan:
+    return PromotionPlan(list(definitions))
+
+
+def load_promotions(path: Path = DATA_PATH) -> PromotionPlan:
+    with open(path, "r", encoding="utf-8") as file:
+        return compile_rules(json.load(file))
@@ -0,0 +1,282 @@
+from array import array
+from copy import copy
+from dataclasses import dataclass
+from typing import Iterable, Sequence
+import heapq
+import math
+import re
+
+from .models import Product
+from .text import normalize
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Una palabra del catálogo aparece en el texto si este contiene al menos esta
+# fracción de sus trigramas: evita coincidencias por trigramas sueltos.
+MIN_WORD_COVERAGE = 0.75
+MIN_SCORE = 0.3
+
+# Peso (beta de la media F) de la parte del texto que explica el producto
+# frente a la parte del nombre que aparece en el texto.
+TEXT_COVERAGE_WEIGHT = 2.0
+
+# Palabras reconocidas en un mismo texto que se tienen en cuenta (las más raras).
+MAX_QUERY_WORDS = 10
+
+# Las palabras presentes en más de esta fracción del catálogo guardan además
+# un mapa de bits de sus productos (que no ocupa más que su lista) para
+# intersecarlas sin recorrerlas.
+BITMAP_RATIO = 1 / 32
+
+_NONZERO_BYTE = re.compile(rb"[^\x00]")
+_BYTE_BITS = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
+
+
+@dataclass
+class ProductMatch:
+    product: Product
+    score: float
+
+
+def word_trigrams(word: str) -> frozenset[str]:
+    padded = f"${word}$"
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def text_trigrams(text: str) -> set[str]:
+    grams: set[str] = set()
+    for word in WORD_RE.findall(normalize(text)):
+        grams.update(word_trigrams(word))
+    return grams
+
+
+def _combine(name_coverage: float, text_coverage: float) -> float:
+    if not name_coverage or not text_coverage:
+        return 0.0
+    beta2 = TEXT_COVERAGE_WEIGHT ** 2
+    return (1 + beta2) * name_coverage * text_coverage / (beta2 * name_coverage + text_coverage)
+
+
+def _bit_positions(bitmap: int) -> list[int]:
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    positions: list[int] = []
+    for match in _NONZERO_BYTE.finditer(data):
+        start = match.start()
+        positions.extend(start * 8 + bit for bit in _BYTE_BITS[data[start]])
+    return positions
+
+
+class ProductMatcher:
+    """
+    Índice de trigramas sobre las palabras distintas de los nombres
+    normalizados. Una palabra del catálogo aparece en el texto si este
+    contiene al menos MIN_WORD_COVERAGE de sus trigramas, así que se toleran
+    plurales y erratas ('camisetas azules' -> 'Camiseta azul'). Cada palabra
+    se indexa solo por sus trigramas más raros, los justos para que comparta
+    al menos uno con cualquier texto en el que aparezca: las búsquedas nunca
+    recorren las listas de los trigramas comunes.
+
+    La puntuación combina qué parte del nombre aparece en el texto y qué
+    parte de lo reconocido en el texto (ponderado por la rareza de cada
+    trigrama) explica el producto, con más peso para lo segundo: un código
+    de modelo exacto gana a un nombre corto que solo coincide en parte.
+    """
+
+    def __init__(self, products: Iterable[Product]):
+        # Las secuencias (listas o vistas de un catálogo compacto) no se copian.
+        self.products: Sequence[Product] = products if isinstance(products, Sequence) else list(products)
+        vocabulary: dict[str, int] = {}
+        self._word_grams: list[frozenset[str]] = []
+        postings: list[list[int]] = []
+        # Palabras de cada producto, en plano: las de `p` están en
+        # _name_words[_name_start[p]:_name_start[p + 1]].
+        self._name_words = array("I")
+        self._name_start = array("I", [0])
+        # Número de trigramas distintos del nombre de cada producto.
+        self._lengths = array("I")
+
+        for position, product in enumerate(self.products):
+            words: list[int] = []
+            for word in WORD_RE.findall(normalize(product.name)):
+                word_id = vocabulary.get(word)
+                if word_id is None:
+                    word_id = vocabulary[word] = len(self._word_grams)
+                    self._word_grams.append(word_trigrams(word))
+                    postings.append([])
+                if word_id not in words:
+                    words.append(word_id)
+                    postings[word_id].append(position)
+            self._name_words.extend(words)
+            self._name_start.append(len(self._name_words))
+            if len(words) == 1:
+                self._lengths.append(len(self._word_grams[words[0]]))
+            else:
+                self._lengths.append(len(frozenset().union(*(self._word_grams[w] for w in words))))
+
+        # Productos que contienen cada trigrama (cota superior: suma por palabra).
+        frequency: dict[str, int] = {}
+        for grams, positions in zip(self._word_grams, postings):
+            for gram in grams:
+                frequency[gram] = frequency.get(gram, 0) + len(positions)
+        total = max(len(self.products), 1)
+        self._idf = {gram: math.log(1 + total / count) for gram, count in frequency.items()}
+
+        # Cada lista de productos va de nombre más corto a más largo, para
+        # poder cortarla en cuanto la puntuación máxima posible no alcance.
+        lengths = self._lengths
+        self._postings = [array("I", sorted(positions, key=lengths.__getitem__)) for positions in postings]
+        self._bitmaps: dict[int, int] = {}
+        for word_id, positions in enumerate(postings):
+            if len(positions) > BITMAP_RATIO * total:
+                bitmap = bytearray(total // 8 + 1)
+                for position in positions:
+                    bitmap[position >> 3] |= 1 << (position & 7)
+                self._bitmaps[word_id] = int.from_bytes(bitmap, "little")
+
+        # Una palabra de n trigramas aparece si el texto contiene al menos
+        # `needed` de ellos, así que alguno de sus n - needed + 1 más raros
+        # tiene que estar en el texto: basta con indexarla por esos.
+        self._prefixes: dict[str, list[int]] = {}
+        for word_id, grams in enumerate(self._word_grams):
+            needed = math.ceil(MIN_WORD_COVERAGE * len(grams))
+            for gram in sorted(grams, key=lambda g: (frequency[g], g))[: len(grams) - needed + 1]:
+                self._prefixes.setdefault(gram, []).append(word_id)
+
+    def rebind(self, products: Sequence[Product]) -> "ProductMatcher":
+        """
+        Copia del índice que devuelve los productos de `products`; solo es
+        válida si tienen los mismos nombres y en las mismas posiciones.
+        """
+        matcher = copy(self)
+        matcher.products = products
+        return matcher
+
+    def _matched_words(self, grams: set[str]) -> dict[int, frozenset[str]]:
+        """Palabras del catálogo que aparecen en el texto, con sus trigramas presentes."""
+        matched: dict[int, frozenset[str]] = {}
+        for gram in grams:
+            for word_id in self._prefixes.get(gram, ()):
+                if word_id in matched:
+                    continue
+                word_grams = self._word_grams[word_id]
+                present = word_grams & grams
+                if len(present) >= MIN_WORD_COVERAGE * len(word_grams):
+                    matched[word_id] = present
+        return matched
+
+    def _word_mask(self, position: int, bits: dict[int, int]) -> int:
+        mask = 0
+        for word_id in self._name_words[self._name_start[position]:self._name_start[position + 1]]:
+            bit = bits.get(word_id)
+            if bit is not None:
+                mask |= bit
+        return mask
+
+    def _bitmap(self, word_id: int, temporary: dict[int, int]) -> int:
+        bitmap = self._bitmaps.get(word_id)
+        if bitmap is None:
+            bitmap = temporary.get(word_id)
+        if bitmap is None:
+            # Las palabras poco comunes no lo guardan: se construye para esta búsqueda.
+            data = bytearray(len(self.products) // 8 + 1)
+            for position in self._postings[word_id]:
+                data[position >> 3] |= 1 << (position & 7)
+            bitmap = temporary[word_id] = int.from_bytes(data, "little")
+        return bitmap
+
+    def search(self, text: str, limit: int = 5) -> list[ProductMatch]:
+        """
+        Devuelve hasta `limit` productos ordenados por puntuación (0..1),
+        con empate resuelto por orden de catálogo.
+
+        La puntuación de un producto solo depende de qué palabras del texto
+        contiene y de la longitud de su nombre. Se prueban los grupos de
+        palabras de mayor a menor puntuación posible, recorriendo en cada uno
+        la lista de su palabra más rara del nombre más corto al más largo, y
+        se para en cuanto ni el grupo ni el nombre pueden superar al peor de
+        los `limit` mejores: el resultado es exacto sin puntuar todos los
+        productos que contienen una palabra común.
+        """
+        grams = text_trigrams(text)
+        matched = self._matched_words(grams) if grams and limit > 0 else {}
+        if not matched:
+            return []
+
+        # De la palabra más rara a la más común; con más de MAX_QUERY_WORDS
+        # palabras reconocidas se ignoran las más comunes.
+        order = sorted(matched, key=lambda w: (len(self._postings[w]), w))[:MAX_QUERY_WORDS]
+        bits = {word_id: 1 << i for i, word_id in enumerate(order)}
+        groups: dict[int, tuple[int, float]] = {}
+        for mask in range(1, 1 << len(order)):
+            present = frozenset().union(*(matched[w] for w in order if bits[w] & mask))
+            groups[mask] = (len(present), math.fsum(self._idf[g] for g in present))
+        total = groups[(1 << len(order)) - 1][1]
+        shortest = min(self._lengths[self._postings[w][0]] for w in order)
+
+        def bound(mask: int, length: int) -> float:
+            size, weight = groups[mask]
+            return _combine(min(1.0, size / length), weight / total)
+
+        best: list[tuple[float, int]] = []  # (puntuación, -posición): el peor arriba
+        seen: set[int] = set()
+        temporary: dict[int, int] = {}
+        for mask in sorted(groups, key=lambda m: -bound(m, shortest)):
+            floor = best[0][0] if len(best) == limit else MIN_SCORE
+            if bound(mask, shortest) < floor:
+                break
+            # Se recorre la lista de la palabra más rara del grupo. Los productos
+            # con más palabras que el grupo ya se han visto con su propio grupo
+            # (o no llegan), así que aquí la cota es exacta y el recorrido se
+            # corta en cuanto el grupo tiene `limit` productos más cortos.
+            words = [w for w in order if bits[w] & mask]
+            candidates: Sequence[int] = self._postings[words[0]]
+            required = None
+            others = [self._bitmaps[w] for w in words[1:] if w in self._bitmaps]
+            if others:
+                # Con palabras comunes en el grupo, sus mapas de bits dicen
+                # cuántos productos las tienen todas: si son pocos sale más
+                # barato sacarlos de la intersección que recorrer la lista.
+                common = self._bitmap(words[0], temporary)
+                for bitmap in others:
+                    common &= bitmap
+                if not common:
+                    continue
+                if common.bit_count() * 16 < len(candidates):
+                    candidates = sorted(_bit_positions(common), key=self._lengths.__getitem__)
+                else:
+                    for bitmap in others[1:]:
+                        others[0] &= bitmap
+                    required = others[0].to_bytes(len(self.products) // 8 + 1, "little")
+
+            size = groups[mask][0]
+            checked = (0, 0.0)
+            for position in candidates:
+                length = self._lengths[position]
+                if (length, floor) != checked:
+                    ceiling = bound(mask, length)
+                    if ceiling < floor:
+                        break
+                    checked = (length, floor)
+                # En el empate solo entran posiciones anteriores, y a igual
+                # longitud las listas van en orden de catálogo.
+                if ceiling == floor and length >= size and len(best) == limit and position > -best[0][1]:
+                    break
+                if position in seen:
+                    continue
+                if required is not None and not required[position >> 3] & 1 << (position & 7):
+                    continue
+                found = self._word_mask(position, bits)
+                if found & mask != mask:
+                    continue
+                seen.add(position)
+                score = bound(found, length)
+                if score < floor:
+                    continue
+                if len(best) < limit:
+                    heapq.heappush(best, (score, -position))
+                elif (score, -position) > best[0]:
+                    heapq.heapreplace(best, (score, -position))
+                floor = best[0][0] if len(best) == limit else MIN_SCORE
+
+        best.sort(key=lambda item: (-item[0], -item[1]))
+        return [ProductMatch(self.products[-neg], round(score, 4)) for score, neg in best]
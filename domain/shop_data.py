@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+import logging
+import threading
+
+from .catalog import CatalogIndex, DATA_PATH as CATALOG_PATH, load_catalog, read_products
+from .coupons import DATA_PATH as COUPONS_PATH, CouponRegistry, RedemptionCounters, load_coupon_registry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ShopData:
+    """
+    Datos compartidos por todas las sesiones. Es inmutable: una recarga crea
+    un ShopData nuevo con version + 1 y lo publica de una sola asignación.
+    """
+    version: int
+    catalog: CatalogIndex
+    coupons: CouponRegistry
+
+
+class ShopDataManager:
+    """
+    Mantiene el ShopData vigente y lo recarga en segundo plano.
+
+    - `current` siempre devuelve un ShopData completo (el viejo o el nuevo,
+      nunca uno a medias), así que las peticiones no esperan a la recarga.
+    - Si el catálogo es un CatalogIndex normal, la recarga solo crea objetos
+      para los productos que han cambiado (ver CatalogIndex.updated).
+    """
+
+    def __init__(
+        self,
+        catalog_path: Path = CATALOG_PATH,
+        coupons_path: Path = COUPONS_PATH,
+        catalog_loader: Callable[[], CatalogIndex] = load_catalog,
+        coupons_loader: Callable[[Optional[RedemptionCounters]], CouponRegistry] = load_coupon_registry,
+    ):
+        self.catalog_path = Path(catalog_path)
+        self.coupons_path = Path(coupons_path)
+        self._catalog_loader = catalog_loader
+        self._coupons_loader = coupons_loader
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._mtimes = self._read_mtimes()
+        self._current = ShopData(version=1, catalog=catalog_loader(), coupons=coupons_loader(None))
+
+    @property
+    def current(self) -> ShopData:
+        return self._current
+
+    def _read_mtimes(self) -> tuple[float, float]:
+        return self.catalog_path.stat().st_mtime, self.coupons_path.stat().st_mtime
+
+    def _reload_catalog(self, catalog: CatalogIndex) -> CatalogIndex:
+        if type(catalog) is CatalogIndex:
+            return catalog.updated(read_products(self.catalog_path))
+        return self._catalog_loader()
+
+    def reload(self) -> ShopData:
+        """
+        Recarga catálogo y cupones. Si no ha cambiado nada se mantiene la
+        versión actual. Las recargas concurrentes se serializan.
+        """
+        with self._reload_lock:
+            mtimes = self._read_mtimes()
+            current = self._current
+            catalog = self._reload_catalog(current.catalog)
+            # Los contadores de canjes pasan al registro nuevo.
+            coupons = self._coupons_loader(current.coupons.counters)
+            # Solo se anotan las fechas si la carga ha ido bien: si falla, el watcher reintenta.
+            self._mtimes = mtimes
+            if catalog is current.catalog and coupons.same_definitions(current.coupons):
+                return current
+            self._current = ShopData(current.version + 1, catalog, coupons)
+            return self._current
+
+    def reload_in_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.reload, name="shop-data-reload", daemon=True)
+        thread.start()
+        return thread
+
+    def watch(self, interval: float = 2.0) -> None:
+        """
+        Arranca un hilo que comprueba la fecha de modificación de los JSON
+        cada `interval` segundos y recarga cuando cambian.
+        """
+        if self._watcher is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    if self._read_mtimes() != self._mtimes:
+                        self.reload()
+                except Exception:
+                    # Fichero a medio escribir, JSON inválido o registro incompleto:
+                    # se mantienen los datos actuales y se reintenta en la siguiente vuelta.
+                    logger.exception("No se han podido recargar los datos de la tienda")
+                    continue
+
+        self._watcher = threading.Thread(target=loop, name="shop-data-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
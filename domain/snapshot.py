@@ -0,0 +1,177 @@
+"""
+Snapshot binario del catálogo.
+
+`build_snapshot` compila products.json en un fichero versionado con:
+- cabecera fija,
+- registros de ancho fijo (id, precio y referencias a cadenas),
+- índice de ids ordenados (id, fila),
+- heap de cadenas UTF-8 (cada cadena distinta aparece una sola vez).
+
+`SnapshotCatalog` lo abre con mmap y decodifica cada registro solo al
+acceder a él, así que el arranque no depende del tamaño del catálogo y
+varios procesos comparten las mismas páginas.
+
+Uso:
+    python -m domain.snapshot [products.json] [salida]
+"""
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Sequence
+import json
+import mmap
+import struct
+import sys
+
+from .compact_catalog import CompactCatalog
+from .models import Product
+
+SNAPSHOT_PATH = Path(__file__).resolve().parents[1] / "data" / "products.snapshot"
+
+MAGIC = b"CATSNAP\x00"
+SNAPSHOT_VERSION = 1
+
+# magic, versión, nº registros, offset registros, offset índice, offset heap
+HEADER = struct.Struct("<8sIIQQQ")
+# id, precio y (offset, longitud) de nombre, descripción, categoría e imagen
+RECORD = struct.Struct("<qdIIIIIIII")
+INDEX_ENTRY = struct.Struct("<qq")
+
+NONE_LENGTH = 0xFFFFFFFF
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def build_snapshot(products: Iterable[Product], path: Path = SNAPSHOT_PATH) -> None:
+    products = list(products)
+    heap = bytearray()
+    refs: dict[str, tuple[int, int]] = {}
+
+    def ref(value: Optional[str]) -> tuple[int, int]:
+        if value is None:
+            return 0, NONE_LENGTH
+        if value not in refs:
+            data = value.encode("utf-8")
+            refs[value] = (len(heap), len(data))
+            heap.extend(data)
+        return refs[value]
+
+    records = bytearray()
+    for p in products:
+        records += RECORD.pack(
+            p.id, p.price,
+            *ref(p.name), *ref(p.description), *ref(p.category), *ref(p.image),
+        )
+
+    # Orden estable: ante ids repetidos gana la primera fila, como en CatalogIndex.
+    order = sorted(range(len(products)), key=lambda row: products[row].id)
+    index = bytearray()
+    for row in order:
+        index += INDEX_ENTRY.pack(products[row].id, row)
+
+    records_offset = _align(HEADER.size)
+    index_offset = _align(records_offset + len(records))
+    heap_offset = _align(index_offset + len(index))
+
+    tmp_path = Path(path).with_suffix(".tmp")
+    with open(tmp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, SNAPSHOT_VERSION, len(products), records_offset, index_offset, heap_offset))
+        for offset, block in ((records_offset, records), (index_offset, index), (heap_offset, heap)):
+            file.write(b"\x00" * (offset - file.tell()))
+            file.write(block)
+    # Reemplazo atómico: un proceso que ya tenga el fichero mapeado no ve escrituras a medias.
+    tmp_path.replace(path)
+
+
+class SnapshotProducts(Sequence[Product]):
+    """
+    Secuencia de Product respaldada por un snapshot mapeado en memoria.
+    """
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as file:
+            self._mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mm) < HEADER.size:
+            raise ValueError(f"{path} no es un snapshot de catálogo.")
+        magic, version, count, records, index, heap = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} no es un snapshot de catálogo.")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"Versión de snapshot {version} no soportada (se esperaba {SNAPSHOT_VERSION})."
+            )
+
+        self._count = count
+        self._records = records
+        self._heap = heap
+        entries = memoryview(self._mm)[index:index + count * INDEX_ENTRY.size].cast("q")
+        self.sorted_ids = entries[0::2]
+        self.sorted_rows = entries[1::2]
+
+    def _string(self, offset: int, length: int) -> Optional[str]:
+        if length == NONE_LENGTH:
+            return None
+        start = self._heap + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, position: int) -> Product:
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError(position)
+        (pid, price, name_off, name_len, desc_off, desc_len,
+         cat_off, cat_len, img_off, img_len) = RECORD.unpack_from(
+            self._mm, self._records + position * RECORD.size
+        )
+        return Product(
+            id=pid,
+            name=self._string(name_off, name_len),
+            price=price,
+            category=self._string(cat_off, cat_len),
+            description=self._string(desc_off, desc_len),
+            image=self._string(img_off, img_len),
+        )
+
+    def __iter__(self) -> Iterator[Product]:
+        for position in range(self._count):
+            yield self[position]
+
+
+class SnapshotCatalog(CompactCatalog):
+    """
+    Catálogo sobre un snapshot mapeado: reutiliza la búsqueda por id de
+    CompactCatalog leyendo el índice ordenado directamente del fichero.
+    """
+
+    def __init__(self, path: Path = SNAPSHOT_PATH):
+        super().__init__(path)
+
+    def _store(self, path: Path) -> Sequence[Product]:
+        return SnapshotProducts(path)
+
+    def _build_id_index(self) -> None:
+        self._sorted_ids = self.products.sorted_ids
+        self._sorted_rows = self.products.sorted_rows
+
+
+def snapshot_is_fresh(json_path: Path, path: Path = SNAPSHOT_PATH) -> bool:
+    return path.exists() and path.stat().st_mtime >= json_path.stat().st_mtime
+
+
+def main(argv: list[str]) -> None:
+    from .catalog import DATA_PATH
+
+    json_path = Path(argv[0]) if argv else DATA_PATH
+    out_path = Path(argv[1]) if len(argv) > 1 else SNAPSHOT_PATH
+    with open(json_path, "r", encoding="utf-8") as file:
+        products = [Product(**item) for item in json.load(file)]
+    build_snapshot(products, out_path)
+    print(f"Snapshot v{SNAPSHOT_VERSION} con {len(products)} productos en {out_path}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
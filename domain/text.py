@@ -0,0 +1,9 @@
+import unicodedata
+
+
+def normalize(text: str) -> str:
+    """Minúsculas + quitar acentos para facilitar matching."""
+    text = text.lower().strip()
+    text = unicodedata.normalize("NFD", text)
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return text
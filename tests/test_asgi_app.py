@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("quart")
+
+from app.asgi_app import app
+
+def test_chat_turn_and_cart_partial():
+    async def scenario():
+        client = app.test_client()
+        response = await client.post("/api/chat", form={"message": "añade 2 del 402"})
+        body = await response.get_json()
+        page = await client.get("/")
+        return body, page.status_code
+
+    body, status = asyncio.run(scenario())
+    assert body["ok"]
+    assert body["total_units"] == 2
+    assert "Gorra negra" in body["cart_html"]
+    assert status == 200
+
+def test_concurrent_sessions_do_not_block_each_other():
+    async def scenario():
+        responses = await asyncio.gather(
+            *(app.test_client().post("/api/chat", form={"message": "ayuda"}) for _ in range(20))
+        )
+        return [await r.get_json() for r in responses]
+
+    bodies = asyncio.run(scenario())
+    assert all(b["ok"] for b in bodies)
+
+def test_error_replies_are_saved_with_the_session(tmp_path, monkeypatch):
+    from app import sessions
+    from app.checkpoint import SessionCheckpointer
+    from app.session_store import SQLiteSessionStore
+
+    path = tmp_path / "sessions.db"
+    monkeypatch.setattr(sessions, "_store", SQLiteSessionStore(path))
+
+    async def scenario():
+        client = app.test_client()
+        await client.post("/cart/add/999", form={"quantity": "1"})
+        await client.post("/", form={"message": ""})
+
+    asyncio.run(scenario())
+    checkpointer = SessionCheckpointer(path)
+    (sid,), = checkpointer._conn.execute("SELECT sid FROM sessions").fetchall()
+    texts = [text for _, text in checkpointer.load(sid).chat_history]
+    assert "No encuentro ese producto en el catálogo." in texts
+    assert texts[-1].startswith("No he recibido ningun mensaje")
+
+def test_conflicting_save_answers_409(tmp_path, monkeypatch):
+    from app import sessions
+    from app.session_store import SQLiteSessionStore
+
+    store = SQLiteSessionStore(tmp_path / "sessions.db")
+    monkeypatch.setattr(sessions, "_store", store)
+    load = sessions.load_session_state
+
+    def load_then_someone_else_saves(sid, data):
+        state = load(sid, data)
+        other = SQLiteSessionStore(tmp_path / "sessions.db")
+        other.get(sid, data)
+        other.put(sid, sessions.new_session_state(data))
+        return state
+
+    async def scenario():
+        client = app.test_client()
+        await client.post("/", form={"message": ""})
+        monkeypatch.setattr("app.asgi_app.load_session_state", load_then_someone_else_saves)
+        response = await client.post("/api/chat", form={"message": "ayuda"})
+        return response.status_code, await response.get_json()
+
+    status, body = asyncio.run(scenario())
+    assert status == 409
+    assert not body["ok"]
@@ -0,0 +1,88 @@
+import random
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from domain.batch_pricing import CartBatch, PricingParams, compare_scenarios, with_cart_threshold
+from domain.models import Cart, Coupon, Product
+from domain.pricing import calculate_totals, get_promotion_plan, set_promotion_plan
+from domain.promotions import compile_rules
+
+COUPONS = [
+    Coupon(code="VIP20", type="percent", value=20, min_total=100),
+    Coupon(code="SUPER5", type="fixed", value=5, min_total=0),
+    Coupon(code="BIENVENIDA10", type="percent", value=10, min_total=0),
+]
+
+def random_carts(n, seed=7):
+    rng = random.Random(seed)
+    products = [
+        Product(id=i, name=f"P{i}", price=round(rng.uniform(1, 90), 2), category=rng.choice(["Ropa", "Calzado", None]))
+        for i in range(30)
+    ]
+    carts = []
+    for _ in range(n):
+        cart = Cart()
+        for product in rng.sample(products, rng.randint(0, 5)):
+            cart.add_item(product, rng.randint(1, 7))
+        cart.applied_coupon = rng.choice(COUPONS + [None])
+        carts.append(cart)
+    return carts
+
+@pytest.fixture
+def restore_plan():
+    previous = get_promotion_plan()
+    yield
+    set_promotion_plan(previous)
+
+def assert_matches_scalar_pricing(carts):
+    totals = CartBatch.from_carts(carts).price()
+    for i, cart in enumerate(carts):
+        summary = calculate_totals(cart)
+        assert totals.subtotal[i] == summary.subtotal
+        assert totals.line_discounts[i] == summary.line_discounts
+        assert totals.cart_discount[i] == summary.cart_discount
+        assert totals.coupon_discount[i] == summary.coupon_discount
+        assert totals.final_total[i] == summary.final_total
+
+def test_batch_matches_scalar_pricing_exactly():
+    assert_matches_scalar_pricing(random_carts(500))
+
+def test_batch_prices_with_the_active_plan(restore_plan):
+    set_promotion_plan(compile_rules([
+        {"type": "multibuy", "group_size": 3, "discount": 0.25},
+        {"type": "multibuy", "group_size": 2, "discount": 0.5, "categories": ["Calzado"]},
+        {"type": "percent", "rate": 0.15, "product_ids": [1, 2, 3], "stackable": True},
+        {"type": "percent", "rate": 0.05, "categories": ["Ropa"], "product_ids": [4, 5], "stackable": True},
+        {"type": "cart_threshold", "tiers": [{"min_total": 60, "rate": 0.05}, {"min_total": 150, "rate": 0.12}]},
+    ]))
+    assert_matches_scalar_pricing(random_carts(500, seed=3))
+
+def test_cart_threshold_scenario_keeps_the_other_rules():
+    plan = with_cart_threshold(get_promotion_plan(), 80)
+    assert [(t.min_total, t.rate) for t in plan.tiers] == [(80, 0.1)]
+    assert len(plan.definitions) == len(get_promotion_plan().definitions)
+
+def test_lower_threshold_scenario_gives_more_cart_discount():
+    batch = CartBatch.from_carts(random_carts(300))
+    results = compare_scenarios(batch, {"80": PricingParams(plan=with_cart_threshold(get_promotion_plan(), 80))})
+    result, delta = results["80"]
+    base = batch.simulate()
+    assert result.carts_with_cart_discount >= base.carts_with_cart_discount
+    assert delta <= 0
+
+def test_coupon_value_override():
+    cart = Cart()
+    cart.add_item(Product(id=1, name="A", price=50.0), 1)
+    cart.applied_coupon = COUPONS[2]
+    batch = CartBatch.from_carts([cart])
+    assert batch.simulate().coupon_discount == 5.0
+    assert batch.simulate(PricingParams(coupon_values={"bienvenida10": 20})).coupon_discount == 10.0
+
+def test_from_jsonl_skips_unknown_coupons():
+    lines = [
+        '{"lines": [{"price": 10.0, "quantity": 3}], "coupon": "super5"}',
+        '{"lines": [{"price": 20.0, "quantity": 1}], "coupon": "NOPE"}',
+    ]
+    totals = CartBatch.from_jsonl(lines, COUPONS).price()
+    assert list(totals.coupon_discount) == [5.0, 0.0]
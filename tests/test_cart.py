@@ -47,4 +47,22 @@ def test_clear_empties_cart_and_removes_coupon(camiseta_azul):
     cart.applied_coupon = Coupon(code="VIP20", type="percent", value=20, min_total=0)
     cart.clear()
     assert cart.is_empty()
-    assert cart.applied_coupon is None
\ No newline at end of file
+    assert cart.applied_coupon is None
+
+def test_version_changes_on_every_mutation(camiseta_azul, gorra_negra):
+    cart = Cart()
+    versions = [cart.version]
+    cart.add_item(camiseta_azul, 1)
+    versions.append(cart.version)
+    cart.set_quantity(camiseta_azul.id, 3)
+    versions.append(cart.version)
+    cart.remove_item(camiseta_azul.id)
+    versions.append(cart.version)
+    assert versions == sorted(set(versions))
+    assert cart.base_total == 0.0
+
+def test_rebind_product_updates_totals(camiseta_azul):
+    cart = Cart()
+    cart.add_item(camiseta_azul, 2)
+    cart.rebind_product(Product(id=101, name="Camiseta Azul", price=10.0))
+    assert cart.base_total == 20.0
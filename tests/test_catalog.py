@@ -0,0 +1,35 @@
+from domain.models import Product
+from domain.catalog import CatalogIndex, load_catalog, find_product_by_id, find_product_by_name
+
+def make_index():
+    return CatalogIndex([
+        Product(id=101, name="Camiseta azul", price=15.99),
+        Product(id=102, name="Camiseta roja", price=15.99),
+        Product(id=402, name="Gorra negra", price=9.99),
+    ])
+
+def test_index_lookup_by_id():
+    index = make_index()
+    assert index.get(402).name == "Gorra negra"
+    assert index.get(999) is None
+
+def test_index_lookup_by_name_inside_message():
+    index = make_index()
+    assert index.find_by_name("añade una camiseta roja").id == 102
+    assert index.find_by_name("quiero una gorra negra").id == 402
+    assert index.find_by_name("unas botas") is None
+
+def test_index_keeps_catalog_order_and_len():
+    index = make_index()
+    assert [p.id for p in index] == [101, 102, 402]
+    assert len(index) == 3
+
+def test_find_functions_accept_plain_lists():
+    products = list(make_index())
+    assert find_product_by_id(products, 101).name == "Camiseta azul"
+    assert find_product_by_name(products, "camiseta azul").id == 101
+
+def test_load_catalog_returns_index():
+    catalog = load_catalog()
+    assert isinstance(catalog, CatalogIndex)
+    assert catalog.get(101) is not None
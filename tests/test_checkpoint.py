@@ -0,0 +1,155 @@
+import pytest
+
+from app import sessions
+from app.checkpoint import SessionCheckpointer, SessionConflict
+from app.session_store import MemorySessionStore
+from domain.catalog import CatalogIndex
+from domain.coupons import CouponRegistry
+from domain.models import Coupon, Product
+from domain.shop_data import ShopData
+
+
+def make_data(version=1):
+    return ShopData(
+        version=version,
+        catalog=CatalogIndex([
+            Product(id=101, name="Camiseta azul", price=15.99, category="Ropa"),
+            Product(id=402, name="Gorra negra", price=9.99, category="Accesorios"),
+        ]),
+        coupons=CouponRegistry([Coupon(code="VIP20", type="percent", value=20.0, min_total=0.0)]),
+    )
+
+
+@pytest.fixture
+def checkpointer(tmp_path, monkeypatch):
+    checkpointer = SessionCheckpointer(tmp_path / "sessions.db")
+    monkeypatch.setattr(sessions, "_checkpointer", checkpointer)
+    monkeypatch.setattr(sessions, "_store", MemorySessionStore())
+    yield checkpointer
+    checkpointer.close()
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "sessions.db"
+    checkpointer = SessionCheckpointer(path)
+    history = [("bot", "Hola"), ("user", "añade 2 camisetas")]
+    checkpointer.save("s1", {"mode": "catalog", "shipping_city": None}, {101: 2, 402: 1}, history)
+    checkpointer.close()
+
+    snapshot = SessionCheckpointer(path).load("s1")
+
+    assert snapshot.fields == {"mode": "catalog", "shipping_city": None}
+    assert snapshot.cart_lines == {101: 2, 402: 1}
+    assert snapshot.chat_history == history
+
+
+def test_unknown_session_is_none(tmp_path):
+    assert SessionCheckpointer(tmp_path / "sessions.db").load("nadie") is None
+
+
+def test_save_only_writes_changes(tmp_path):
+    checkpointer = SessionCheckpointer(tmp_path / "sessions.db")
+    history = [("bot", "Hola")]
+    checkpointer.save("s1", {"mode": "catalog"}, {101: 1}, history)
+    assert checkpointer.writes == 3
+
+    history.append(("user", "más"))
+    checkpointer.save("s1", {"mode": "catalog"}, {101: 1, 402: 2}, history)
+    assert checkpointer.writes == 3 + 3  # una línea de carrito, un mensaje y updated_at
+
+    checkpointer.save("s1", {"mode": "catalog"}, {101: 1, 402: 2}, history)
+    assert checkpointer.writes == 6
+
+    checkpointer.save("s1", {"mode": "checkout"}, {402: 2}, history)
+    assert checkpointer.writes == 6 + 2  # campos y borrado de la línea 101
+    assert checkpointer.load("s1").cart_lines == {402: 2}
+
+
+def test_shorter_history_is_rewritten(tmp_path):
+    checkpointer = SessionCheckpointer(tmp_path / "sessions.db")
+    checkpointer.save("s1", {}, {}, [("bot", "a"), ("user", "b"), ("bot", "c")])
+    checkpointer.save("s1", {}, {}, [("bot", "c")])
+
+    assert checkpointer.load("s1").chat_history == [("bot", "c")]
+
+
+def test_session_survives_restart(checkpointer, monkeypatch):
+    data = make_data()
+    state = sessions.load_session_state("s1", data)
+    state["cart"].add_item(data.catalog.get(101), 2)
+    state["cart"].applied_coupon = data.coupons.get("VIP20")
+    state["mode"] = "checkout"
+    state["chat_history"].append(("user", "quiero pagar"))
+    state["bot_message"] = "¿A nombre de quién?"
+    sessions.finish_turn("s1", state)
+
+    # "Reinicio": memoria vacía y catálogo recargado.
+    monkeypatch.setattr(sessions, "_store", MemorySessionStore())
+    reloaded = make_data(version=2)
+    restored = sessions.load_session_state("s1", reloaded)
+
+    assert restored["mode"] == "checkout"
+    assert restored["cart"].items[101].quantity == 2
+    assert restored["cart"].items[101].product is reloaded.catalog.get(101)
+    assert restored["cart"].applied_coupon is reloaded.coupons.get("VIP20")
+    assert list(restored["chat_history"]) == list(state["chat_history"])
+    assert restored["data_version"] == 2
+
+
+def test_restore_skips_removed_products(checkpointer, monkeypatch):
+    data = make_data()
+    state = sessions.load_session_state("s1", data)
+    state["cart"].add_item(data.catalog.get(402), 1)
+    sessions.save_session_state("s1", state)
+
+    monkeypatch.setattr(sessions, "_store", MemorySessionStore())
+    without_cap = ShopData(
+        version=2,
+        catalog=CatalogIndex([Product(id=101, name="Camiseta azul", price=15.99, category="Ropa")]),
+        coupons=data.coupons,
+    )
+
+    assert sessions.load_session_state("s1", without_cap)["cart"].is_empty()
+
+
+def test_messages_out_of_memory_leave_the_checkpoint(tmp_path):
+    checkpointer = SessionCheckpointer(tmp_path / "sessions.db")
+    checkpointer.save("s1", {}, {}, [("bot", "a"), ("user", "b")])
+    checkpointer.save("s1", {}, {}, [("user", "b"), ("bot", "c")], chat_start=1)
+
+    snapshot = checkpointer.load("s1")
+    assert snapshot.chat_history == [("user", "b"), ("bot", "c")]
+    assert snapshot.chat_start == 1
+
+
+def test_concurrent_writer_gets_a_conflict_instead_of_overwriting(tmp_path):
+    path = tmp_path / "sessions.db"
+    setup = SessionCheckpointer(path)
+    setup.save("s1", {"mode": "catalog"}, {101: 1, 402: 1}, [("bot", "Hola")])
+    worker_1 = SessionCheckpointer(path)
+    worker_2 = SessionCheckpointer(path)
+    worker_1.load("s1")
+    worker_2.load("s1")
+
+    worker_1.save("s1", {"mode": "catalog"}, {101: 1}, [("bot", "Hola"), ("user", "quita la gorra")])
+    # worker_2 partía de la misma lectura: su cambio se rechaza y no pisa el de worker_1.
+    with pytest.raises(SessionConflict):
+        worker_2.save("s1", {"mode": "checkout"}, {101: 1, 402: 1}, [("bot", "Hola"), ("user", "pagar")])
+
+    snapshot = setup.load("s1")
+    assert snapshot.fields == {"mode": "catalog"}
+    assert snapshot.cart_lines == {101: 1}
+    assert snapshot.chat_history == [("bot", "Hola"), ("user", "quita la gorra")]
+
+    # Tras volver a leer, worker_2 guarda sobre lo último.
+    worker_2.load("s1")
+    worker_2.save("s1", {"mode": "checkout"}, {101: 1}, [("bot", "Hola"), ("user", "quita la gorra"), ("user", "pagar")])
+    assert setup.load("s1").fields == {"mode": "checkout"}
+
+
+def test_creating_an_existing_session_is_a_conflict(tmp_path):
+    path = tmp_path / "sessions.db"
+    SessionCheckpointer(path).save("s1", {}, {101: 1}, [])
+
+    with pytest.raises(SessionConflict):
+        SessionCheckpointer(path).save("s1", {}, {}, [])
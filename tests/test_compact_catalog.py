@@ -0,0 +1,31 @@
+from domain.catalog import load_catalog
+from domain.compact_catalog import CompactCatalog
+from domain.models import Product
+
+def make_products():
+    return [
+        Product(id=402, name="Gorra negra", price=9.99, category="Accesorios", image="img/402.jpg"),
+        Product(id=101, name="Camiseta azul", price=15.99, category="Ropa", description="Algodón"),
+        Product(id=102, name="Camiseta roja", price=15.99, category="Ropa"),
+    ]
+
+def test_compact_catalog_rebuilds_equal_products_in_order():
+    products = make_products()
+    catalog = CompactCatalog(products)
+    assert list(catalog) == products
+    assert len(catalog) == 3
+
+def test_compact_catalog_lookups():
+    catalog = CompactCatalog(make_products())
+    assert catalog.get(101).description == "Algodón"
+    assert catalog.get(402).image == "img/402.jpg"
+    assert catalog.get(999) is None
+    assert catalog.find_by_name("quiero la camiseta roja").id == 102
+    assert catalog.search("camisetas azules")[0].product.id == 101
+
+def test_compact_catalog_interns_categories():
+    catalog = CompactCatalog(make_products())
+    assert catalog.products.pool.values == [None, "Accesorios", "Ropa"]
+
+def test_load_catalog_compact_matches_default():
+    assert list(load_catalog(compact=True)) == list(load_catalog())
@@ -0,0 +1,81 @@
+import random
+
+from domain.coupon_optimizer import CouponOptimizer
+from domain.coupons import CouponRegistry
+from domain.models import Coupon
+from domain.pricing import calculate_coupon_discount
+
+def brute_force_saving(coupons, total):
+    return max((calculate_coupon_discount(total, c) for c in coupons), default=0.0)
+
+def test_matches_brute_force_on_random_coupons():
+    rng = random.Random(7)
+    coupons = [
+        Coupon(
+            code=f"C{i}",
+            type=rng.choice(["percent", "fixed"]),
+            value=rng.choice([5, 10, 15, 20, 25, 40]),
+            min_total=rng.choice([0, 20, 50, 100, 150, 300]),
+        )
+        for i in range(500)
+    ]
+    optimizer = CouponOptimizer(coupons)
+    for total in [0.0, 3.5, 19.99, 20.0, 49.0, 75.5, 100.0, 180.0, 1000.0]:
+        best = optimizer.best(total)
+        expected = brute_force_saving(coupons, total)
+        if expected == 0:
+            assert best is None
+        else:
+            assert best[1] == expected
+            assert calculate_coupon_discount(total, best[0]) == expected
+
+def test_fixed_coupon_saving_is_capped_by_total():
+    coupons = [
+        Coupon(code="FIX50", type="fixed", value=50),
+        Coupon(code="PCT10", type="percent", value=10),
+    ]
+    coupon, saving = CouponOptimizer(coupons).best(30.0)
+    assert coupon.code == "FIX50"
+    assert saving == 30.0
+
+def test_registry_skips_exhausted_coupons():
+    big = Coupon(code="BIG", type="percent", value=30, max_redemptions=1)
+    small = Coupon(code="SMALL", type="percent", value=10)
+    registry = CouponRegistry([big, small])
+    assert registry.best_for(100.0)[0].code == "BIG"
+    registry.redeem(big)
+    assert registry.best_for(100.0)[0].code == "SMALL"
+
+def test_matches_brute_force_when_many_coupons_are_exhausted():
+    rng = random.Random(11)
+    coupons = [
+        Coupon(
+            code=f"C{i}",
+            type=rng.choice(["percent", "fixed"]),
+            value=rng.choice([5, 10, 15, 20, 25, 40]),
+            min_total=rng.choice([0, 20, 50, 100, 150, 300]),
+        )
+        for i in range(300)
+    ]
+    exhausted = {c.code for c in rng.sample(coupons, 200)}
+    available = [c for c in coupons if c.code not in exhausted]
+    optimizer = CouponOptimizer(coupons)
+    for total in [0.0, 19.99, 20.0, 75.5, 100.0, 180.0, 1000.0]:
+        best = optimizer.best(total, lambda c: c.code not in exhausted)
+        expected = brute_force_saving(available, total)
+        assert (best[1] if best else 0.0) == expected
+
+def test_exhausted_coupons_are_only_checked_once():
+    coupons = [Coupon(code=f"ONE{i}", type="fixed", value=100 - i % 50, max_redemptions=1) for i in range(1000)]
+    coupons.append(Coupon(code="LAST", type="fixed", value=1))
+    checked = []
+
+    def available(coupon):
+        checked.append(coupon.code)
+        return coupon.code == "LAST"
+
+    optimizer = CouponOptimizer(coupons)
+    assert optimizer.best(500.0, available)[0].code == "LAST"
+    checked.clear()
+    assert optimizer.best(500.0, available)[0].code == "LAST"
+    assert checked == ["LAST"]
@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+from domain.coupons import CouponRegistry, find_coupon_by_code
+from domain.models import Coupon
+
+def test_lookup_is_case_insensitive():
+    registry = CouponRegistry([Coupon(code="VIP20", type="percent", value=20)])
+    assert registry.get("vip20").code == "VIP20"
+    assert registry.get("nope") is None
+    assert find_coupon_by_code([Coupon(code="SUPER5", type="fixed", value=5)], "super5").value == 5
+
+def test_single_use_code_can_only_be_redeemed_once():
+    coupon = Coupon(code="ONCE-123", type="fixed", value=5, max_redemptions=1)
+    registry = CouponRegistry([coupon])
+    assert registry.is_available(coupon)
+    assert registry.redeem(coupon)
+    assert not registry.redeem(coupon)
+    assert not registry.is_available(coupon)
+
+def test_campaign_limit_is_shared_by_its_codes():
+    codes = [Coupon(code=f"BF-{i}", type="percent", value=10, campaign="BF") for i in range(3)]
+    registry = CouponRegistry(codes, campaign_limits={"BF": 2})
+    assert registry.redeem(codes[0])
+    assert registry.redeem(codes[1])
+    assert not registry.redeem(codes[2])
+    # Un canje rechazado no consume el cupón individual
+    assert registry.counters.get("code:BF-2") == 0
+
+def test_concurrent_redemptions_never_exceed_limit():
+    coupon = Coupon(code="FLASH", type="fixed", value=5, max_redemptions=50)
+    registry = CouponRegistry([coupon])
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: registry.redeem(coupon), range(500)))
+    assert sum(results) == 50
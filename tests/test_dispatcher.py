@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from conversation.dispatcher import TurnDispatcher
+from conversation.graph import build_graph
+from domain.catalog import CatalogIndex
+from domain.coupons import CouponRegistry
+from domain.models import Cart, Coupon, Product
+
+CONVERSATION = [
+    "hola",
+    "ayuda",
+    "¿qué tiempo hace?",
+    "muéstrame el catálogo",
+    "añade 2 camisetas azules",
+    "añade 4 del 402 y quita la camiseta azul",
+    "pon 5 en lugar de 4 del producto 402",
+    "¿qué cupón me conviene?",
+    "aplica el cupón VIP20",
+    "ver carrito",
+    "blablabla",
+    "quiero finalizar la compra",
+    "ayuda",
+    "Soy Ana de Madrid",
+    "ver carrito",
+    "salir",
+]
+
+def make_state():
+    catalog = CatalogIndex([
+        Product(id=101, name="Camiseta azul", price=15.99, category="Ropa"),
+        Product(id=402, name="Gorra negra", price=9.99, category="Accesorios"),
+    ])
+    coupons = CouponRegistry([
+        Coupon(code="VIP20", type="percent", value=20.0, min_total=0.0),
+        Coupon(code="SUPER5", type="fixed", value=5, min_total=0.0),
+    ])
+    return {
+        "mode": "catalog",
+        "cart": Cart(),
+        "catalog": catalog,
+        "coupons": coupons,
+        "applied_coupon_code": None,
+        "last_user_message": "",
+        "shipping_name": None,
+        "shipping_city": None,
+        "bot_message": "",
+        "discount_summary": None,
+        "chat_history": [],
+        "order_confirmed": False,
+        "last_order_name": None,
+        "last_order_city": None,
+        "last_order_total": None,
+    }
+
+def snapshot(state):
+    cart = state["cart"]
+    return (
+        state["bot_message"],
+        state["mode"],
+        {pid: item.quantity for pid, item in cart.items.items()},
+        cart.applied_coupon.code if cart.applied_coupon else None,
+        state.get("shipping_name"),
+        state.get("shipping_city"),
+        state.get("last_order_total"),
+    )
+
+def test_dispatcher_matches_graph_turn_by_turn():
+    graph, dispatcher = build_graph(), TurnDispatcher()
+    graph_state, dispatch_state = make_state(), make_state()
+    for message in CONVERSATION:
+        graph_state["last_user_message"] = message
+        dispatch_state["last_user_message"] = message
+        graph_state = graph.invoke(graph_state)
+        dispatch_state = dispatcher.invoke(dispatch_state)
+        assert snapshot(dispatch_state) == snapshot(graph_state), message
+
+@pytest.mark.parametrize("message", ["ayuda", "hola", "¿qué tiempo hace?", "xyz"])
+def test_static_nodes_return_prebuilt_response(message):
+    state = make_state()
+    state["last_user_message"] = message
+    first = TurnDispatcher().invoke(state)["bot_message"]
+    state["last_user_message"] = message
+    assert TurnDispatcher().invoke(state)["bot_message"] is first
+
+def test_ainvoke_runs_the_same_turn():
+    state = make_state()
+    state["last_user_message"] = "añade 2 del 402"
+    new_state = asyncio.run(TurnDispatcher().ainvoke(state))
+    assert new_state["cart"].items[402].quantity == 2
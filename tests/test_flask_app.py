@@ -0,0 +1,21 @@
+import pytest
+
+pytest.importorskip("flask")
+
+from app.flask_app import app
+
+def test_admin_endpoints_are_disabled_without_a_token(monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    client = app.test_client()
+    response = client.get("/admin/metrics", environ_base={"REMOTE_ADDR": "127.0.0.1"})
+    assert response.status_code == 404
+    assert client.post("/admin/reload").status_code == 404
+
+def test_admin_endpoints_require_the_token(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "s3creto")
+    client = app.test_client()
+    assert client.get("/admin/metrics", environ_base={"REMOTE_ADDR": "127.0.0.1"}).status_code == 403
+    assert client.get("/admin/metrics", headers={"X-Admin-Token": "otro"}).status_code == 403
+    response = client.get("/admin/metrics", headers={"X-Admin-Token": "s3creto"})
+    assert response.status_code == 200
+    assert response.get_json()["ok"]
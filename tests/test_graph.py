@@ -1,5 +1,7 @@
 from domain.models import Cart, Product, Coupon
-from conversation.graph import build_graph
+from domain.catalog import CatalogIndex
+from domain.coupons import CouponRegistry
+from conversation.graph import build_graph, handle_add_to_cart, handle_apply_coupon
 
 def make_state():
     catalog = [
@@ -103,4 +105,138 @@ def test_exit_clears_cart_and_resets_shipping():
     assert new_state["cart"].is_empty()
     assert new_state["shipping_name"] is None
     assert new_state["shipping_city"] is None
-    assert new_state["mode"] == "catalog"
\ No newline at end of file
+    assert new_state["mode"] == "catalog"
+
+
+def test_add_to_cart_by_plural_name_picks_best_match():
+    graph = build_graph()
+    state = make_state()
+    state["last_user_message"] = "añade 2 camisetas azules"
+
+    new_state = graph.invoke(state)
+
+    assert new_state["cart"].items[101].quantity == 2
+
+def test_add_to_cart_asks_when_name_is_ambiguous():
+    graph = build_graph()
+    state = make_state()
+    state["catalog"].append(Product(id=102, name="Camiseta roja", price=15.99))
+    state["last_user_message"] = "añade una camiseta"
+
+    new_state = graph.invoke(state)
+
+    assert new_state["cart"].is_empty()
+    assert "Camiseta azul" in new_state["bot_message"]
+    assert "Camiseta roja" in new_state["bot_message"]
+
+def make_big_catalog_state():
+    state = make_state()
+    state["catalog"] = CatalogIndex(
+        Product(id=i, name=f"Producto {i}", price=1.0, category="Ropa" if i % 2 else "Calzado")
+        for i in range(1, 26)
+    )
+    return state
+
+def test_catalog_is_paginated_and_navigable():
+    graph = build_graph()
+    state = make_big_catalog_state()
+
+    state["last_user_message"] = "muestra el catálogo"
+    state = graph.invoke(state)
+    assert state["catalog_page"] == 1
+    assert "Página 1 de 3" in state["bot_message"]
+    assert "<td>Producto 11</td>" not in state["bot_message"]
+
+    state["last_user_message"] = "siguiente página"
+    state = graph.invoke(state)
+    assert state["catalog_page"] == 2
+    assert "<td>Producto 11</td>" in state["bot_message"]
+
+    state["last_user_message"] = "página 9"
+    state = graph.invoke(state)
+    assert state["catalog_page"] == 3
+
+def test_catalog_filters_by_category_and_reuses_rendered_page():
+    graph = build_graph()
+    state = make_big_catalog_state()
+
+    state["last_user_message"] = "catálogo de calzado"
+    state = graph.invoke(state)
+    first = state["bot_message"]
+    assert state["catalog_category"] == "Calzado"
+    assert "<td>Producto 2</td>" in first
+    assert "<td>Producto 1</td>" not in first
+
+    state["last_user_message"] = "catálogo de calzado"
+    state = graph.invoke(state)
+    assert state["bot_message"] is first
+
+def test_apply_coupon_rejects_exhausted_code():
+    graph = build_graph()
+    state = make_state()
+    coupon = Coupon(code="ONCE", type="fixed", value=5, max_redemptions=1)
+    state["coupons"] = CouponRegistry([coupon])
+    state["coupons"].redeem(coupon)
+    state["cart"].add_item(state["catalog"][0], 1)
+
+    state["last_user_message"] = "aplica el cupón ONCE"
+    new_state = graph.invoke(state)
+
+    assert new_state["cart"].applied_coupon is None
+    assert "agotado" in new_state["bot_message"]
+
+def test_best_coupon_recommends_biggest_saving():
+    graph = build_graph()
+    state = make_state()
+    state["cart"].add_item(state["catalog"][0], 1)  # 15.99: VIP20 ahorra 3.20, SUPER5 ahorra 5
+
+    state["last_user_message"] = "¿qué cupón me conviene?"
+    new_state = graph.invoke(state)
+
+    assert "SUPER5" in new_state["bot_message"]
+    assert "5.00 €" in new_state["bot_message"]
+    assert new_state["cart"].applied_coupon is None
+
+def test_message_is_parsed_once_per_turn(monkeypatch):
+    import conversation.graph as graph_module
+
+    calls = []
+    original = graph_module.parse_user_message
+    monkeypatch.setattr(graph_module, "parse_user_message", lambda m: calls.append(m) or original(m))
+
+    graph = build_graph()
+    state = make_state()
+    state["last_user_message"] = "añade 2 del 101"
+    new_state = graph.invoke(state)
+
+    assert calls == ["añade 2 del 101"]
+    assert new_state["parsed_intent"].intent == "add_to_cart"
+    assert new_state["cart"].items[101].quantity == 2
+
+def test_several_operations_in_one_message_are_applied_together():
+    graph = build_graph()
+    state = make_state()
+
+    state["last_user_message"] = "añade 2 camisetas azules y 1 gorra negra"
+    state = graph.invoke(state)
+    assert {pid: item.quantity for pid, item in state["cart"].items.items()} == {101: 2, 402: 1}
+
+    state["last_user_message"] = "quita la gorra y cambia la camiseta azul a 5"
+    state = graph.invoke(state)
+    assert {pid: item.quantity for pid, item in state["cart"].items.items()} == {101: 5}
+    assert "Total:" in state["bot_message"]
+    assert f"{state['discount_summary'].final_total:.2f} €" in state["bot_message"]
+
+def test_handlers_parse_the_message_when_called_without_router():
+    state = make_state()
+    state["last_user_message"] = "añade 2 del 402"
+
+    new_state = handle_add_to_cart(state)
+
+    assert new_state["cart"].items[402].quantity == 2
+    assert new_state["parsed_intent"].intent == "add_to_cart"
+
+    state = make_state()
+    state["cart"].add_item(state["catalog"][0], 1)
+    state["last_user_message"] = "aplica el cupón VIP20"
+    assert handle_apply_coupon(state)["cart"].applied_coupon.code == "VIP20"
@@ -0,0 +1,70 @@
+import gc
+import weakref
+
+from conversation.graph import HELP_MESSAGE, handle_catalog
+from conversation.history import ChatHistory, MessageRef
+from domain.catalog import CatalogIndex
+from domain.models import Product
+
+
+def test_keeps_only_the_last_messages_in_memory():
+    history = ChatHistory(limit=3)
+    for i in range(5):
+        history.append(("user", f"m{i}"))
+
+    assert len(history) == 3
+    assert history.start == 2
+    assert history.total == 5
+    assert list(history) == [("user", "m2"), ("user", "m3"), ("user", "m4")]
+    assert history[-2:] == [("user", "m3"), ("user", "m4")]
+    assert history.older() == []
+
+
+def test_older_messages_are_read_back_from_disk(tmp_path):
+    history = ChatHistory(limit=2, spill_path=tmp_path / "s1.jsonl")
+    for i in range(6):
+        history.append(("user", f"m{i}"))
+
+    assert history.older() == [(0, "user", "m0"), (1, "user", "m1"), (2, "user", "m2"), (3, "user", "m3")]
+    assert history.older(before=3, limit=2) == [(1, "user", "m1"), (2, "user", "m2")]
+
+
+def test_static_bot_messages_are_stored_as_references():
+    history = ChatHistory()
+    history.append(("bot", HELP_MESSAGE))
+    history.append(("user", HELP_MESSAGE))
+
+    assert history._entries[0] == ("bot", MessageRef("help"))
+    assert history._entries[1] == ("user", HELP_MESSAGE)
+    assert history[0] == ("bot", HELP_MESSAGE)
+
+
+def test_catalog_pages_are_rendered_on_read(tmp_path):
+    catalog = CatalogIndex([Product(id=101, name="Camiseta azul", price=15.99, category="Ropa")])
+    state = handle_catalog({"catalog": catalog, "last_user_message": "muestra el catálogo"})
+    history = ChatHistory(limit=1, spill_path=tmp_path / "s1.jsonl", catalog=catalog)
+
+    history.append(("bot", state["bot_message"]), state["bot_message_ref"])
+    assert history._entries[0][1].template == "catalog_page"
+    assert history[0] == ("bot", state["bot_message"])
+
+    history.append(("user", "gracias"))
+    assert history.older() == [(0, "bot", state["bot_message"])]
+
+
+def test_rebinding_the_catalog_keeps_the_prices_already_shown():
+    old = CatalogIndex([Product(id=101, name="Camiseta azul", price=15.99, category="Ropa")])
+    state = handle_catalog({"catalog": old, "last_user_message": "muestra el catálogo"})
+    history = ChatHistory(catalog=old)
+    history.append(("bot", state["bot_message"]), state["bot_message_ref"])
+
+    new = CatalogIndex([Product(id=101, name="Camiseta azul", price=12.5, category="Ropa")])
+    history.rebind_catalog(new)
+    old_ref = weakref.ref(old)
+    del old, state
+    gc.collect()
+
+    assert old_ref() is None
+    assert history.catalog is new
+    assert "15.99 €" in history[0][1]
+    assert "12.50 €" not in history[0][1]
@@ -1,5 +1,7 @@
 import pytest
-from conversation.nlu import parse_user_message
+from conversation.nlu import KEYWORD_GROUPS, CartOperation, keyword_hits, parse_operations, parse_user_message
+from domain.gazetteer import ProductGazetteer
+from domain.models import Product
 
 @pytest.mark.parametrize(
     "msg,expected",
@@ -13,6 +15,7 @@ from conversation.nlu import parse_user_message
         ("qué tiempo hace", "smalltalk"),
         ("salir", "exit"),
         ("terminar", "exit"),
+        ("siguiente página", "show_catalog"),
     ],
 )
 def test_intents_basic(msg, expected):
@@ -45,4 +48,48 @@ def test_update_quantity_picks_last_number_not_product_id():
     parsed = parse_user_message("pon 3 en lugar de 1 del producto 402")
     assert parsed.intent == "update_quantity"
     assert parsed.product_id == 402
-    assert parsed.quantity == 3
\ No newline at end of file
+    assert parsed.quantity == 3
+
+def test_best_coupon_question_is_not_apply_coupon():
+    assert parse_user_message("¿Qué cupón me conviene?").intent == "best_coupon"
+    assert parse_user_message("dame el mejor descuento").intent == "best_coupon"
+    assert parse_user_message("aplica el cupón VIP20").intent == "apply_coupon"
+
+def test_coupon_code_containing_mejor_is_applied():
+    parsed = parse_user_message("aplica el cupón MEJOR10")
+    assert parsed.intent == "apply_coupon"
+    assert parsed.coupon_code == "MEJOR10"
+
+def test_keyword_hits_match_substring_checks():
+    texts = [
+        "terminar compra", "quiero finalizar la compra", "que cupones me conviene",
+        "buenas tardes", "componer", "ver productos de la tienda", "mas productos",
+        "quitame el carro", "", "que tiempo hace",
+    ]
+    for text in texts:
+        expected = {g for g, keywords in KEYWORD_GROUPS.items() if any(k in text for k in keywords)}
+        assert keyword_hits(text) == expected, text
+
+def test_cached_parse_keeps_slots_from_original_message():
+    first = parse_user_message("aplica el cupón VIP20")
+    second = parse_user_message("Aplica el cupón vip20")
+    assert first.coupon_code == "VIP20"
+    assert second.coupon_code == "vip20"
+    assert parse_user_message("añade 2 Camisetas").product_name == "añade 2 Camisetas"
+    assert parse_user_message("Ver carrito") is parse_user_message("ver carrito")
+
+def test_parse_operations_splits_multi_item_message():
+    gazetteer = ProductGazetteer([
+        Product(id=101, name="Camiseta azul", price=15.99),
+        Product(id=102, name="Camiseta roja", price=15.99),
+        Product(id=402, name="Gorra negra", price=9.99),
+        Product(id=302, name="Botas trekking", price=79.99),
+    ])
+    ops = parse_operations("Añade 2 camisetas azules y 1 gorra negra, y quita las botas", gazetteer)
+    assert ops == [
+        CartOperation("add", 101, 2),
+        CartOperation("add", 402, 1),
+        CartOperation("remove", 302),
+    ]
+    # 'camiseta' sola es ambigua: no se resuelve
+    assert parse_operations("añade una camiseta y dos gorras", gazetteer) == [CartOperation("add", 402, 2)]
@@ -0,0 +1,20 @@
+import io
+
+from conversation.nlu import parse_user_message
+from conversation.nlu_batch import diff_records, parse_many, read_messages, to_record
+
+MESSAGES = ["hola", "añade 2 camisetas azules", "aplica el cupón VIP20", "ver carrito", "salir"] * 7
+
+def test_parse_many_matches_sequential_parse_in_order():
+    expected = [parse_user_message(m) for m in MESSAGES]
+    assert list(parse_many(MESSAGES, workers=1, chunk_size=4)) == expected
+    assert list(parse_many(iter(MESSAGES), workers=2, chunk_size=4)) == expected
+
+def test_read_messages_accepts_text_and_jsonl():
+    source = io.StringIO('hola\n\n{"text": "ver carrito"}\n{"message": "salir"}\n')
+    assert list(read_messages(source)) == ["hola", "ver carrito", "salir"]
+
+def test_diff_reports_only_changed_messages():
+    previous = [to_record(m, parse_user_message(m)) for m in ["hola", "ver carrito"]]
+    current = [dict(previous[0]), dict(previous[1], intent="unknown")]
+    assert [new["text"] for _, new in diff_records(previous, current)] == ["ver carrito"]
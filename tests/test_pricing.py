@@ -1,5 +1,12 @@
 from domain.models import Cart, Product, Coupon
-from domain.pricing import calculate_totals
+from domain.pricing import (
+    calculate_totals,
+    calculate_line_discount,
+    get_promotion_plan,
+    render_cart_fragment,
+    set_promotion_plan,
+)
+from domain.promotions import compile_rules
 
 def test_quantity_discount_and_cart_discount_over_100():
     cart = Cart()
@@ -44,4 +51,85 @@ def test_percent_coupon_applies_to_total_after_discounts():
     assert summary.line_discounts == 12.5
     assert summary.cart_discount == 13.75
     assert summary.coupon_discount == 24.75
-    assert summary.final_total == 99.0
\ No newline at end of file
+    assert summary.final_total == 99.0
+
+def test_totals_are_cached_until_cart_or_coupon_changes():
+    cart = Cart()
+    p = Product(id=5, name="Producto E", price=40.0)
+    cart.add_item(p, 2)
+
+    first = calculate_totals(cart)
+    assert calculate_totals(cart) is first
+
+    cart.add_item(p, 1)
+    second = calculate_totals(cart)
+    assert second is not first
+    assert second.line_discounts == 10.0
+
+    cart.applied_coupon = Coupon(code="SUPER5", type="fixed", value=5, min_total=0)
+    assert calculate_totals(cart).coupon_discount == 5.0
+
+def test_cart_fragment_is_rendered_only_when_the_cart_changes():
+    renders = []
+
+    def render(cart, summary):
+        renders.append(summary)
+        return f"<p>{summary.final_total:.2f}</p>"
+
+    cart = Cart()
+    p = Product(id=6, name="Producto F", price=10.0)
+    cart.add_item(p, 1)
+
+    first = render_cart_fragment(cart, "panel", render)
+    assert render_cart_fragment(cart, "panel", render) is first
+    assert len(renders) == 1
+
+    render_cart_fragment(cart, "chat", render)
+    assert len(renders) == 2  # cada vista tiene su propia entrada
+
+    cart.add_item(p, 1)
+    assert render_cart_fragment(cart, "panel", render) == "<p>20.00</p>"
+    cart.applied_coupon = Coupon(code="SUPER5", type="fixed", value=5, min_total=0)
+    assert render_cart_fragment(cart, "panel", render) == "<p>15.00</p>"
+    assert len(renders) == 4
+
+    previous = get_promotion_plan()
+    try:
+        set_promotion_plan(compile_rules([]))
+        render_cart_fragment(cart, "panel", render)
+        assert len(renders) == 5
+    finally:
+        set_promotion_plan(previous)
+
+def test_incremental_totals_match_full_recalculation():
+    cart = Cart()
+    a = Product(id=6, name="Producto F", price=12.35)
+    b = Product(id=7, name="Producto G", price=3.1)
+    cart.add_item(a, 4)
+    cart.add_item(b, 2)
+    cart.set_quantity(a.id, 7)
+    cart.add_item(b, 5)
+    cart.remove_item(a.id)
+
+    fresh = Cart()
+    fresh.add_item(b, 7)
+    assert cart.base_total == fresh.base_total
+    assert cart.line_discount == calculate_line_discount(cart)
+
+def test_totals_do_not_depend_on_the_order_of_operations():
+    a = Product(id=1, name="A", price=19.99)
+    b = Product(id=2, name="B", price=0.10)
+    c = Product(id=3, name="C", price=80.01)
+    cart = Cart()
+    cart.add_item(a, 1)
+    cart.add_item(b, 1)
+    cart.add_item(c, 1)
+    cart.remove_item(b.id)
+
+    fresh = Cart()
+    fresh.add_item(a, 1)
+    fresh.add_item(c, 1)
+
+    assert cart.base_total == fresh.base_total == 100.0
+    assert calculate_totals(cart) == calculate_totals(fresh)
+    assert calculate_totals(cart).cart_discount == 0.0
@@ -0,0 +1,59 @@
+from domain.models import Cart, Coupon, Product
+from domain.pricing_cache import PricingCache, cart_fingerprint
+from domain.pricing import PRICING_CACHE, calculate_totals
+
+camiseta = Product(id=101, name="Camiseta azul", price=15.99, category="Ropa")
+gorra = Product(id=402, name="Gorra negra", price=9.99, category="Accesorios")
+
+def make_cart(*lines, coupon=None):
+    cart = Cart()
+    for product, qty in lines:
+        cart.add_item(product, qty)
+    cart.applied_coupon = coupon
+    return cart
+
+def test_fingerprint_ignores_line_order_but_not_prices_or_coupon():
+    a = make_cart((camiseta, 1), (gorra, 1))
+    b = make_cart((gorra, 1), (camiseta, 1))
+    assert cart_fingerprint(a, 1) == cart_fingerprint(b, 1)
+    assert cart_fingerprint(a, 1) != cart_fingerprint(a, 2)
+
+    cheaper = make_cart((Product(id=101, name="Camiseta azul", price=12.0, category="Ropa"), 1), (gorra, 1))
+    assert cart_fingerprint(cheaper, 1) != cart_fingerprint(a, 1)
+
+    coupon = Coupon(code="SUPER5", type="fixed", value=5)
+    changed = Coupon(code="SUPER5", type="fixed", value=7)
+    assert cart_fingerprint(make_cart((gorra, 1), coupon=coupon), 1) != cart_fingerprint(make_cart((gorra, 1), coupon=changed), 1)
+
+def test_fingerprint_is_maintained_incrementally():
+    edited = make_cart((camiseta, 1), (gorra, 4))
+    edited.set_quantity(gorra.id, 2)
+    edited.add_item(camiseta, 2)
+    edited.remove_item(gorra.id)
+    assert cart_fingerprint(edited, 1) == cart_fingerprint(make_cart((camiseta, 3)), 1)
+
+    edited.rebind_product(Product(id=101, name="Camiseta azul", price=12.0, category="Ropa"))
+    assert cart_fingerprint(edited, 1) != cart_fingerprint(make_cart((camiseta, 3)), 1)
+
+    edited.clear()
+    assert cart_fingerprint(edited, 1) == cart_fingerprint(Cart(), 1)
+
+def test_identical_carts_share_summary_across_sessions():
+    PRICING_CACHE.clear()
+    first = calculate_totals(make_cart((camiseta, 2), (gorra, 1)))
+    hits = PRICING_CACHE.stats().hits
+    second = calculate_totals(make_cart((camiseta, 2), (gorra, 1)))
+    assert second is first
+    assert PRICING_CACHE.stats().hits == hits + 1
+
+def test_lru_evicts_oldest_and_counts_evictions():
+    cache = PricingCache(maxsize=2)
+    summary = calculate_totals(make_cart((gorra, 1)))
+    cache.put("a", summary)
+    cache.put("b", summary)
+    cache.get("a")
+    cache.put("c", summary)
+    assert cache.get("b") is None
+    assert cache.get("a") is summary
+    stats = cache.stats()
+    assert (stats.evictions, stats.size, stats.hits, stats.misses) == (1, 2, 2, 1)
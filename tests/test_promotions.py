@@ -0,0 +1,74 @@
+import pytest
+from domain.models import Cart, Coupon, Product
+from domain.pricing import DEFAULT_RULES, calculate_totals, get_promotion_plan, set_promotion_plan
+from domain.promotions import PromotionError, compile_rules, load_promotions
+
+@pytest.fixture
+def restore_plan():
+    previous = get_promotion_plan()
+    yield
+    set_promotion_plan(previous)
+
+def test_data_file_matches_default_rules():
+    assert load_promotions().definitions == DEFAULT_RULES
+
+def test_category_multibuy_and_best_of_line_rules():
+    plan = compile_rules([
+        {"type": "multibuy", "group_size": 3, "discount": 0.25},
+        {"type": "multibuy", "group_size": 2, "discount": 0.5, "categories": ["Calzado"]},
+    ])
+    botas = Product(id=302, name="Botas", price=80.0, category="Calzado")
+    gorra = Product(id=402, name="Gorra", price=10.0, category="Accesorios")
+    # 2x con 50%: 80 € frente al 3x con 25%: 20 € => se aplica el mejor
+    assert plan.line_discount(botas, 4) == 80.0
+    assert plan.line_discount(gorra, 3) == 2.5
+
+def test_stackable_rules_add_up_but_never_exceed_line_total():
+    plan = compile_rules([
+        {"type": "percent", "rate": 0.6, "product_ids": [1], "stackable": True},
+        {"type": "percent", "rate": 0.6, "stackable": True},
+    ])
+    product = Product(id=1, name="A", price=10.0)
+    assert plan.line_discount(product, 1) == 10.0
+
+def test_tiered_threshold_picks_highest_tier():
+    plan = compile_rules([
+        {"type": "cart_threshold", "tiers": [{"min_total": 50, "rate": 0.05}, {"min_total": 200, "rate": 0.15}]},
+    ])
+    assert plan.cart_discount(50) == 0.0
+    assert plan.cart_discount(100) == 5.0
+    assert plan.cart_discount(300) == 45.0
+
+def test_unknown_rule_type_is_rejected():
+    with pytest.raises(PromotionError):
+        compile_rules([{"type": "regalo"}])
+
+def test_coupons_are_not_plan_rules():
+    with pytest.raises(PromotionError, match="coupons.json"):
+        compile_rules([{"id": "VIP20", "type": "coupon", "value": 20}])
+
+def test_cart_coupon_stacks_on_top_of_every_promotion(restore_plan):
+    set_promotion_plan(compile_rules([
+        {"type": "percent", "rate": 0.1, "stackable": True},
+        {"type": "percent", "rate": 0.1, "categories": ["Ropa"], "stackable": True},
+        {"type": "cart_threshold", "tiers": [{"min_total": 100, "rate": 0.1}]},
+    ]))
+    cart = Cart()
+    cart.add_item(Product(id=1, name="A", price=50.0, category="Ropa"), 4)
+    cart.applied_coupon = Coupon(code="FIJO10", type="fixed", value=10.0)
+
+    summary = calculate_totals(cart)
+    assert summary.line_discounts == 40.0
+    assert summary.cart_discount == 16.0
+    assert summary.coupon_discount == 10.0
+    assert summary.final_total == 134.0
+
+def test_changing_active_plan_reprices_existing_carts(restore_plan):
+    cart = Cart()
+    cart.add_item(Product(id=1, name="A", price=10.0, category="Ropa"), 3)
+    assert calculate_totals(cart).line_discounts == 2.5
+
+    set_promotion_plan(compile_rules([{"type": "percent", "rate": 0.1, "categories": ["Ropa"]}]))
+    summary = calculate_totals(cart)
+    assert summary.line_discounts == 3.0
+    assert summary.cart_discount == 0.0
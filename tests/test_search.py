@@ -0,0 +1,59 @@
+from domain.models import Product
+from domain.search import ProductMatcher
+
+def make_matcher():
+    return ProductMatcher([
+        Product(id=101, name="Camiseta azul", price=15.99),
+        Product(id=102, name="Camiseta roja", price=15.99),
+        Product(id=302, name="Botas trekking", price=89.9),
+        Product(id=502, name="Auriculares inalámbricos", price=29.99),
+    ])
+
+def test_plural_forms_rank_the_right_product_first():
+    matches = make_matcher().search("añade 2 camisetas azules")
+    assert matches[0].product.id == 101
+    assert all(m.product.id != 102 or m.score < matches[0].score for m in matches)
+
+def test_accents_are_ignored():
+    matches = make_matcher().search("auriculares inalambricos")
+    assert matches[0].product.id == 502
+    assert matches[0].score == 1.0
+
+def test_partial_name_still_matches():
+    assert make_matcher().search("quita las botas")[0].product.id == 302
+
+def test_ambiguous_text_returns_tied_scores():
+    matches = make_matcher().search("añade una camiseta")
+    assert [m.product.id for m in matches] == [101, 102]
+    assert matches[0].score == matches[1].score
+
+def test_unrelated_text_returns_nothing():
+    assert make_matcher().search("pon el producto 402") == []
+
+def make_large_matcher(n=20_000):
+    nouns = ["Camiseta", "Botas", "Mochila", "Gorra", "Reloj"]
+    colors = ["azul", "roja", "negra", "gris", "blanca"]
+    return ProductMatcher([
+        Product(id=i, name=f"{nouns[i % 5]} {colors[i // 5 % 5]} talla {i % 40} XT-{i % 3000:04d}", price=9.99)
+        for i in range(n)
+    ])
+
+def test_exact_model_code_beats_a_shorter_partial_name():
+    matcher = ProductMatcher([
+        Product(id=1, name="Cable HDMI", price=4.99),
+        Product(id=2, name="Cable HDMI 2.1 trenzado HS-2040 3m", price=12.99),
+    ])
+    assert [m.product.id for m in matcher.search("añade el cable hdmi hs-2040")] == [2, 1]
+
+def test_common_words_still_match_in_a_large_catalog():
+    matches = make_large_matcher().search("quita las botas")
+    assert len(matches) == 5
+    assert all(m.product.name.startswith("Botas") for m in matches)
+
+def test_early_cutoff_returns_the_same_matches_as_a_full_ranking():
+    matcher = make_large_matcher()
+    for text in ["quita las botas", "añade 2 camisetas azules", "la gorra gris talla 7",
+                 "pon el reloj XT-0042", "mochilas negras xt-1234", "botas"]:
+        full = matcher.search(text, limit=len(matcher.products))
+        for limit in (1, 3, 5):
+            assert matcher.search(text, limit) == full[:limit]
@@ -0,0 +1,114 @@
+import pytest
+
+from app.session_codec import CODEC_VERSION, HEADER, MAGIC, decode_state, encode_state
+from app.sessions import new_session_state
+from conversation.graph import HELP_MESSAGE, handle_catalog
+from domain.catalog import CatalogIndex
+from domain.coupons import CouponRegistry
+from domain.models import Coupon, Product
+from domain.shop_data import ShopData
+
+
+def make_data(version=1, price=15.99):
+    return ShopData(
+        version=version,
+        catalog=CatalogIndex([
+            Product(id=101, name="Camiseta azul", price=price, category="Ropa"),
+            Product(id=402, name="Gorra negra", price=9.99, category="Accesorios"),
+        ]),
+        coupons=CouponRegistry([Coupon(code="VIP20", type="percent", value=20.0, min_total=0.0)]),
+    )
+
+
+def make_state(data):
+    state = new_session_state(data)
+    state["cart"].add_item(data.catalog.get(101), 2)
+    state["cart"].add_item(data.catalog.get(402), 1)
+    state["cart"].applied_coupon = data.coupons.get("VIP20")
+    state.update({
+        "mode": "shipping",
+        "shipping_name": "Ana",
+        "shipping_city": "Cádiz",
+        "last_order_total": 42.5,
+        "order_confirmed": True,
+    })
+    history = state["chat_history"]
+    history.append(("user", "ayuda"))
+    history.append(("bot", HELP_MESSAGE))
+    state["last_user_message"] = "catálogo de ropa"
+    handle_catalog(state)
+    history.append(("bot", state["bot_message"]), state.pop("bot_message_ref"))
+    return state
+
+
+def test_round_trip():
+    data = make_data()
+    state = make_state(data)
+
+    decoded = decode_state(encode_state(state), data)
+
+    for name in ("mode", "catalog_page", "catalog_category", "shipping_name", "shipping_city",
+                 "last_order_total", "order_confirmed"):
+        assert decoded[name] == state[name]
+    assert {pid: item.quantity for pid, item in decoded["cart"].items.items()} == {101: 2, 402: 1}
+    assert decoded["cart"].applied_coupon is data.coupons.get("VIP20")
+    assert decoded["applied_coupon_code"] == "VIP20"
+    assert list(decoded["chat_history"]) == list(state["chat_history"])
+    assert decoded["chat_history"].entries()[:-1] == state["chat_history"].entries()[:-1]
+
+
+def test_decode_rebinds_to_current_shop_data_but_keeps_shown_prices():
+    state = make_state(make_data())
+    reloaded = make_data(version=2, price=12.0)
+
+    decoded = decode_state(encode_state(state), reloaded)
+
+    assert decoded["cart"].items[101].product is reloaded.catalog.get(101)
+    assert decoded["catalog"] is reloaded.catalog
+    assert decoded["data_version"] == 2
+    assert "15.99 €" in decoded["chat_history"][-1][1]
+    assert "12.00 €" not in decoded["chat_history"][-1][1]
+
+
+def test_blob_does_not_grow_with_the_catalog():
+    small = make_data()
+    big = ShopData(
+        version=1,
+        catalog=CatalogIndex(
+            list(small.catalog) + [Product(id=i, name=f"Producto {i}", price=1.0) for i in range(1000, 6000)]
+        ),
+        coupons=small.coupons,
+    )
+
+    assert len(encode_state(make_state(big))) == len(encode_state(make_state(small)))
+
+
+def test_rejects_other_formats_and_versions():
+    data = make_data()
+    blob = encode_state(make_state(data))
+
+    with pytest.raises(ValueError):
+        decode_state(b"XXXX" + blob[4:], data)
+    with pytest.raises(ValueError):
+        decode_state(HEADER.pack(MAGIC, CODEC_VERSION + 1) + blob[HEADER.size:], data)
+
+
+def test_rejects_truncated_and_padded_blobs():
+    data = make_data()
+    blob = encode_state(make_state(data))
+
+    for end in range(len(blob)):
+        with pytest.raises(ValueError):
+            decode_state(blob[:end], data)
+    with pytest.raises(ValueError):
+        decode_state(blob + b"\x00", data)
+
+
+def test_rejects_unknown_message_templates():
+    data = make_data()
+    blob = encode_state(make_state(data))
+    help_id = b"\x04\x00\x00\x00help"
+    assert help_id in blob
+
+    with pytest.raises(ValueError):
+        decode_state(blob.replace(help_id, b"\x04\x00\x00\x00nope"), data)
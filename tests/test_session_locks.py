@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+
+from app.session_locks import AsyncSessionLocks, SessionLocks
+
+
+def sids_in_different_stripes(locks):
+    first = "sesion-0"
+    other = next(f"sesion-{i}" for i in range(1, 1000) if locks._stripe(f"sesion-{i}") != locks._stripe(first))
+    return first, other
+
+
+def test_same_session_is_serialized():
+    locks = SessionLocks()
+    counter = {"value": 0}
+
+    def turn():
+        with locks.hold("s1"):
+            value = counter["value"]
+            time.sleep(0.001)
+            counter["value"] = value + 1
+
+    threads = [threading.Thread(target=turn) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert counter["value"] == 20
+    stats = locks.stats()
+    assert stats.acquisitions == 20
+    assert stats.contended > 0
+    assert stats.wait_max > 0
+
+
+def test_different_sessions_do_not_wait():
+    locks = SessionLocks()
+    first, other = sids_in_different_stripes(locks)
+    entered = threading.Event()
+
+    def other_turn():
+        with locks.hold(other):
+            entered.set()
+
+    with locks.hold(first):
+        t = threading.Thread(target=other_turn)
+        t.start()
+        t.join(timeout=1)
+        assert entered.is_set()
+
+    assert locks.stats().contended == 0
+
+
+def test_async_locks_serialize_one_session():
+    locks = AsyncSessionLocks()
+    order = []
+
+    async def turn(name):
+        async with locks.hold("s1"):
+            order.append(f"{name}:inicio")
+            await asyncio.sleep(0.001)
+            order.append(f"{name}:fin")
+
+    async def scenario():
+        await asyncio.gather(turn("a"), turn("b"))
+
+    asyncio.run(scenario())
+
+    assert order == ["a:inicio", "a:fin", "b:inicio", "b:fin"]
+    assert locks.stats().contended == 1
@@ -0,0 +1,120 @@
+from app import sessions
+from app.session_store import MemorySessionStore, SQLiteSessionStore
+from domain.catalog import CatalogIndex
+from domain.coupons import CouponRegistry
+from domain.models import Product
+from domain.shop_data import ShopData
+
+DATA = ShopData(
+    version=1,
+    catalog=CatalogIndex([Product(id=101, name="Camiseta azul", price=15.99, category="Ropa")]),
+    coupons=CouponRegistry([]),
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_memory_store_evicts_least_recently_used():
+    evicted = []
+    store = MemorySessionStore(maxsize=2, ttl=None, on_evict=evicted.append)
+    for sid in ("a", "b"):
+        store.put(sid, sessions.new_session_state(DATA))
+    store.get("a", DATA)
+    store.put("c", sessions.new_session_state(DATA))
+
+    assert evicted == ["b"]
+    assert store.get("b", DATA) is None
+    assert store.get("a", DATA) is not None
+    stats = store.stats()
+    assert (stats.size, stats.evictions, stats.hits, stats.misses) == (2, 1, 2, 1)
+
+
+def test_memory_store_expires_idle_sessions():
+    clock = FakeClock()
+    store = MemorySessionStore(ttl=60, clock=clock)
+    store.put("a", sessions.new_session_state(DATA))
+    store.put("b", sessions.new_session_state(DATA))
+
+    clock.now = 50
+    assert store.get("a", DATA) is not None
+    clock.now = 100
+    assert store.get("b", DATA) is None
+    store.put("c", sessions.new_session_state(DATA))
+
+    assert len(store) == 2
+    assert store.stats().expirations == 1
+
+
+def test_sqlite_store_is_shared_between_processes(tmp_path):
+    path = tmp_path / "sessions.db"
+    worker_1 = SQLiteSessionStore(path)
+    worker_2 = SQLiteSessionStore(path)
+
+    state = sessions.new_session_state(DATA)
+    state["cart"].add_item(DATA.catalog.get(101), 2)
+    worker_1.put("s1", state)
+
+    seen = worker_2.get("s1", DATA)
+    assert seen["cart"].items[101].quantity == 2
+    seen["cart"].add_item(DATA.catalog.get(101), 1)
+    worker_2.put("s1", seen)
+
+    assert worker_1.get("s1", DATA)["cart"].items[101].quantity == 3
+    assert worker_1.get("nadie", DATA) is None
+    assert worker_1.stats().size == 1
+
+
+def test_sqlite_store_purges_expired_sessions(tmp_path):
+    store = SQLiteSessionStore(tmp_path / "sessions.db", ttl=0)
+    store.put("s1", sessions.new_session_state(DATA))
+
+    assert store.purge_expired() == 1
+    assert store.get("s1", DATA) is None
+    assert store.stats().expirations == 1
+
+
+def test_sqlite_store_ignores_expired_rows_before_purging(tmp_path):
+    store = SQLiteSessionStore(tmp_path / "sessions.db", ttl=60)
+    store.put("s1", sessions.new_session_state(DATA))
+    store.checkpointer._conn.execute("UPDATE sessions SET updated_at = updated_at - 120")
+
+    assert store.get("s1", DATA) is None
+    stats = store.stats()
+    assert (stats.size, stats.misses, stats.expirations) == (1, 1, 1)
+
+
+def test_load_session_state_goes_through_the_store(monkeypatch):
+    store = MemorySessionStore()
+    monkeypatch.setattr(sessions, "_store", store)
+
+    state = sessions.load_session_state("s1", DATA)
+
+    assert sessions.load_session_state("s1", DATA) is state
+    assert store.stats().misses == 1
+
+
+def test_evicted_sessions_without_checkpoints_drop_their_spill_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(sessions, "_checkpointer", None)
+    monkeypatch.setattr(sessions, "_history_dir", tmp_path)
+    store = MemorySessionStore(maxsize=1, ttl=None, on_evict=sessions.release_session)
+    (tmp_path / "a.jsonl").write_text("[]\n")
+    store.put("a", sessions.new_session_state(DATA))
+    store.put("b", sessions.new_session_state(DATA))
+
+    assert not (tmp_path / "a.jsonl").exists()
+
+
+def test_sqlite_store_reports_expired_sessions(tmp_path):
+    expired = []
+    store = SQLiteSessionStore(tmp_path / "sessions.db", ttl=0, on_expire=expired.append)
+    store.put("s1", sessions.new_session_state(DATA))
+    store.put("s2", sessions.new_session_state(DATA))
+
+    assert store.purge_expired() == 2
+    assert sorted(expired) == ["s1", "s2"]
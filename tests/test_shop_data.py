@@ -0,0 +1,72 @@
+import json
+from domain.catalog import CatalogIndex, read_products
+from domain.coupons import CouponRegistry
+from domain.shop_data import ShopDataManager
+
+PRODUCTS = [
+    {"id": 101, "name": "Camiseta azul", "price": 15.99},
+    {"id": 402, "name": "Gorra negra", "price": 9.99},
+]
+
+def make_manager(tmp_path):
+    catalog_path = tmp_path / "products.json"
+    coupons_path = tmp_path / "coupons.json"
+    catalog_path.write_text(json.dumps(PRODUCTS), encoding="utf-8")
+    coupons_path.write_text("[]", encoding="utf-8")
+    manager = ShopDataManager(
+        catalog_path=catalog_path,
+        coupons_path=coupons_path,
+        catalog_loader=lambda: CatalogIndex(read_products(catalog_path)),
+        coupons_loader=lambda counters: CouponRegistry([], counters=counters),
+    )
+    return manager, catalog_path
+
+def test_reload_without_changes_keeps_version(tmp_path):
+    manager, _ = make_manager(tmp_path)
+    before = manager.current
+    assert manager.reload() is before
+    assert manager.current.version == 1
+
+def test_reload_swaps_only_changed_products(tmp_path):
+    manager, catalog_path = make_manager(tmp_path)
+    old = manager.current.catalog
+    old.find_by_name("gorra negra")  # fuerza el índice de palabras
+
+    changed = [dict(PRODUCTS[0]), dict(PRODUCTS[1], price=7.5)]
+    catalog_path.write_text(json.dumps(changed), encoding="utf-8")
+    data = manager.reload()
+
+    assert data.version == 2
+    assert data.catalog.get(402).price == 7.5
+    assert data.catalog.get(101) is old.get(101)
+    assert data.catalog._by_token is old._by_token
+    # El catálogo anterior no se modifica
+    assert old.get(402).price == 9.99
+
+def test_reload_with_new_product_rebuilds_index(tmp_path):
+    manager, catalog_path = make_manager(tmp_path)
+    extended = PRODUCTS + [{"id": 302, "name": "Botas trekking", "price": 89.9}]
+    catalog_path.write_text(json.dumps(extended), encoding="utf-8")
+    data = manager.reload()
+    assert data.catalog.find_by_name("botas trekking").id == 302
+
+def test_failed_reload_is_retried_by_the_watcher(tmp_path):
+    import os
+    import time
+
+    manager, catalog_path = make_manager(tmp_path)
+    catalog_path.write_text(json.dumps([{"id": 101, "price": 15.99}]), encoding="utf-8")  # sin nombre
+    os.utime(catalog_path, (time.time() + 5, time.time() + 5))
+    manager.watch(0.01)
+    try:
+        time.sleep(0.1)
+        assert manager.current.version == 1
+
+        catalog_path.write_text(json.dumps(PRODUCTS + [{"id": 7, "name": "Botas", "price": 1.0}]), encoding="utf-8")
+        os.utime(catalog_path, (time.time() + 10, time.time() + 10))
+        deadline = time.time() + 2
+        while manager.current.version == 1 and time.time() < deadline:
+            time.sleep(0.01)
+        assert manager.current.version == 2
+    finally:
+        manager.stop()
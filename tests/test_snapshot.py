@@ -0,0 +1,29 @@
+import struct
+import pytest
+from domain.models import Product
+from domain.snapshot import SnapshotCatalog, build_snapshot, HEADER
+
+def make_products():
+    return [
+        Product(id=402, name="Gorra negra", price=9.99, category="Accesorios", image="img/402.jpg"),
+        Product(id=101, name="Camiseta azul", price=15.99, category="Ropa", description="Algodón"),
+        Product(id=102, name="Camiseta roja", price=15.99, category="Ropa"),
+    ]
+
+def test_snapshot_round_trip(tmp_path):
+    path = tmp_path / "products.snapshot"
+    build_snapshot(make_products(), path)
+    catalog = SnapshotCatalog(path)
+    assert list(catalog) == make_products()
+    assert catalog.get(101).description == "Algodón"
+    assert catalog.get(999) is None
+    assert catalog.search("camisetas azules")[0].product.id == 101
+
+def test_snapshot_rejects_other_versions(tmp_path):
+    path = tmp_path / "products.snapshot"
+    build_snapshot(make_products(), path)
+    data = bytearray(path.read_bytes())
+    struct.pack_into("<I", data, 8, 99)
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        SnapshotCatalog(path)